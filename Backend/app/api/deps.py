@@ -1,5 +1,87 @@
 """API-level dependencies."""
 
+from typing import Optional
+
+from flask import Response, jsonify, request
+
+from app.config import settings
 from app.dependencies import get_executor, get_session_manager
+from app.models.execution import (
+    ExecutionMetadata,
+    ExecutionRequest,
+    ExecutionResponse,
+)
+from app.models.trace import TraceFormat
+from app.services.executor import ExecutionResult
+
+__all__ = [
+    "client_key",
+    "execution_response_json",
+    "get_executor",
+    "get_session_manager",
+    "queue_full_response",
+    "requested_trace_format",
+]
+
+
+def client_key() -> str:
+    """Who the current request's runs are scheduled for.
+
+    The caller's IP address, as there is no authentication; a user id
+    takes its place once there is.
+    """
+    return request.remote_addr or "unknown"
+
+
+def queue_full_response(result: ExecutionResult) -> Response:
+    """503 for a run turned away because the execution queue is full."""
+    response = jsonify(
+        error=result.error,
+        status=result.status.value,
+        execution_id=result.execution_id,
+        retry_after=settings.QUEUE_RETRY_AFTER,
+    )
+    response.status_code = 503
+    response.headers["Retry-After"] = str(settings.QUEUE_RETRY_AFTER)
+    return response
+
+
+def requested_trace_format(execution_request: ExecutionRequest) -> TraceFormat:
+    """``options.trace_format`` of a request; raises ``ValueError`` if bad."""
+    return TraceFormat(
+        execution_request.options.get("trace_format", TraceFormat.FULL)
+    )
+
+
+def execution_response_json(
+    result: ExecutionResult,
+    session_id: str,
+    trace_format: TraceFormat,
+    metadata: Optional[ExecutionMetadata] = None,
+    include_steps: bool = True,
+) -> bytes:
+    """The :class:`ExecutionResponse` JSON for an encoded *result*.
 
-__all__ = ["get_executor", "get_session_manager"]
+    The worker returned the trace as JSON; it is spliced in rather than
+    rebuilt into models and dumped again.  Without *include_steps*,
+    ``steps`` is ``null``.
+    """
+    encoded = result.encoded_trace
+    total_steps = encoded.total_steps if encoded else 0
+    response = ExecutionResponse(
+        session_id=session_id,
+        execution_id=result.execution_id,
+        status=result.status,
+        trace_format=trace_format.value,
+        total_steps=total_steps,
+        current_step=total_steps,
+        stdout=result.stdout,
+        stderr=result.stderr,
+        error=result.error,
+        execution_time=result.execution_time,
+        queue_time=result.queue_time,
+        metadata=metadata,
+    )
+    body = response.model_dump_json(exclude={"steps"}).encode()
+    steps = encoded.steps if encoded and include_steps else b"null"
+    return body[:-1] + b', "steps": ' + steps + b"}"
@@ -4,16 +4,29 @@ from __future__ import annotations
 
 import json
 import threading
-from typing import Any, Dict, Generator, Optional
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict
+from typing import Any, Dict, Generator, Iterator, Optional
 
 from flask import Blueprint, Response, request, jsonify
 
+from app.api.deps import (
+    client_key,
+    execution_response_json,
+    queue_full_response,
+    requested_trace_format,
+)
+from app.config import settings
 from app.models.execution import (
+    BatchExecutionRequest,
     ExecutionMetadata,
     ExecutionRequest,
-    ExecutionResponse,
+    ExecutionStatus,
+    TestCaseRequest,
 )
-from app.services.executor import execution_service
+from app.services.executor import TestCase, execution_service
 from app.services.session_manager import session_manager
 from app.utils.logger import get_logger
 
@@ -30,41 +43,128 @@ def execute_code():
     except Exception as exc:
         return jsonify(error=str(exc)), 422
 
+    try:
+        trace_format = requested_trace_format(execution_request)
+    except ValueError:
+        return jsonify(error="options.trace_format must be 'full' or 'delta'"), 422
+
     uid = None  # No authentication required
     client_ip = request.remote_addr or "unknown"
     user_agent = request.headers.get("User-Agent", "")
 
     metadata = ExecutionMetadata(ip_address=client_ip, user_agent=user_agent)
+    session_id = execution_request.session_id or str(uuid.uuid4())
 
     result = execution_service.execute(
         execution_request.code,
         execution_request.user_input or "",
         execution_request.session_id,
+        trace_format=trace_format,
+        encoded=True,
+        execution_id=execution_request.execution_id,
+        client=client_key(),
+        keep_trace=True,
     )
+    if result.status == ExecutionStatus.REJECTED:
+        return queue_full_response(result)
 
-    response = ExecutionResponse(
-        session_id=execution_request.session_id or "new-session",
-        status=result.status,
-        steps=(
-            [step.model_dump() for step in result.trace_data.steps]
-            if result.trace_data
-            else None
-        ),
-        total_steps=result.trace_data.total_steps if result.trace_data else 0,
-        current_step=result.trace_data.total_steps if result.trace_data else 0,
-        stdout=result.stdout,
-        stderr=result.stderr,
-        error=result.error,
-        execution_time=result.execution_time,
-        metadata=metadata,
+    # Keep a keyframed copy so the scrubber can fetch single steps later
+    if result.encoded_trace and result.encoded_trace.keyframed is not None:
+        session_manager.store_trace(session_id, result.encoded_trace.keyframed)
+
+    return Response(
+        execution_response_json(result, session_id, trace_format, metadata),
+        mimetype="application/json",
     )
 
-    return jsonify(response.model_dump(mode="json"))
+
+@execution_bp.route("/execute/batch", methods=["POST"])
+def execute_batch():
+    """Run many programs in parallel, streaming results as NDJSON.
+
+    Each line is ``{"type": "result", "index": i, "response": ...}`` for
+    the *i*-th request, in the order runs finish, with the same response
+    as ``/execute``; the last line is ``{"type": "summary", ...}`` with
+    counts and aggregate timings.  Batch traces are not stored for step
+    access, so as not to evict interactive sessions' traces.
+    """
+    data = request.get_json(force=True)
+    try:
+        batch = BatchExecutionRequest(**data)
+    except Exception as exc:
+        return jsonify(error=str(exc)), 422
+
+    programs = []
+    for index, execution_request in enumerate(batch.requests):
+        try:
+            trace_format = requested_trace_format(execution_request)
+        except ValueError:
+            return jsonify(
+                error=f"requests[{index}].options.trace_format must be "
+                "'full' or 'delta'"
+            ), 422
+        programs.append((
+            execution_request.code,
+            execution_request.user_input or "",
+            trace_format,
+            execution_request.execution_id,
+        ))
+    concurrency = min(
+        batch.max_concurrency or settings.BATCH_CONCURRENCY,
+        settings.MAX_BATCH_CONCURRENCY,
+    )
+    results = execution_service.execute_batch(programs, concurrency, client_key())
+
+    def lines() -> Iterator[bytes]:
+        start = time.monotonic()
+        statuses: Counter = Counter()
+        cached = coalesced = 0
+        execution_time = queue_time = slowest = 0.0
+        for index, result in results:
+            statuses[result.status.value] += 1
+            cached += result.cached
+            coalesced += result.coalesced
+            execution_time += result.execution_time
+            queue_time += result.queue_time
+            slowest = max(slowest, result.execution_time)
+            body = execution_response_json(
+                result,
+                batch.requests[index].session_id or "",
+                programs[index][2],
+                include_steps=batch.include_steps,
+            )
+            yield (
+                b'{"type": "result", "index": %d, "response": ' % index
+                + body + b"}\n"
+            )
+
+        total = len(programs)
+        summary = {
+            "type": "summary",
+            "total": total,
+            "statuses": dict(statuses),
+            "unique_sources": len({code for code, *_ in programs}),
+            "cached": cached,
+            "coalesced": coalesced,
+            "concurrency": concurrency,
+            "wall_time": time.monotonic() - start,
+            "execution_time": execution_time,
+            "mean_execution_time": execution_time / total,
+            "max_execution_time": slowest,
+            "queue_time": queue_time,
+        }
+        yield json.dumps(summary).encode() + b"\n"
+
+    return Response(lines(), mimetype="application/x-ndjson")
 
 
 @execution_bp.route("/execute/simple", methods=["POST"])
 def execute_simple():
-    """Execute code without tracing (faster, for simple validation)."""
+    """Execute code without tracing (faster, for simple validation).
+
+    The program runs in the same sandbox as ``/execute`` but with no
+    trace hook, limited by wall time and output size instead of steps.
+    """
     data = request.get_json(force=True)
     try:
         req = ExecutionRequest(**data)
@@ -72,13 +172,67 @@ def execute_simple():
         return jsonify(error=str(exc)), 422
 
     result = execution_service.execute(
-        req.code, req.user_input or ""
+        req.code,
+        req.user_input or "",
+        execution_id=req.execution_id,
+        client=client_key(),
+        traced=False,
     )
+    if result.status == ExecutionStatus.REJECTED:
+        return queue_full_response(result)
     return jsonify(
         success=result.success,
+        status=result.status.value,
         output=result.stdout,
         error=result.error,
         execution_time=result.execution_time,
+        queue_time=result.queue_time,
+    )
+
+
+@execution_bp.route("/execute/test-cases", methods=["POST"])
+def execute_test_cases():
+    """Run one program against many inputs and check each case's output.
+
+    The program is validated and compiled once and its cases run back to
+    back in one worker, untraced unless ``trace`` is set.
+    """
+    data = request.get_json(force=True)
+    try:
+        test_request = TestCaseRequest(**data)
+    except Exception as exc:
+        return jsonify(error=str(exc)), 422
+    if len(test_request.cases) > settings.MAX_TEST_CASES:
+        return jsonify(
+            error=f"At most {settings.MAX_TEST_CASES} test cases per run"
+        ), 422
+
+    result = execution_service.run_test_cases(
+        test_request.code,
+        [
+            TestCase(case.user_input, case.expected_output)
+            for case in test_request.cases
+        ],
+        trace=test_request.trace,
+        execution_id=test_request.execution_id,
+        client=client_key(),
+    )
+    if result.status == ExecutionStatus.REJECTED:
+        return queue_full_response(result)
+
+    cases = result.test_cases or []
+    return jsonify(
+        execution_id=result.execution_id,
+        status=result.status.value,
+        success=result.success,
+        error=result.error,
+        passed=sum(case.passed is True for case in cases),
+        failed=sum(case.passed is False for case in cases),
+        cases=[
+            {**asdict(case), "status": case.status.value} for case in cases
+        ],
+        execution_time=result.execution_time,
+        queue_time=result.queue_time,
     )
 
 
@@ -87,22 +241,44 @@ def execute_stream():
     """Server-sent events endpoint for streaming execution."""
     code = request.args.get("code", "")
     user_input = request.args.get("user_input", "")
+    execution_id = request.args.get("execution_id")
+
+    # Started before responding so a full queue can still get a 503
+    stream = execution_service.execute_stream(
+        code, user_input, execution_id, client=client_key()
+    )
+    if stream.rejected:
+        return queue_full_response(stream.result)
 
     def event_generator() -> Generator[str, None, None]:
-        result = execution_service.execute(code, user_input)
-
-        if result.trace_data:
-            for i, step in enumerate(result.trace_data.steps):
-                payload = {
-                    "type": "step",
-                    "step_number": i + 1,
-                    "total_steps": result.trace_data.total_steps,
-                    "data": step.model_dump(),
-                }
-                yield f"data: {json.dumps(payload)}\n\n"
-
-        yield (
-            f"data: {json.dumps({'type': 'done', 'execution_time': result.execution_time})}\n\n"
-        )
+        # Steps are forwarded as the worker records them; the total is
+        # only known once the program has finished
+        start = {"type": "start", "execution_id": stream.execution_id}
+        yield f"data: {json.dumps(start)}\n\n"
+        for i, step in enumerate(stream):
+            yield (
+                f'data: {{"type": "step", "step_number": {i + 1}, '
+                f'"total_steps": null, "data": {step}}}\n\n'
+            )
+
+        result = stream.result
+        done = {
+            "type": "done",
+            "status": result.status.value,
+            "success": result.success,
+            "error": result.error,
+            "total_steps": stream.total_steps,
+            "execution_time": result.execution_time,
+            "queue_time": result.queue_time,
+        }
+        yield f"data: {json.dumps(done)}\n\n"
 
     return Response(event_generator(), mimetype="text/event-stream")
+
+
+@execution_bp.route("/executions/<execution_id>", methods=["DELETE"])
+def cancel_execution(execution_id: str):
+    """Cancel a run that is still executing."""
+    if not execution_service.cancel(execution_id):
+        return jsonify(error="Execution not found or already finished"), 404
+    return jsonify(execution_id=execution_id, cancelled=True)
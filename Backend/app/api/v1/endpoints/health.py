@@ -5,6 +5,9 @@ from __future__ import annotations
 from flask import Blueprint, Response, jsonify
 
 from app.config import settings
+from app.services.executor import execution_service
+from app.services.job_manager import job_manager
+from app.services.session_manager import session_manager
 
 health_bp = Blueprint("health", __name__)
 
@@ -27,9 +30,51 @@ def readiness_check():
             "executor": "ok",
             "memory": "ok",
         },
+        pool=execution_service.pool_stats(),
+        cache=execution_service.cache_stats(),
+        sources=execution_service.source_cache_stats(),
+        coalescing=execution_service.coalescing_stats(),
+        jobs=job_manager.stats(),
+        traces=session_manager.trace_stats(),
     )
 
 
+@health_bp.route("/health/pool")
+def pool_health():
+    """Worker pool occupancy and kill/crash/restart counters."""
+    return jsonify(execution_service.pool_stats())
+
+
+@health_bp.route("/health/cache")
+def cache_health():
+    """Result cache hit ratio, bytes saved and occupancy."""
+    return jsonify(execution_service.cache_stats())
+
+
+@health_bp.route("/health/sources")
+def sources_health():
+    """Hit ratio of the parsed-program cache."""
+    return jsonify(execution_service.source_cache_stats())
+
+
+@health_bp.route("/health/coalescing")
+def coalescing_health():
+    """Requests in flight and how many shared an identical run."""
+    return jsonify(execution_service.coalescing_stats())
+
+
+@health_bp.route("/health/jobs")
+def jobs_health():
+    """Background jobs pending, and the finished-job store's occupancy."""
+    return jsonify(job_manager.stats())
+
+
+@health_bp.route("/health/traces")
+def traces_health():
+    """Occupancy of the stored traces and of their parsed copies."""
+    return jsonify(session_manager.trace_stats())
+
+
 @health_bp.route("/metrics")
 def metrics():
     try:
@@ -34,6 +34,33 @@ def get_session(session_id: str):
     return jsonify(session.model_dump(mode="json"))
 
 
+@sessions_bp.route("/sessions/<session_id>/steps/<int:step>")
+def get_session_step(session_id: str, step: int):
+    """Return one full step of a stored trace (seeks via keyframes)."""
+    steps = session_manager.get_steps(session_id, step)
+    if steps is None:
+        return jsonify(error="Session trace not found"), 404
+    if not steps:
+        return jsonify(error="Step out of range"), 404
+    return jsonify(steps[0].model_dump(mode="json"))
+
+
+@sessions_bp.route("/sessions/<session_id>/steps")
+def get_session_steps(session_id: str):
+    """Return a window of full steps: ``?start=<n>&count=<k>``."""
+    start = max(request.args.get("start", 0, type=int), 0)
+    count = min(max(request.args.get("count", 50, type=int), 1), 500)
+    steps = session_manager.get_steps(session_id, start, count)
+    if steps is None:
+        return jsonify(error="Session trace not found"), 404
+    trace = session_manager.get_trace(session_id)
+    return jsonify(
+        start=start,
+        total_steps=len(trace.deltas) if trace else 0,
+        steps=[s.model_dump(mode="json") for s in steps],
+    )
+
+
 @sessions_bp.route("/sessions/<session_id>", methods=["DELETE"])
 def delete_session(session_id: str):
     """Delete an execution session."""
@@ -1,11 +1,21 @@
 """Server-Sent Events (SSE) endpoints for real-time code execution."""
 
 import json
-import time
 from flask import Blueprint, Response, request, jsonify
 
-from app.models.execution import ExecutionRequest, ExecutionMetadata
+from app.api.deps import (
+    client_key,
+    execution_response_json,
+    queue_full_response,
+    requested_trace_format,
+)
+from app.models.execution import (
+    ExecutionMetadata,
+    ExecutionRequest,
+    ExecutionStatus,
+)
 from app.services.executor import execution_service
+from app.services.job_manager import job_manager
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -21,50 +31,52 @@ def execute_code_stream():
     except Exception as exc:
         return jsonify(error=str(exc)), 422
 
-    client_ip = request.remote_addr or "unknown"
-    user_agent = request.headers.get("User-Agent", "")
-    metadata = ExecutionMetadata(ip_address=client_ip, user_agent=user_agent)
+    # Started before responding so a full queue can still get a 503
+    stream = execution_service.execute_stream(
+        execution_request.code,
+        execution_request.user_input or "",
+        execution_request.execution_id,
+        client=client_key(),
+    )
+    if stream.rejected:
+        return queue_full_response(stream.result)
 
     def generate():
         """Generator function to stream execution events."""
         try:
             # Send initial event
-            yield f"data: {json.dumps({'type': 'start', 'message': 'Execution started'})}\n\n"
-            
-            # Execute code and get result
-            result = execution_service.execute(
-                code=execution_request.code,
-                uid=None,  # No auth required
-                metadata=metadata,
-            )
-            
+            start_data = {
+                'type': 'start',
+                'message': 'Execution started',
+                'execution_id': stream.execution_id,
+            }
+            yield f"data: {json.dumps(start_data)}\n\n"
+
+            # Forward each step as soon as the worker records it; the total
+            # is not known until the program finishes
+            for i, step in enumerate(stream):
+                yield (
+                    f'data: {{"type": "step", "step_number": {i + 1}, '
+                    f'"total_steps": null, "step_data": {step}}}\n\n'
+                )
+
+            result = stream.result
             if result.error:
                 yield f"data: {json.dumps({'type': 'error', 'error': result.error})}\n\n"
                 return
-                
-            # Stream each execution step
-            for i, step in enumerate(result.steps or []):
-                step_data = {
-                    'type': 'step',
-                    'step_number': i + 1,
-                    'total_steps': len(result.steps),
-                    'step_data': step
-                }
-                yield f"data: {json.dumps(step_data)}\n\n"
-                time.sleep(0.1)  # Small delay for better UX
-                
+
             # Send completion event
             completion_data = {
                 'type': 'complete',
                 'result': {
-                    'steps': result.steps,
-                    'total_steps': result.total_steps,
+                    'total_steps': stream.total_steps,
                     'stdout': result.stdout,
-                    'execution_time_ms': result.execution_time_ms
+                    'execution_time_ms': result.execution_time * 1000,
+                    'queue_time_ms': result.queue_time * 1000,
                 }
             }
             yield f"data: {json.dumps(completion_data)}\n\n"
-            
+
         except Exception as exc:
             error_data = {
                 'type': 'error',
@@ -89,66 +101,72 @@ def execute_code_stream():
 
 @stream_bp.route("/execute-poll", methods=["POST"])
 def execute_code_poll():
-    """Execute Python code and return job ID for polling."""
+    """Start executing Python code and return a job ID to poll."""
     data = request.get_json(force=True)
     try:
         execution_request = ExecutionRequest(**data)
     except Exception as exc:
         return jsonify(error=str(exc)), 422
 
-    # For simplicity, execute immediately and store result
-    # In a real app, you'd use a task queue like Celery
-    import uuid
-    job_id = str(uuid.uuid4())
-    
+    try:
+        trace_format = requested_trace_format(execution_request)
+    except ValueError:
+        return jsonify(error="options.trace_format must be 'full' or 'delta'"), 422
+
     client_ip = request.remote_addr or "unknown"
     user_agent = request.headers.get("User-Agent", "")
     metadata = ExecutionMetadata(ip_address=client_ip, user_agent=user_agent)
 
-    try:
-        result = execution_service.execute(
-            code=execution_request.code,
-            uid=None,
-            metadata=metadata,
-        )
-        
-        # Store result in memory (use Redis/database in production)
-        if not hasattr(execute_code_poll, '_results'):
-            execute_code_poll._results = {}
-        
-        execute_code_poll._results[job_id] = {
-            'status': 'completed',
-            'result': result.model_dump(),
-            'timestamp': time.time()
-        }
-        
-    except Exception as exc:
-        execute_code_poll._results[job_id] = {
-            'status': 'error',
-            'error': str(exc),
-            'timestamp': time.time()
-        }
+    # Returns once the run is queued; the program runs on the worker pool
+    job = job_manager.submit(
+        execution_request.code,
+        execution_request.user_input or "",
+        trace_format=trace_format,
+        client=client_key(),
+        session_id=execution_request.session_id,
+        metadata=metadata,
+    )
+    if job.result is not None and job.result.status == ExecutionStatus.REJECTED:
+        return queue_full_response(job.result)
 
     return jsonify({
-        'job_id': job_id,
-        'status': 'submitted',
-        'poll_url': f'/api/v1/jobs/{job_id}'
-    })
+        'job_id': job.job_id,
+        'execution_id': job.execution_id,
+        'session_id': job.session_id,
+        'status': job_manager.status(job).value,
+        'poll_url': f'/api/v1/jobs/{job.job_id}'
+    }), 202
 
 
 @stream_bp.route("/jobs/<job_id>", methods=["GET"])
 def get_job_status(job_id: str):
-    """Get execution job status and result."""
-    if not hasattr(execute_code_poll, '_results'):
+    """Get execution job status and, once it has finished, its result."""
+    job = job_manager.get(job_id)
+    if job is None:
         return jsonify(error="Job not found"), 404
-        
-    result = execute_code_poll._results.get(job_id)
-    if not result:
+
+    status = job_manager.status(job)
+    if job.result is None:
+        return jsonify({
+            'job_id': job.job_id,
+            'execution_id': job.execution_id,
+            'status': status.value,
+        })
+
+    # The result is the /execute response, with the trace spliced in as is
+    head = json.dumps({'job_id': job.job_id, 'status': status.value})
+    result = execution_response_json(
+        job.result, job.session_id, job.trace_format, job.metadata
+    )
+    return Response(
+        head[:-1].encode() + b', "result": ' + result + b"}",
+        mimetype="application/json",
+    )
+
+
+@stream_bp.route("/jobs/<job_id>", methods=["DELETE"])
+def delete_job(job_id: str):
+    """Cancel a job that is still running, and forget it."""
+    if not job_manager.delete(job_id):
         return jsonify(error="Job not found"), 404
-        
-    # Clean up old results (simple TTL)
-    if time.time() - result['timestamp'] > 300:  # 5 minutes
-        del execute_code_poll._results[job_id]
-        return jsonify(error="Job expired"), 404
-        
-    return jsonify(result)
\ No newline at end of file
+    return jsonify(job_id=job_id, deleted=True)
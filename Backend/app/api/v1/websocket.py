@@ -9,6 +9,7 @@ from typing import Any, Dict, Set
 
 from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
 
+from app.api.deps import client_key
 from app.models.user import WebSocketMessage
 from app.services.executor import execution_service
 from app.utils.logger import get_logger
@@ -24,6 +25,7 @@ class ConnectionManager:
     def __init__(self) -> None:
         self.active_connections: Dict[str, str] = {}  # sid -> connection_id
         self.session_rooms: Dict[str, Set[str]] = {}
+        self.executions: Dict[str, str] = {}  # sid -> running execution_id
 
     def connect(self, sid: str) -> str:
         connection_id = str(uuid.uuid4())
@@ -32,6 +34,10 @@ class ConnectionManager:
         return connection_id
 
     def disconnect(self, sid: str) -> None:
+        # Nobody is left to receive the steps of a run still in flight
+        execution_id = self.executions.pop(sid, None)
+        if execution_id:
+            execution_service.cancel(execution_id)
         connection_id = self.active_connections.pop(sid, None)
         if connection_id:
             for conns in self.session_rooms.values():
@@ -85,35 +91,55 @@ def register_events(socketio: SocketIO) -> None:
     @socketio.on("execute")
     def handle_execute(data):
         """Handle code execution requests."""
+        from flask import request
+        sid = request.sid
         code = data.get("code", "")
         user_input = data.get("user_input", "")
 
+        # A new run from the same client replaces the one in flight
+        previous = manager.executions.get(sid)
+        if previous:
+            execution_service.cancel(previous)
+
+        stream = execution_service.execute_stream(
+            code,
+            user_input,
+            data.get("execution_id"),
+            client=client_key(),
+        )
+        manager.executions[sid] = stream.execution_id
+
         emit("message", WebSocketMessage(
-            type="start", data={"code_length": len(code)}
+            type="start",
+            data={"code_length": len(code), "execution_id": stream.execution_id},
         ).model_dump())
 
         try:
-            result = execution_service.execute(code, user_input)
-
-            if result.trace_data:
-                for i, step in enumerate(result.trace_data.steps):
-                    emit("message", WebSocketMessage(
-                        type="step",
-                        data={
-                            "type": "step",
-                            "step_number": i + 1,
-                            "total_steps": len(result.trace_data.steps),
-                            "data": step.model_dump(),
-                        },
-                    ).model_dump())
-
+            # Steps are emitted while the program runs; total_steps is only
+            # known in the "complete" message
+            for i, step in enumerate(stream):
+                emit("message", WebSocketMessage(
+                    type="step",
+                    data={
+                        "type": "step",
+                        "step_number": i + 1,
+                        "total_steps": None,
+                        "data": json.loads(step),
+                    },
+                ).model_dump())
+
+            result = stream.result
             emit("message", WebSocketMessage(
                 type="complete",
                 data={
+                    "execution_id": stream.execution_id,
+                    "status": result.status.value,
                     "success": result.success,
                     "stdout": result.stdout,
                     "error": result.error,
                     "execution_time": result.execution_time,
+                    "queue_time": result.queue_time,
+                    "total_steps": stream.total_steps,
                 },
             ).model_dump())
 
@@ -123,6 +149,10 @@ def register_events(socketio: SocketIO) -> None:
                 type="error", error=str(exc)
             ).model_dump())
 
+        finally:
+            if manager.executions.get(sid) == stream.execution_id:
+                del manager.executions[sid]
+
     @socketio.on("ping")
     def handle_ping(data):
         emit("message", WebSocketMessage(
@@ -132,7 +162,15 @@ def register_events(socketio: SocketIO) -> None:
 
     @socketio.on("cancel")
     def handle_cancel(data=None):
-        emit("message", WebSocketMessage(type="cancelled").model_dump())
+        """Stop this client's run (or the one named by ``execution_id``)."""
+        from flask import request
+        execution_id = data.get("execution_id") if isinstance(data, dict) else None
+        execution_id = execution_id or manager.executions.get(request.sid)
+        cancelled = bool(execution_id) and execution_service.cancel(execution_id)
+        emit("message", WebSocketMessage(
+            type="cancelled",
+            data={"execution_id": execution_id, "cancelled": cancelled},
+        ).model_dump())
 
     # ------------------------------------------------------------------
     # Collaboration room support
@@ -1,7 +1,7 @@
 """Application configuration – environment-based settings."""
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class Settings(BaseSettings):
@@ -37,6 +37,81 @@ class Settings(BaseSettings):
     MAX_OUTPUT_LENGTH: int = 10000
     MAX_CODE_LENGTH: int = 50000
     MAX_STEPS: int = 1000
+    # Seconds a cancelled run gets to stop at a step boundary before its
+    # worker process is killed
+    CANCEL_GRACE_PERIOD: float = 0.2
+
+    # Admission control: executions that may wait for a free worker before
+    # new ones are turned away with 503, how long one may wait (its
+    # MAX_EXECUTION_TIME only starts once a worker takes it), and the
+    # Retry-After sent with a rejection
+    MAX_QUEUED_EXECUTIONS: int = 32
+    MAX_QUEUE_WAIT: float = 30.0
+    QUEUE_RETRY_AFTER: int = 2
+
+    # Fair scheduling: queued executions are served round-robin across
+    # clients (by IP address), each priority class getting this many turns
+    # per round, and one client may hold at most MAX_QUEUED_PER_CLIENT of
+    # the MAX_QUEUED_EXECUTIONS places
+    SCHEDULER_WEIGHTS: Dict[str, int] = {"interactive": 4, "batch": 1}
+    MAX_QUEUED_PER_CLIENT: int = 8
+
+    # /execute/batch: runs of one batch in flight at once, unless the
+    # request asks for fewer (or more, up to MAX_BATCH_CONCURRENCY)
+    BATCH_CONCURRENCY: int = 4
+    MAX_BATCH_CONCURRENCY: int = 8
+
+    # Test-case runs (run_test_cases): wall time per case, and cases per run
+    TEST_CASE_TIME_LIMIT: float = 2.0
+    MAX_TEST_CASES: int = 50
+
+    # Tracing backend: "auto" (sys.monitoring on 3.12+), "settrace", "monitoring"
+    TRACE_BACKEND: str = "auto"
+
+    # Character budgets for value reprs in traces, keyed by variable type
+    # ("other" covers types without an entry)
+    REPR_LIMITS: Dict[str, int] = {
+        "str": 1000,
+        "list": 200,
+        "tuple": 200,
+        "dict": 200,
+        "set": 200,
+        "other": 100,
+    }
+
+    # How worker processes are started: "forkserver" forks them from a server
+    # process that has the tracer and ALLOWED_MODULES imported already;
+    # "spawn" starts each one from scratch.  Falls back to "spawn" where
+    # forkserver is unavailable.
+    WORKER_START_METHOD: str = "forkserver"
+
+    # Streaming: the worker sends recorded steps to the server once
+    # STREAM_BATCH_SIZE are pending or STREAM_FLUSH_INTERVAL seconds have
+    # passed since the last batch
+    STREAM_BATCH_SIZE: int = 50
+    STREAM_FLUSH_INTERVAL: float = 0.05
+
+    # Result cache for repeated runs of the same program (0 bytes disables it)
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL: int = 600  # seconds
+
+    # Parsed, validated and compiled programs, by source hash
+    SOURCE_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    SOURCE_CACHE_TTL: int = 3600  # seconds
+
+    # Results of /execute-poll jobs: memory budget (oldest dropped first),
+    # how long a finished job is kept, and how often expired ones are swept
+    JOB_RESULTS_MAX_BYTES: int = 64 * 1024 * 1024
+    JOB_RESULT_TTL: int = 300  # seconds
+    JOB_SWEEP_INTERVAL: int = 30  # seconds
+
+    # Trace storage: traces kept for step access as JSON within a memory
+    # budget (least recently used dropped first), plus parsed copies of
+    # the ones being read within a budget of their own
+    TRACE_KEYFRAME_INTERVAL: int = 50
+    TRACE_STORE_MAX_BYTES: int = 64 * 1024 * 1024
+    TRACE_STORE_TTL: int = 3600  # seconds
+    PARSED_TRACES_MAX_BYTES: int = 64 * 1024 * 1024
 
     # Sandbox
     ALLOWED_BUILTINS: List[str] = [
@@ -2,7 +2,15 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict
+import builtins
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import settings
 
 
 def compile_code(code: str, filename: str = "<string>") -> Any:
@@ -13,3 +21,161 @@ def compile_code(code: str, filename: str = "<string>") -> Any:
 def execute_code(compiled: Any, exec_globals: Dict[str, Any]) -> None:
     """Execute a compiled code object inside *exec_globals*."""
     exec(compiled, exec_globals)  # noqa: S102
+
+
+class SandboxBuiltins:
+    """The builtins a sandboxed program runs with.
+
+    ``settings.ALLOWED_BUILTINS`` as they are, plus an ``input`` that
+    returns the lines of *user_input* one at a time, a ``print`` and an
+    ``open`` that refuses.  Output goes to *write*.  With *echo_input*
+    each line read is echoed after its prompt, as a terminal would;
+    without it only the prompt is written, as with input from a pipe, so
+    the output can be compared with an expected one.  Both the traced
+    and the untraced runner use it, so a program sees the same sandbox
+    either way.
+    """
+
+    def __init__(
+        self, user_input: str, write: Callable[[str], Any], echo_input: bool = True
+    ) -> None:
+        self.input_lines = user_input.split("\n") if user_input else []
+        self.input_index = 0
+        self.write = write
+        self.echo_input = echo_input
+
+    def namespace(self) -> Dict[str, Any]:
+        """A fresh ``__builtins__`` dict for one run."""
+        safe: Dict[str, Any] = {}
+        for name in settings.ALLOWED_BUILTINS:
+            if hasattr(builtins, name):
+                safe[name] = getattr(builtins, name)
+        safe["input"] = self.input
+        safe["print"] = self.print
+        safe["open"] = self.open
+        return safe
+
+    def input(self, prompt: str = "") -> str:
+        result = ""
+        if self.input_index < len(self.input_lines):
+            result = self.input_lines[self.input_index]
+            self.input_index += 1
+        if self.echo_input:
+            self.write(f"{prompt}{result}\n")
+        elif prompt:
+            self.write(prompt)
+        return result
+
+    def print(self, *args: Any, sep: str = " ", end: str = "\n", **kwargs: Any) -> None:
+        self.write(sep.join(str(a) for a in args) + end)
+
+    @staticmethod
+    def open(*args: Any, **kwargs: Any) -> None:
+        raise PermissionError("File operations are not allowed")
+
+
+class TimeLimitExceeded(BaseException):
+    """Raised into a program whose wall-time limit is up.
+
+    Derives from ``BaseException`` so ``except Exception`` in user code
+    does not swallow it.
+    """
+
+
+@contextmanager
+def time_limit(seconds: Optional[float]) -> Iterator[None]:
+    """Raise :class:`TimeLimitExceeded` in the block after *seconds*.
+
+    Uses ``SIGALRM``, so it only applies on Unix in the main thread (as
+    in a pool worker); elsewhere, or with ``None``, there is no limit.
+    """
+    if (
+        seconds is None
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def expire(signum: int, frame: Any) -> None:
+        raise TimeLimitExceeded()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class _OutputLimitExceeded(BaseException):
+    """Raised into a program that printed more than its output budget."""
+
+
+@dataclass
+class PlainRun:
+    """Outcome of an untraced run."""
+
+    stdout: str
+    error: Optional[str]  # "ZeroDivisionError: division by zero", say
+    execution_time: float
+
+
+class PlainRunner:
+    """Runs a compiled program without tracing.
+
+    The program gets the same :class:`SandboxBuiltins` as under
+    :class:`~app.core.trace_collector.TraceCollector`, so its output is
+    the same either way; only no trace hook is installed, so it runs at
+    close to native speed.  Exceptions raised by the program end up in
+    :attr:`PlainRun.error`, as does printing more than *max_output*
+    characters (the output is cut there); :class:`TimeLimitExceeded` and
+    other ``BaseException`` subclasses propagate.  *echo_input* is passed
+    on to :class:`SandboxBuiltins`.
+    """
+
+    def __init__(
+        self,
+        user_input: str = "",
+        max_output: Optional[int] = None,
+        echo_input: bool = True,
+    ) -> None:
+        self.builtins = SandboxBuiltins(user_input, self._write, echo_input)
+        self.stdout_capture: List[str] = []
+        self.max_output = max_output
+        self.output_length = 0
+
+    def stdout(self) -> str:
+        """The output so far, e.g. of a program stopped by a time limit."""
+        return "".join(self.stdout_capture)
+
+    def execute(self, compiled: Any) -> PlainRun:
+        exec_globals: Dict[str, Any] = {
+            "__builtins__": self.builtins.namespace(),
+            "__name__": "__main__",
+            "__doc__": None,
+        }
+        error: Optional[str] = None
+        start = time.perf_counter()
+        try:
+            execute_code(compiled, exec_globals)
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+        except _OutputLimitExceeded:
+            error = f"Output limit exceeded ({self.max_output} characters)"
+        return PlainRun(
+            stdout=self.stdout(),
+            error=error,
+            execution_time=time.perf_counter() - start,
+        )
+
+    def _write(self, text: str) -> None:
+        if self.max_output is not None:
+            room = self.max_output - self.output_length
+            if len(text) > room:
+                self.stdout_capture.append(text[:room])
+                self.output_length = self.max_output
+                raise _OutputLimitExceeded()
+        self.stdout_capture.append(text)
+        self.output_length += len(text)
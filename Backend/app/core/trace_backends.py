@@ -0,0 +1,269 @@
+"""Event sources for :class:`~app.core.trace_collector.TraceCollector`.
+
+A backend hooks into the interpreter and feeds ``(frame, event, arg)``
+triples in ``sys.settrace`` vocabulary (``call`` / ``line`` / ``return`` /
+``exception``) to :meth:`TraceCollector.handle_event`.  Both backends
+filter frames with the collector's :class:`CodeFilter` and produce the
+same :class:`~app.models.trace.TraceData`.
+
+* :class:`SettraceBackend` – ``sys.settrace``; works on every interpreter.
+* :class:`MonitoringBackend` – ``sys.monitoring`` (PEP 669, Python 3.12+);
+  library code is switched off per code location with ``DISABLE`` so it
+  costs nothing after the first event.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import types
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Type
+
+from app.utils.logger import get_logger
+
+if TYPE_CHECKING:
+    from app.core.trace_collector import TraceCollector
+
+logger = get_logger(__name__)
+
+
+class TraceBackend:
+    """Base class: install and remove the interpreter hook for one run."""
+
+    name = "base"
+
+    def __init__(self, collector: "TraceCollector") -> None:
+        self.collector = collector
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    def start(self) -> None:
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        raise NotImplementedError
+
+
+# ------------------------------------------------------------------
+# sys.settrace
+# ------------------------------------------------------------------
+
+class SettraceBackend(TraceBackend):
+    """Classic per-thread tracing through ``sys.settrace``."""
+
+    name = "settrace"
+
+    def __init__(self, collector: "TraceCollector") -> None:
+        super().__init__(collector)
+        self._original_trace: Any = None
+
+    def start(self) -> None:
+        self._original_trace = sys.gettrace()
+        sys.settrace(self.trace_function)
+
+    def stop(self) -> None:
+        sys.settrace(self._original_trace)
+
+    def trace_function(
+        self,
+        frame: types.FrameType,
+        event: str,
+        arg: Any,
+    ) -> Optional[Callable[..., Any]]:
+        # Returning None from the "call" event turns off local tracing, so
+        # skipped frames stop producing line events altogether
+        if self.collector.code_filter.is_internal(frame.f_code):
+            return None
+        if not self.collector.handle_event(frame, event, arg):
+            return None
+        return self.trace_function
+
+
+# ------------------------------------------------------------------
+# sys.monitoring (PEP 669)
+# ------------------------------------------------------------------
+
+class MonitoringBackend(TraceBackend):
+    """Low-overhead tracing through ``sys.monitoring`` (Python 3.12+).
+
+    Events are mapped onto their ``sys.settrace`` equivalents the same way
+    CPython's own settrace shim does, so the recorded steps match
+    :class:`SettraceBackend` exactly.
+    """
+
+    name = "monitoring"
+
+    TOOL_ID = 0  # sys.monitoring.DEBUGGER_ID
+    TOOL_NAME = "pi-tracer"
+
+    def __init__(self, collector: "TraceCollector") -> None:
+        super().__init__(collector)
+        self._thread_id = 0
+        self._active = False
+        # code object -> {instruction offset: line}, for JUMP events
+        self._line_tables: Dict[types.CodeType, Dict[int, Optional[int]]] = {}
+
+    @classmethod
+    def available(cls) -> bool:
+        monitoring = getattr(sys, "monitoring", None)
+        return monitoring is not None and monitoring.get_tool(cls.TOOL_ID) is None
+
+    def start(self) -> None:
+        monitoring = sys.monitoring
+        events = monitoring.events
+        self._thread_id = threading.get_ident()
+        monitoring.use_tool_id(self.TOOL_ID, self.TOOL_NAME)
+        callbacks: Dict[int, Callable[..., Any]] = {
+            events.PY_START: self._on_call,
+            events.PY_RESUME: self._on_call,
+            events.PY_THROW: self._on_throw,
+            events.LINE: self._on_line,
+            events.JUMP: self._on_jump,
+            events.PY_RETURN: self._on_return,
+            events.PY_YIELD: self._on_return,
+            events.PY_UNWIND: self._on_unwind,
+            events.RAISE: self._on_raise,
+            events.STOP_ITERATION: self._on_raise,
+        }
+        for event, callback in callbacks.items():
+            monitoring.register_callback(self.TOOL_ID, event, callback)
+        # Locations disabled by an earlier run in this process fire again
+        monitoring.restart_events()
+        event_set = 0
+        for event in callbacks:
+            event_set |= event
+        monitoring.set_events(self.TOOL_ID, event_set)
+        self._active = True
+
+    def stop(self) -> None:
+        if not self._active:
+            return
+        self._active = False
+        monitoring = sys.monitoring
+        monitoring.set_events(self.TOOL_ID, monitoring.events.NO_EVENTS)
+        for event in (
+            monitoring.events.PY_START, monitoring.events.PY_RESUME,
+            monitoring.events.PY_THROW, monitoring.events.LINE,
+            monitoring.events.JUMP,
+            monitoring.events.PY_RETURN, monitoring.events.PY_YIELD,
+            monitoring.events.PY_UNWIND, monitoring.events.RAISE,
+            monitoring.events.STOP_ITERATION,
+        ):
+            monitoring.register_callback(self.TOOL_ID, event, None)
+        monitoring.free_tool_id(self.TOOL_ID)
+        self._line_tables.clear()
+
+    # ---- callbacks ----
+
+    def _dispatch(self, event: str, arg: Any) -> None:
+        # _getframe(2): the monitored frame, above _dispatch and the callback
+        if not self.collector.handle_event(sys._getframe(2), event, arg):
+            # Step budget spent: stop every event, not just this location
+            sys.monitoring.set_events(
+                self.TOOL_ID, sys.monitoring.events.NO_EVENTS
+            )
+
+    def _skip(self, code: types.CodeType) -> bool:
+        return (
+            threading.get_ident() != self._thread_id
+            or self.collector.code_filter.is_internal(code)
+        )
+
+    def _on_call(self, code: types.CodeType, offset: int, *args: Any) -> Any:
+        if self.collector.code_filter.is_internal(code):
+            return sys.monitoring.DISABLE
+        if threading.get_ident() == self._thread_id:
+            self._dispatch("call", None)
+        return None
+
+    def _on_throw(self, code: types.CodeType, offset: int, exc: BaseException) -> None:
+        # PY_THROW cannot be disabled per location
+        if not self._skip(code):
+            self._dispatch("call", None)
+
+    def _on_line(self, code: types.CodeType, line: int) -> Any:
+        if self.collector.code_filter.is_internal(code):
+            return sys.monitoring.DISABLE
+        if threading.get_ident() == self._thread_id:
+            self._dispatch("line", None)
+        return None
+
+    def _on_jump(self, code: types.CodeType, src: int, dest: int) -> Any:
+        # LINE only fires when the line number changes; settrace also
+        # reports a backward jump within one line (``while x: x -= 1``)
+        # Forward jumps never revisit a line
+        if dest > src or self.collector.code_filter.is_internal(code):
+            return sys.monitoring.DISABLE
+        if threading.get_ident() == self._thread_id:
+            lines = self._line_table(code)
+            if lines.get(dest) == lines.get(src) is not None:
+                self._dispatch("line", None)
+        return None
+
+    def _line_table(self, code: types.CodeType) -> Dict[int, Optional[int]]:
+        table = self._line_tables.get(code)
+        if table is None:
+            table = {}
+            for start, end, line in code.co_lines():
+                for offset in range(start, end, 2):
+                    table[offset] = line
+            self._line_tables[code] = table
+        return table
+
+    def _on_return(self, code: types.CodeType, offset: int, retval: Any) -> Any:
+        if self.collector.code_filter.is_internal(code):
+            return sys.monitoring.DISABLE
+        if threading.get_ident() == self._thread_id:
+            self._dispatch("return", retval)
+        return None
+
+    # PY_UNWIND and RAISE cannot be disabled per location either
+
+    def _on_unwind(self, code: types.CodeType, offset: int, exc: BaseException) -> None:
+        if not self._skip(code):
+            self._dispatch("return", None)
+
+    def _on_raise(self, code: types.CodeType, offset: int, exc: Any) -> None:
+        if self._skip(code):
+            return
+        if not isinstance(exc, BaseException):
+            # STOP_ITERATION passes the iterator's return value
+            exc = StopIteration(exc)
+        self._dispatch("exception", (type(exc), exc, exc.__traceback__))
+
+
+# ------------------------------------------------------------------
+# Selection
+# ------------------------------------------------------------------
+
+BACKENDS: Dict[str, Type[TraceBackend]] = {
+    SettraceBackend.name: SettraceBackend,
+    MonitoringBackend.name: MonitoringBackend,
+}
+
+
+def create_backend(collector: "TraceCollector", name: str = "auto") -> TraceBackend:
+    """Return a backend instance for *collector*.
+
+    ``"auto"`` prefers ``sys.monitoring`` and falls back to ``sys.settrace``
+    on interpreters without it (or when its tool slot is taken).
+    """
+    if name == "auto":
+        name = (
+            MonitoringBackend.name
+            if MonitoringBackend.available()
+            else SettraceBackend.name
+        )
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown trace backend {name!r} (expected one of: auto, "
+            f"{', '.join(BACKENDS)})"
+        ) from None
+    if not backend_cls.available():
+        logger.warning(f"Trace backend {name!r} unavailable, using settrace")
+        backend_cls = SettraceBackend
+    return backend_cls(collector)
@@ -1,43 +1,80 @@
-"""Trace data collection using sys.settrace."""
+"""Trace data collection via a pluggable tracing backend."""
 
 from __future__ import annotations
 
-import builtins
+import inspect
 import sys
 import time
 import types
+import weakref
+from functools import partial
+from itertools import islice
 from dataclasses import dataclass, field
-from typing import Any, Callable, Dict, List, Optional
+from typing import (
+    Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple,
+)
 
 from app.config import settings
-from app.models.trace import (
-    ExecutionEvent,
-    ExecutionStep,
-    Frame,
-    HeapObject,
-    TraceData,
-    Variable,
-    VariableType,
+from app.core.execution_engine import SandboxBuiltins
+from app.core.trace_backends import create_backend
+from app.core.trace_records import (
+    FrameRecord,
+    HeapRecord,
+    StepRecord,
+    VariableRecord,
 )
+from app.core.trace_store import TraceStore, trace_view
+from app.models.trace import ExecutionEvent, TraceData, VariableType
+from app.utils.bounded_repr import bounded_repr
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Bump whenever a change alters the steps recorded for the same program;
+# cached results from other versions are then never served
+TRACER_VERSION = 1
+
 
 # ------------------------------------------------------------------
 # Internal state
 # ------------------------------------------------------------------
 
+@dataclass
+class StackEntry:
+    """A user frame on the shadow call stack and its last snapshot."""
+
+    frame: types.FrameType
+    record: Optional[FrameRecord] = None
+    # False until captured, or once the frame has run on since
+    current: bool = False
+    # Names map the snapshot was built with (compared by identity)
+    globals_names: Optional[Dict[str, str]] = None
+    # Heap ids referenced by the snapshot's variables
+    heap_ids: FrozenSet[int] = frozenset()
+    # (object, length) for sized objects without a heap fingerprint
+    lengths: Tuple[Tuple[Any, int], ...] = ()
+    # Local bindings at capture time, kept only for frames whose locals
+    # other frames can rebind (module/class bodies, frames with cells)
+    bindings: Optional[Tuple[Tuple[str, Any], ...]] = None
+
+
 @dataclass
 class CollectorState:
     """Mutable state carried throughout a single trace run."""
 
-    steps: List[ExecutionStep] = field(default_factory=list)
-    heap_objects: Dict[int, HeapObject] = field(default_factory=dict)
+    store: TraceStore = field(default_factory=TraceStore)
+    heap_objects: Dict[int, HeapRecord] = field(default_factory=dict)
+    # list(heap_objects.values()), rebuilt only after the heap changes
+    heap_snapshot: Optional[List[HeapRecord]] = None
     object_id_map: Dict[int, int] = field(default_factory=dict)
     next_heap_id: int = 1
+    # heap_id -> live object; holding the reference keeps id() stable
+    tracked_objects: Dict[int, Any] = field(default_factory=dict)
+    # heap_id -> fingerprint of a mutable container at its last serialization
+    fingerprints: Dict[int, int] = field(default_factory=dict)
     stdout_buffer: List[str] = field(default_factory=list)
-    call_stack: List[Frame] = field(default_factory=list)
+    # Shadow stack of user frames, outermost first
+    call_stack: List[StackEntry] = field(default_factory=list)
     current_step: int = 0
     code_lines: List[str] = field(default_factory=list)
     start_time: float = 0.0
@@ -45,61 +82,128 @@ class CollectorState:
 
     # ---- heap helpers ----
 
-    def get_heap_id(self, obj: Any) -> int:
+    def get_heap_id(self, obj: Any, kind: Optional[VariableType] = None) -> int:
         obj_id = id(obj)
         if obj_id in self.object_id_map:
             return self.object_id_map[obj_id]
         heap_id = self.next_heap_id
         self.next_heap_id += 1
         self.object_id_map[obj_id] = heap_id
-        self.heap_objects[heap_id] = self._create_heap_object(obj, heap_id)
+        self.tracked_objects[heap_id] = obj
+        fingerprint = _fingerprint(obj)
+        if fingerprint is not None:
+            self.fingerprints[heap_id] = fingerprint
+        self.heap_objects[heap_id] = self._create_heap_object(obj, heap_id, kind)
+        self.heap_snapshot = None
         return heap_id
 
-    def _create_heap_object(self, obj: Any, heap_id: int) -> HeapObject:
-        type_name = type(obj).__name__
-        var_type = classify_type(obj)
-        value, repr_str, length = serialize_object(obj, self)
-        references = self._get_references(obj)
-        return HeapObject(
+    def heap_list(self) -> List[HeapRecord]:
+        """The current heap; the same list object while nothing changed."""
+        if self.heap_snapshot is None:
+            self.heap_snapshot = list(self.heap_objects.values())
+        return self.heap_snapshot
+
+    def refresh_heap(self) -> Set[int]:
+        """Re-serialize tracked containers whose fingerprint has changed.
+
+        Returns the heap ids that were re-serialized.
+        """
+        changed: Set[int] = set()
+        for heap_id, old in list(self.fingerprints.items()):
+            obj = self.tracked_objects[heap_id]
+            fingerprint = _fingerprint(obj)
+            if fingerprint != old:
+                self.fingerprints[heap_id] = fingerprint
+                self.heap_objects[heap_id] = self._create_heap_object(obj, heap_id)
+                self.heap_snapshot = None
+                changed.add(heap_id)
+        return changed
+
+    def _create_heap_object(
+        self, obj: Any, heap_id: int, kind: Optional[VariableType] = None
+    ) -> HeapRecord:
+        kind = kind or classify_type(obj)
+        references: List[int] = []
+        value, repr_str, length = serialize_object(obj, self, kind, references)
+        return HeapRecord(
             id=heap_id,
-            type=var_type,
-            type_str=type_name,
+            type=kind,
+            type_str=type(obj).__name__,
             value=value,
             repr=repr_str,
             size=sys.getsizeof(obj) if hasattr(obj, "__sizeof__") else None,
             length=length,
-            references=references,
+            references=list(set(references)),
         )
 
-    def _get_references(self, obj: Any) -> List[int]:
-        refs: List[int] = []
-        vt = classify_type(obj)
-        mutable_types = {
-            VariableType.LIST, VariableType.DICT, VariableType.SET,
-            VariableType.TUPLE, VariableType.INSTANCE,
-        }
-        if vt in (VariableType.LIST, VariableType.TUPLE):
-            for item in obj:
-                if classify_type(item) in mutable_types:
-                    refs.append(self.get_heap_id(item))
-        elif vt == VariableType.DICT:
-            for v in obj.values():
-                if classify_type(v) in mutable_types:
-                    refs.append(self.get_heap_id(v))
-        elif vt == VariableType.SET:
-            for item in obj:
-                if classify_type(item) in mutable_types:
-                    refs.append(self.get_heap_id(item))
-        return list(set(refs))
-
 
 # ------------------------------------------------------------------
 # Helpers (module-level for pickle-ability)
 # ------------------------------------------------------------------
 
+# Items of a container that contribute to its fingerprint (matches the
+# number of items ``serialize_object`` renders).
+_FINGERPRINT_ITEMS = 50
+
+
+def _fingerprint(obj: Any) -> Optional[int]:
+    """Cheap change detector for mutable containers.
+
+    Combines the length with the identity of the first items, which is
+    enough to notice appends, removals and item reassignment without
+    serializing anything.  Returns ``None`` for objects whose serialized
+    form cannot change.
+    """
+    if isinstance(obj, list):
+        return hash((len(obj), *map(id, islice(obj, _FINGERPRINT_ITEMS))))
+    if isinstance(obj, dict):
+        items = islice(obj.items(), _FINGERPRINT_ITEMS)
+        return hash((len(obj), *(id(k) ^ (id(v) << 1) for k, v in items)))
+    if isinstance(obj, set):
+        return hash((len(obj), *map(id, islice(obj, _FINGERPRINT_ITEMS))))
+    return None
+
+
+# Kinds stored on the heap and rendered as ``{"__ref__": id}`` elsewhere
+_HEAP_TYPES = frozenset({
+    VariableType.LIST, VariableType.DICT, VariableType.SET,
+    VariableType.TUPLE, VariableType.INSTANCE,
+})
+
+# Exact built-in types, resolved with one dict lookup
+_EXACT_TYPES: Dict[type, VariableType] = {
+    type(None): VariableType.NONE,
+    bool: VariableType.BOOL,
+    int: VariableType.INT,
+    float: VariableType.FLOAT,
+    str: VariableType.STR,
+    list: VariableType.LIST,
+    tuple: VariableType.TUPLE,
+    dict: VariableType.DICT,
+    set: VariableType.SET,
+    types.FunctionType: VariableType.FUNCTION,
+    type: VariableType.CLASS,
+}
+
+# Subclasses and user classes, classified on first sight.  Weak keys let
+# classes from earlier runs in a reused worker be collected.
+_SUBCLASS_TYPES: "weakref.WeakKeyDictionary[type, VariableType]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
 def classify_type(obj: Any) -> VariableType:
-    if obj is None:
-        return VariableType.NONE
+    cls = type(obj)
+    kind = _EXACT_TYPES.get(cls)
+    if kind is None:
+        kind = _SUBCLASS_TYPES.get(cls)
+        if kind is None:
+            kind = _classify_subclass(obj)
+            _SUBCLASS_TYPES[cls] = kind
+    return kind
+
+
+def _classify_subclass(obj: Any) -> VariableType:
     if isinstance(obj, bool):
         return VariableType.BOOL
     if isinstance(obj, int):
@@ -125,103 +229,253 @@ def classify_type(obj: Any) -> VariableType:
     return VariableType.OTHER
 
 
+# ---- per-kind serializers: (obj, state, references) -> (value, repr, length)
+
+def _repr(obj: Any, kind: VariableType) -> str:
+    limits = settings.REPR_LIMITS
+    return bounded_repr(obj, limits.get(kind.value, limits.get("other", 100)))
+
+
+# Container items rendered in a serialized value
+_MAX_ITEMS = 50
+
+Serialized = Tuple[Any, str, Optional[int]]
+
+
+def _serialize_none(obj: Any, state: Any, references: Any) -> Serialized:
+    return None, "None", None
+
+
+def _serialize_number(obj: Any, state: Any, references: Any) -> Serialized:
+    return obj, repr(obj), None
+
+
+def _serialize_str(obj: Any, state: Any, references: Any) -> Serialized:
+    s = str(obj)
+    if len(s) > 100:
+        s = s[:100] + "..."
+    return s, _repr(obj, VariableType.STR), len(obj)
+
+
+def _serialize_items(
+    obj: Any,
+    state: Optional[CollectorState],
+    references: Optional[List[int]],
+    kind: VariableType = VariableType.LIST,
+) -> Serialized:
+    items: List[Any] = []
+    for i, item in enumerate(obj):
+        if i >= _MAX_ITEMS:
+            items.append("...")
+            _collect_references(islice(obj, i, None), state, references)
+            break
+        items.append(_serialize_reference(item, state, references))
+    return items, _repr(obj, kind), len(obj)
+
+
+def _serialize_dict(
+    obj: Any, state: Optional[CollectorState], references: Optional[List[int]]
+) -> Serialized:
+    items: Dict[str, Any] = {}
+    for i, (k, v) in enumerate(obj.items()):
+        if i >= _MAX_ITEMS:
+            items["..."] = "..."
+            _collect_references(islice(obj.values(), i, None), state, references)
+            break
+        items[str(k)[:50]] = _serialize_reference(v, state, references)
+    return items, _repr(obj, VariableType.DICT), len(obj)
+
+
+def _serialize_function(obj: Any, state: Any, references: Any) -> Serialized:
+    return (
+        {"name": obj.__name__,
+         "args": str(obj.__code__.co_varnames[:obj.__code__.co_argcount])
+         if hasattr(obj, "__code__") else "?"},
+        f"<function {obj.__name__}>",
+        None,
+    )
+
+
+def _serialize_class(obj: Any, state: Any, references: Any) -> Serialized:
+    return {"name": obj.__name__}, f"<class {obj.__name__}>", None
+
+
+def _serialize_instance(obj: Any, state: Any, references: Any) -> Serialized:
+    cn = obj.__class__.__name__
+    return {"class": cn}, f"<{cn} object>", None
+
+
+def _serialize_other(obj: Any, state: Any, references: Any) -> Serialized:
+    return str(type(obj)), _repr(obj, VariableType.OTHER), None
+
+
+_SERIALIZERS: Dict[VariableType, Callable[..., Serialized]] = {
+    VariableType.NONE: _serialize_none,
+    VariableType.BOOL: _serialize_number,
+    VariableType.INT: _serialize_number,
+    VariableType.FLOAT: _serialize_number,
+    VariableType.STR: _serialize_str,
+    VariableType.LIST: _serialize_items,
+    VariableType.TUPLE: partial(_serialize_items, kind=VariableType.TUPLE),
+    VariableType.SET: partial(_serialize_items, kind=VariableType.SET),
+    VariableType.DICT: _serialize_dict,
+    VariableType.FUNCTION: _serialize_function,
+    VariableType.CLASS: _serialize_class,
+    VariableType.INSTANCE: _serialize_instance,
+    VariableType.OTHER: _serialize_other,
+}
+
+
 def serialize_object(
-    obj: Any, state: CollectorState | None = None
+    obj: Any,
+    state: CollectorState | None = None,
+    kind: VariableType | None = None,
+    references: List[int] | None = None,
 ) -> tuple[Any, str, int | None]:
-    """Return ``(value, repr_str, length)``."""
-    vt = classify_type(obj)
-
-    if vt == VariableType.NONE:
-        return None, "None", None
-    if vt in (VariableType.INT, VariableType.FLOAT, VariableType.BOOL):
-        return obj, repr(obj), None
-    if vt == VariableType.STR:
-        s = str(obj)
-        if len(s) > 100:
-            s = s[:100] + "..."
-        return s, repr(obj), len(obj)
-    if vt in (VariableType.LIST, VariableType.TUPLE):
-        items = []
-        for i, item in enumerate(obj):
-            if i >= 50:
-                items.append("...")
-                break
-            items.append(_serialize_reference(item, state))
-        return items, repr(obj)[:200], len(obj)
-    if vt == VariableType.DICT:
-        items: dict[str, Any] = {}
-        for i, (k, v) in enumerate(obj.items()):
-            if i >= 50:
-                items["..."] = "..."
-                break
-            items[str(k)[:50]] = _serialize_reference(v, state)
-        return items, repr(obj)[:200], len(obj)
-    if vt == VariableType.SET:
-        items_list: list[Any] = []
-        for i, item in enumerate(obj):
-            if i >= 50:
-                items_list.append("...")
-                break
-            items_list.append(_serialize_reference(item, state))
-        return items_list, repr(obj)[:200], len(obj)
-    if vt == VariableType.FUNCTION:
-        return (
-            {"name": obj.__name__,
-             "args": str(obj.__code__.co_varnames[:obj.__code__.co_argcount])
-             if hasattr(obj, "__code__") else "?"},
-            f"<function {obj.__name__}>",
-            None,
-        )
-    if vt == VariableType.CLASS:
-        return {"name": obj.__name__}, f"<class {obj.__name__}>", None
-    if vt == VariableType.INSTANCE:
-        cn = obj.__class__.__name__
-        return {"class": cn}, f"<{cn} object>", None
-    return str(type(obj)), repr(obj)[:100], None
-
-
-def _serialize_reference(obj: Any, state: CollectorState | None) -> Any:
-    vt = classify_type(obj)
-    heap_types = {
-        VariableType.LIST, VariableType.DICT, VariableType.SET,
-        VariableType.TUPLE, VariableType.INSTANCE,
-    }
-    if vt in heap_types and state is not None:
-        heap_id = state.get_heap_id(obj)
-        return {"__ref__": heap_id, "__type__": vt.value}
-    return serialize_object(obj, state)[0]
+    """Return ``(value, repr_str, length)``.
+
+    *kind* skips classification when the caller already knows it.  When
+    *references* is given, the heap ids of every heap item of a container
+    (rendered or not) are appended to it.
+    """
+    return _SERIALIZERS[kind or classify_type(obj)](obj, state, references)
+
+
+def _serialize_reference(
+    obj: Any,
+    state: CollectorState | None,
+    references: List[int] | None = None,
+) -> Any:
+    kind = classify_type(obj)
+    if kind in _HEAP_TYPES and state is not None:
+        heap_id = state.get_heap_id(obj, kind)
+        if references is not None:
+            references.append(heap_id)
+        return {"__ref__": heap_id, "__type__": kind.value}
+    return _SERIALIZERS[kind](obj, state, None)[0]
+
+
+def _collect_references(
+    items: Iterable[Any],
+    state: CollectorState | None,
+    references: List[int] | None,
+) -> None:
+    """Record heap references of the items past the rendered ones."""
+    if references is None or state is None:
+        return
+    for item in items:
+        kind = classify_type(item)
+        if kind in _HEAP_TYPES:
+            references.append(state.get_heap_id(item, kind))
+
+
+# ------------------------------------------------------------------
+# Frame filtering
+# ------------------------------------------------------------------
+
+class CodeFilter:
+    """Decides once per code object whether its frames are skipped.
+
+    The filename test runs on the first event from a code object and the
+    verdict is cached, so later calls cost a single dict lookup.
+    """
+
+    # Substrings of ``co_filename`` that mark interpreter, stdlib and
+    # executor internals
+    INTERNAL_PATTERNS = (
+        "trace_collector.py", "trace_backends.py", "execution_engine.py",
+        "executor.py", "sandbox.py", "importlib", "<frozen", "collections",
+        "typing", "abc.py", "dataclasses.py", "multiprocessing", "spawn",
+        "concurrent", "threading", "runpy",
+    )
+
+    def __init__(self) -> None:
+        self._skip: Dict[types.CodeType, bool] = {}
+
+    def is_internal(self, code: types.CodeType) -> bool:
+        try:
+            return self._skip[code]
+        except KeyError:
+            filename = code.co_filename
+            skip = any(p in filename for p in self.INTERNAL_PATTERNS)
+            self._skip[code] = skip
+            return skip
 
 
 # ------------------------------------------------------------------
 # TraceCollector
 # ------------------------------------------------------------------
 
-class TraceCollector:
-    """Collects execution trace using ``sys.settrace``."""
+class ExecutionCancelled(BaseException):
+    """Raised into the traced program to stop it at a step boundary.
+
+    Derives from ``BaseException`` so ``except Exception`` in user code
+    does not swallow it.
+    """
+
 
-    def __init__(self, code: str, user_input: str = "") -> None:
+class TraceCollector:
+    """Collects an execution trace.
+
+    Events come from a :class:`~app.core.trace_backends.TraceBackend`;
+    *backend* is ``"auto"``, ``"settrace"`` or ``"monitoring"`` and
+    defaults to ``settings.TRACE_BACKEND``.  *on_step*, if given, is
+    called with each :class:`StepRecord` as soon as it is recorded.
+    *should_stop*, if given, is polled on every event; once it returns
+    true the program is stopped with :class:`ExecutionCancelled`, which
+    :meth:`execute` re-raises.  *compiled*, if given, is *code* already
+    compiled, so a program run with many inputs is compiled once.
+    *echo_input* is passed on to :class:`SandboxBuiltins`.
+    """
+
+    def __init__(
+        self,
+        code: str,
+        user_input: str = "",
+        backend: Optional[str] = None,
+        on_step: Optional[Callable[[StepRecord], Any]] = None,
+        should_stop: Optional[Callable[[], bool]] = None,
+        compiled: Optional[types.CodeType] = None,
+        echo_input: bool = True,
+    ) -> None:
         self.code = code
+        self.compiled = compiled
         self.user_input = user_input
+        self.on_step = on_step
+        self.should_stop = should_stop
         self.state = CollectorState()
         self.state.code_lines = code.split("\n")
-        self.original_trace: Any = None
-        self.input_lines = user_input.split("\n") if user_input else []
-        self.input_index = 0
+        self.backend = create_backend(self, backend or settings.TRACE_BACKEND)
         self.stdout_capture: List[str] = []
+        self.builtins = SandboxBuiltins(
+            user_input, self.stdout_capture.append, echo_input
+        )
+        self.code_filter = CodeFilter()
+        # id(globals dict) -> names map, reused while the names are unchanged
+        self._globals_names_cache: Dict[int, Dict[str, str]] = {}
+        # Names maps already recomputed for the step being recorded
+        self._step_globals_names: Dict[int, Dict[str, str]] = {}
+        # What the program raised, once execute() has run
+        self.error: Optional[Exception] = None
 
-    # ---- sys.settrace callback ----
+    # ---- event dispatch (called by the trace backend) ----
 
-    def trace_function(
+    def handle_event(
         self,
         frame: types.FrameType,
         event: str,
         arg: Any,
-    ) -> Optional[Callable[..., Any]]:
-        if self._is_internal_frame(frame):
-            return self.trace_function
+    ) -> bool:
+        """Record one ``sys.settrace``-style event for a user frame.
+
+        Returns ``False`` once the step budget is spent so the backend can
+        stop delivering events.
+        """
+        if self.should_stop is not None and self.should_stop():
+            raise ExecutionCancelled
         if self.state.current_step >= settings.MAX_STEPS:
             self.state.max_steps_reached = True
-            return None
+            return False
 
         if event == "line":
             self._handle_line(frame)
@@ -232,7 +486,7 @@ class TraceCollector:
         elif event == "exception":
             self._handle_exception(frame, arg)
 
-        return self.trace_function
+        return True
 
     # ---- event handlers ----
 
@@ -253,6 +507,7 @@ class TraceCollector:
             frame, ExecutionEvent.RETURN,
             {"return_value": _serialize_reference(arg, self.state)},
         )
+        self._pop_stack(frame)
 
     def _handle_exception(self, frame: types.FrameType, arg: Any) -> None:
         self.state.current_step += 1
@@ -275,12 +530,14 @@ class TraceCollector:
         if 1 <= lineno <= len(self.state.code_lines):
             code_line = self.state.code_lines[lineno - 1].rstrip()
 
-        frames = self._build_frames(frame)
-        heap = list(self.state.heap_objects.values())
+        changed = self.state.refresh_heap()
+        self._sync_stack(frame, event)
+        frames = self._stack_frames(changed)
+        heap = self.state.heap_list()
         stdout = "".join(self.stdout_capture)
         self.stdout_capture.clear()
 
-        step = ExecutionStep(
+        step = StepRecord(
             step=self.state.current_step,
             line=lineno,
             code=code_line,
@@ -291,39 +548,138 @@ class TraceCollector:
             stdout=stdout,
             timestamp=time.time() - self.state.start_time,
         )
-        self.state.steps.append(step)
+        self._record(step)
+
+    def _record(self, step: StepRecord) -> None:
+        self.state.store.append(step)
+        if self.on_step is not None:
+            self.on_step(step)
 
     # ---- frame helpers ----
 
-    @staticmethod
-    def _is_internal_frame(frame: types.FrameType) -> bool:
-        filename = frame.f_code.co_filename
-        patterns = [
-            "trace_collector.py", "executor.py", "sandbox.py",
-            "importlib", "<frozen", "collections", "typing",
-            "abc.py", "dataclasses.py", "multiprocessing", "spawn",
-            "concurrent", "threading", "runpy",
-        ]
-        return any(p in filename for p in patterns)
-
-    def _build_frames(self, current_frame: types.FrameType) -> List[Frame]:
-        frames: List[Frame] = []
-        frame: Optional[types.FrameType] = current_frame
+    def _is_internal_frame(self, frame: types.FrameType) -> bool:
+        return self.code_filter.is_internal(frame.f_code)
+
+    def _user_frames(self, frame: Optional[types.FrameType]) -> List[types.FrameType]:
+        """Return the user frames from *frame* to the root, outermost first."""
+        frames: List[types.FrameType] = []
         while frame:
             if not self._is_internal_frame(frame):
-                frames.insert(0, self._create_frame(frame))
+                frames.append(frame)
             frame = frame.f_back
+        frames.reverse()
+        return frames
+
+    def _user_parent(self, frame: types.FrameType) -> Optional[types.FrameType]:
+        parent = frame.f_back
+        while parent and self._is_internal_frame(parent):
+            parent = parent.f_back
+        return parent
+
+    def _sync_stack(self, frame: types.FrameType, event: ExecutionEvent) -> None:
+        """Bring the shadow stack in line with *frame*, the frame being traced.
+
+        A ``call`` pushes *frame* when its caller is on top, anything else
+        expects *frame* to be on top already.  Otherwise (the first event,
+        frames entered before tracing started) the stack is rebuilt from
+        the ``f_back`` chain.
+        """
+        stack = self.state.call_stack
+        top = stack[-1].frame if stack else None
+        if event == ExecutionEvent.CALL:
+            if top is self._user_parent(frame):
+                if stack:
+                    # The caller may have run on since its last snapshot
+                    stack[-1].current = False
+                stack.append(StackEntry(frame))
+                return
+        elif top is frame:
+            return
+        self.state.call_stack = [StackEntry(f) for f in self._user_frames(frame)]
+
+    def _pop_stack(self, frame: types.FrameType) -> None:
+        stack = self.state.call_stack
+        if stack and stack[-1].frame is frame:
+            stack.pop()
+
+    def _stack_frames(self, changed: Set[int]) -> List[FrameRecord]:
+        """Return the step's frames, re-capturing only those that changed.
+
+        The top frame is always captured afresh.  A suspended frame keeps
+        its snapshot unless a container it refers to was re-serialized
+        (*changed*), its globals names changed, or another frame rebound
+        one of its locals.
+        """
+        self._step_globals_names = {}
+        stack = self.state.call_stack
+        top = len(stack) - 1
+        frames: List[FrameRecord] = []
+        for index, entry in enumerate(stack):
+            if index == top or not self._is_current(entry, changed):
+                self._capture(entry)
+            frames.append(entry.record)  # type: ignore[arg-type]
         return frames
 
+    def _is_current(self, entry: StackEntry, changed: Set[int]) -> bool:
+        if not entry.current or not entry.heap_ids.isdisjoint(changed):
+            return False
+        frame = entry.frame
+        if entry.globals_names is not self._globals_names(frame.f_globals):
+            return False
+        for obj, length in entry.lengths:
+            if len(obj) != length:
+                return False
+        if entry.bindings is None:
+            return True
+        bindings = self._bindings(frame)
+        return bindings is not None and len(bindings) == len(entry.bindings) and all(
+            name == old_name and value is old_value
+            for (name, value), (old_name, old_value) in zip(bindings, entry.bindings)
+        )
+
+    @staticmethod
+    def _bindings(frame: types.FrameType) -> Optional[Tuple[Tuple[str, Any], ...]]:
+        code = frame.f_code
+        if code.co_flags & inspect.CO_OPTIMIZED and not code.co_cellvars:
+            # Plain function locals only change while the frame runs
+            return None
+        return tuple(frame.f_locals.items())
+
     # Internal names to filter from locals (injected by multiprocessing/spawn)
     _INTERNAL_NAMES = frozenset([
         "spawn_main", "_main", "freeze_support", "set_start_method",
         "Process", "Queue", "pool", "_fork", "_forkserver",
     ])
 
-    def _create_frame(self, frame: types.FrameType) -> Frame:
+    def _globals_names(self, frame_globals: Dict[str, Any]) -> Dict[str, str]:
+        """Names map for *frame_globals*, computed once per step.
+
+        The previous map object is returned while the names are unchanged,
+        so snapshots can be validated with an identity check.
+        """
+        key = id(frame_globals)
+        names = self._step_globals_names.get(key)
+        if names is None:
+            names = {
+                name: name
+                for name in frame_globals
+                if not name.startswith("__")
+                and not name.endswith("__")
+                and name not in self._INTERNAL_NAMES
+            }
+            if self._globals_names_cache.get(key) == names:
+                names = self._globals_names_cache[key]
+            else:
+                self._globals_names_cache[key] = names
+            self._step_globals_names[key] = names
+        return names
+
+    def _capture(self, entry: StackEntry) -> None:
+        frame = entry.frame
         code = frame.f_code
-        locals_dict: Dict[str, Variable] = {}
+        previous = entry.record.locals if entry.record is not None else {}
+        locals_dict: Dict[str, VariableRecord] = {}
+        lengths: List[Tuple[Any, int]] = []
         for name, value in frame.f_locals.items():
             # Skip dunder names and internal multiprocessing names
             if name.startswith("__") or name.endswith("__"):
@@ -332,26 +688,38 @@ class TraceCollector:
                 continue
             if callable(value) and hasattr(value, "__module__") and value.__module__ and "multiprocessing" in value.__module__:
                 continue
-            locals_dict[name] = self._create_variable(name, value)
-
-        globals_names = {
-            name: name
-            for name in frame.f_globals
-            if not name.startswith("__") 
-            and not name.endswith("__")
-            and name not in self._INTERNAL_NAMES
-        }
-
-        return Frame(
+            var = self._create_variable(name, value, previous.get(name))
+            locals_dict[name] = var
+            if (
+                var.length is not None
+                and var.id not in self.state.fingerprints
+                and not isinstance(value, (str, tuple))
+            ):
+                lengths.append((value, var.length))
+
+        entry.globals_names = self._globals_names(frame.f_globals)
+        entry.heap_ids = frozenset(
+            var.id for var in locals_dict.values() if var.id is not None
+        )
+        entry.lengths = tuple(lengths)
+        entry.bindings = self._bindings(frame)
+        entry.current = True
+        entry.record = FrameRecord(
             name=code.co_name or "<module>",
             line=frame.f_lineno,
             filename=code.co_filename,
             locals=locals_dict,
-            globals=globals_names,
+            globals=entry.globals_names,
             is_module_level=(code.co_name == "<module>"),
         )
 
-    def _create_variable(self, name: str, value: Any) -> Variable:
+    def _create_variable(
+        self, name: str, value: Any, previous: Optional[VariableRecord] = None
+    ) -> VariableRecord:
+        """Record *name* = *value*, returning *previous* if it still applies."""
+        if previous is not None and previous.value is value:
+            # Same plain value (heap values are recorded as "ref:<id>")
+            return previous
         var_type = classify_type(value)
         type_str = type(value).__name__
         is_mutable = var_type in (VariableType.LIST, VariableType.DICT, VariableType.SET)
@@ -364,20 +732,22 @@ class TraceCollector:
             except Exception:
                 pass
 
-        heap_types = {
-            VariableType.LIST, VariableType.DICT, VariableType.SET,
-            VariableType.TUPLE, VariableType.INSTANCE,
-        }
-        if var_type in heap_types:
-            heap_id = self.state.get_heap_id(value)
+        if var_type in _HEAP_TYPES:
+            heap_id = self.state.get_heap_id(value, var_type)
+            if (
+                previous is not None
+                and previous.id == heap_id
+                and previous.length == length
+            ):
+                return previous
             repr_str = f"<{type_str} ref={heap_id}>"
             display_value: Any = f"ref:{heap_id}"
         else:
-            _, repr_str, _ = serialize_object(value, self.state)
+            _, repr_str, _ = serialize_object(value, self.state, var_type)
             display_value = value
             heap_id = None
 
-        return Variable(
+        return VariableRecord(
             name=name,
             value=display_value,
             type=var_type,
@@ -389,35 +759,6 @@ class TraceCollector:
             repr=repr_str,
         )
 
-    # ---- custom builtins ----
-
-    def _custom_input(self, prompt: str = "") -> str:
-        if self.input_index < len(self.input_lines):
-            result = self.input_lines[self.input_index]
-            self.input_index += 1
-            self.stdout_capture.append(f"{prompt}{result}\n")
-            return result
-        self.stdout_capture.append(f"{prompt}\n")
-        return ""
-
-    def _custom_print(self, *args: Any, sep: str = " ", end: str = "\n", **kwargs: Any) -> None:
-        output = sep.join(str(a) for a in args) + end
-        self.stdout_capture.append(output)
-
-    @staticmethod
-    def _blocked_open(*args: Any, **kwargs: Any) -> None:
-        raise PermissionError("File operations are not allowed")
-
-    def _create_safe_builtins(self) -> Dict[str, Any]:
-        safe: Dict[str, Any] = {}
-        for name in settings.ALLOWED_BUILTINS:
-            if hasattr(builtins, name):
-                safe[name] = getattr(builtins, name)
-        safe["input"] = self._custom_input
-        safe["print"] = self._custom_print
-        safe["open"] = self._blocked_open
-        return safe
-
     # ---- main entry point ----
 
     def execute(self) -> TraceData:
@@ -425,62 +766,66 @@ class TraceCollector:
         self.state.start_time = time.time()
 
         # Initial "start" step
-        self.state.steps.append(
-            ExecutionStep(
+        self._record(
+            StepRecord(
                 step=0,
                 line=1,
                 code=self.state.code_lines[0] if self.state.code_lines else "",
                 event=ExecutionEvent.START,
-                frames=[Frame(name="<module>", line=1, locals={}, globals={})],
+                frames=[FrameRecord(name="<module>", line=1, locals={}, globals={})],
                 heap=[],
                 stdout="",
             )
         )
 
         exec_globals: Dict[str, Any] = {
-            "__builtins__": self._create_safe_builtins(),
+            "__builtins__": self.builtins.namespace(),
             "__name__": "__main__",
             "__doc__": None,
         }
 
-        self.original_trace = sys.gettrace()
-        sys.settrace(self.trace_function)
+        self.backend.start()
 
+        error: Optional[Exception] = None
         try:
-            compiled = compile(self.code, "<string>", "exec")
+            compiled = self.compiled or compile(self.code, "<string>", "exec")
             exec(compiled, exec_globals)  # noqa: S102
-
-            self.state.steps.append(
-                ExecutionStep(
+        except Exception as exc:
+            error = self.error = exc
+        finally:
+            # Stop before recording the final step so building it is not traced
+            self.backend.stop()
+            # Drop the frame references held by the shadow stack
+            self.state.call_stack.clear()
+
+        if error is None:
+            self.state.refresh_heap()
+            self._record(
+                StepRecord(
                     step=self.state.current_step + 1,
                     line=len(self.state.code_lines),
                     code="",
                     event=ExecutionEvent.END,
-                    frames=self.state.steps[-1].frames if self.state.steps else [],
-                    heap=list(self.state.heap_objects.values()),
+                    frames=self.state.store.frames(-1),
+                    heap=self.state.heap_list(),
                     stdout="".join(self.stdout_capture),
                 )
             )
-        except Exception as exc:
-            if not any(s.event == ExecutionEvent.EXCEPTION for s in self.state.steps):
-                self.state.steps.append(
-                    ExecutionStep(
-                        step=self.state.current_step + 1,
-                        line=len(self.state.code_lines),
-                        code="",
-                        event=ExecutionEvent.EXCEPTION,
-                        frames=self.state.steps[-1].frames if self.state.steps else [],
-                        heap=list(self.state.heap_objects.values()),
-                        stdout="".join(self.stdout_capture),
-                        exception={"type": type(exc).__name__, "message": str(exc)},
-                    )
+        elif not self.state.store.steps_with_event(ExecutionEvent.EXCEPTION):
+            self.state.refresh_heap()
+            self._record(
+                StepRecord(
+                    step=self.state.current_step + 1,
+                    line=len(self.state.code_lines),
+                    code="",
+                    event=ExecutionEvent.EXCEPTION,
+                    frames=self.state.store.frames(-1),
+                    heap=self.state.heap_list(),
+                    stdout="".join(self.stdout_capture),
+                    exception={"type": type(error).__name__, "message": str(error)},
                 )
-        finally:
-            sys.settrace(self.original_trace)
+            )
 
-        return TraceData(
-            code=self.code,
-            steps=self.state.steps,
-            total_steps=len(self.state.steps),
-            max_steps_reached=self.state.max_steps_reached,
+        return trace_view(
+            self.code, self.state.store, self.state.max_steps_reached
         )
@@ -0,0 +1,255 @@
+"""Delta encoding of execution traces.
+
+Each :class:`StepDelta` carries only the frames, locals and heap objects
+that changed since the previous step.  :func:`reconstruct_step` rebuilds
+the full :class:`ExecutionStep` on the server side.  With a keyframe
+interval ``K`` a full snapshot is also kept every ``K`` steps, so any step
+is rebuilt from the nearest keyframe with at most ``K - 1`` deltas.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterator, List, Optional
+
+from app.models.trace import (
+    DeltaTraceData,
+    ExecutionStep,
+    Frame,
+    FrameDelta,
+    HeapObject,
+    StepDelta,
+    TraceData,
+)
+
+# Scalar fields copied verbatim between ExecutionStep and StepDelta
+_STEP_FIELDS = (
+    "step", "line", "code", "event", "event_data",
+    "stdout", "exception", "timestamp", "memory_usage",
+)
+
+
+# ------------------------------------------------------------------
+# Encoding
+# ------------------------------------------------------------------
+
+def _diff_frame(index: int, prev: Optional[Frame], frame: Frame) -> Optional[FrameDelta]:
+    if prev is frame:
+        return None
+    if prev is None or prev.name != frame.name or prev.filename != frame.filename:
+        return FrameDelta(
+            index=index,
+            replace=True,
+            name=frame.name,
+            line=frame.line,
+            filename=frame.filename,
+            is_module_level=frame.is_module_level,
+            globals=dict(frame.globals),
+            locals_set=dict(frame.locals),
+        )
+
+    locals_set = {
+        name: var
+        for name, var in frame.locals.items()
+        if prev.locals.get(name) != var
+    }
+    locals_removed = [name for name in prev.locals if name not in frame.locals]
+    line = frame.line if frame.line != prev.line else None
+    globals_ = dict(frame.globals) if frame.globals != prev.globals else None
+    is_module_level = (
+        frame.is_module_level
+        if frame.is_module_level != prev.is_module_level
+        else None
+    )
+
+    if not (locals_set or locals_removed or line is not None
+            or globals_ is not None or is_module_level is not None):
+        return None
+    return FrameDelta(
+        index=index,
+        line=line,
+        is_module_level=is_module_level,
+        globals=globals_,
+        locals_set=locals_set,
+        locals_removed=locals_removed,
+    )
+
+
+def diff_step(prev: Optional[ExecutionStep], step: ExecutionStep) -> StepDelta:
+    """Return the delta that turns *prev* into *step* (``None`` = empty state)."""
+    prev_frames = prev.frames if prev is not None else []
+    frames_changed: List[FrameDelta] = []
+    for index, frame in enumerate(step.frames):
+        prev_frame = prev_frames[index] if index < len(prev_frames) else None
+        delta = _diff_frame(index, prev_frame, frame)
+        if delta is not None:
+            frames_changed.append(delta)
+
+    prev_heap: Dict[int, HeapObject] = (
+        {obj.id: obj for obj in prev.heap} if prev is not None else {}
+    )
+    heap_ids = set()
+    heap_set: List[HeapObject] = []
+    for obj in step.heap:
+        heap_ids.add(obj.id)
+        old = prev_heap.get(obj.id)
+        if old is not obj and old != obj:
+            heap_set.append(obj)
+    heap_removed = [heap_id for heap_id in prev_heap if heap_id not in heap_ids]
+
+    return StepDelta(
+        **{name: getattr(step, name) for name in _STEP_FIELDS},
+        frame_count=len(step.frames),
+        frames_changed=frames_changed,
+        heap_set=heap_set,
+        heap_removed=heap_removed,
+    )
+
+
+def encode_trace(
+    trace: TraceData, keyframe_interval: Optional[int] = None
+) -> DeltaTraceData:
+    """Convert a full trace into its delta-encoded form.
+
+    When *keyframe_interval* is given, every ``keyframe_interval``-th step
+    is also stored in full.
+    """
+    deltas: List[StepDelta] = []
+    keyframes: List[ExecutionStep] = []
+    prev: Optional[ExecutionStep] = None
+    for index, step in enumerate(trace.steps):
+        deltas.append(diff_step(prev, step))
+        if keyframe_interval and index % keyframe_interval == 0:
+            keyframes.append(step)
+        prev = step
+    return DeltaTraceData(
+        code=trace.code,
+        deltas=deltas,
+        keyframe_interval=keyframe_interval,
+        keyframes=keyframes,
+        total_steps=trace.total_steps,
+        final_state=trace.final_state,
+        max_steps_reached=trace.max_steps_reached,
+    )
+
+
+# ------------------------------------------------------------------
+# Reconstruction
+# ------------------------------------------------------------------
+
+def _apply_frame(prev: Optional[Frame], delta: FrameDelta) -> Frame:
+    if delta.replace or prev is None:
+        return Frame(
+            name=delta.name or "<module>",
+            line=delta.line or 0,
+            filename=delta.filename or "<string>",
+            locals=dict(delta.locals_set),
+            globals=dict(delta.globals or {}),
+            is_module_level=(
+                delta.is_module_level
+                if delta.is_module_level is not None
+                else True
+            ),
+        )
+
+    locals_ = dict(prev.locals)
+    for name in delta.locals_removed:
+        locals_.pop(name, None)
+    locals_.update(delta.locals_set)
+    return prev.model_copy(
+        update={
+            "line": delta.line if delta.line is not None else prev.line,
+            "is_module_level": (
+                delta.is_module_level
+                if delta.is_module_level is not None
+                else prev.is_module_level
+            ),
+            "globals": (
+                dict(delta.globals) if delta.globals is not None else prev.globals
+            ),
+            "locals": locals_,
+        }
+    )
+
+
+def apply_delta(prev: Optional[ExecutionStep], delta: StepDelta) -> ExecutionStep:
+    """Apply *delta* on top of *prev* and return the resulting full step."""
+    prev_frames = prev.frames if prev is not None else []
+    frames = list(prev_frames[: delta.frame_count])
+    frames.extend([None] * (delta.frame_count - len(frames)))  # type: ignore[list-item]
+    for frame_delta in delta.frames_changed:
+        frames[frame_delta.index] = _apply_frame(
+            frames[frame_delta.index], frame_delta
+        )
+
+    heap: Dict[int, HeapObject] = (
+        {obj.id: obj for obj in prev.heap} if prev is not None else {}
+    )
+    for heap_id in delta.heap_removed:
+        heap.pop(heap_id, None)
+    for obj in delta.heap_set:
+        heap[obj.id] = obj
+
+    return ExecutionStep(
+        **{name: getattr(delta, name) for name in _STEP_FIELDS},
+        frames=frames,
+        heap=list(heap.values()),
+    )
+
+
+def iter_steps(trace: DeltaTraceData) -> Iterator[ExecutionStep]:
+    """Yield every full step of *trace* in order."""
+    step: Optional[ExecutionStep] = None
+    for delta in trace.deltas:
+        step = apply_delta(step, delta)
+        yield step
+
+
+def _nearest_keyframe(
+    trace: DeltaTraceData, n: int
+) -> tuple[int, Optional[ExecutionStep]]:
+    """Return ``(index, step)`` of the last keyframe at or before *n*."""
+    if not trace.keyframe_interval or not trace.keyframes:
+        return -1, None
+    slot = min(n // trace.keyframe_interval, len(trace.keyframes) - 1)
+    return slot * trace.keyframe_interval, trace.keyframes[slot]
+
+
+def iter_range(
+    trace: DeltaTraceData, start: int, stop: Optional[int] = None
+) -> Iterator[ExecutionStep]:
+    """Yield full steps ``start..stop-1``, seeking via the nearest keyframe."""
+    total = len(trace.deltas)
+    stop = total if stop is None else min(stop, total)
+    if start < 0 or start >= stop:
+        return
+
+    index, step = _nearest_keyframe(trace, start)
+    if index == start:
+        yield step  # type: ignore[misc]
+    for delta in trace.deltas[index + 1: stop]:
+        index += 1
+        step = apply_delta(step, delta)
+        if index >= start:
+            yield step
+
+
+def reconstruct_step(trace: DeltaTraceData, n: int) -> ExecutionStep:
+    """Rebuild the full step at index *n*.
+
+    Replays from the nearest keyframe when the trace has them, otherwise
+    from step 0.
+    """
+    if not 0 <= n < len(trace.deltas):
+        raise IndexError(f"Step {n} out of range (0..{len(trace.deltas) - 1})")
+    return next(iter_range(trace, n, n + 1))
+
+
+def decode_trace(trace: DeltaTraceData) -> TraceData:
+    """Expand a delta-encoded trace back into a full :class:`TraceData`."""
+    return TraceData(
+        code=trace.code,
+        steps=list(iter_steps(trace)),
+        total_steps=trace.total_steps,
+        final_state=trace.final_state,
+        max_steps_reached=trace.max_steps_reached,
+    )
@@ -0,0 +1,318 @@
+"""Lightweight records built by the collector while a program runs.
+
+Constructing Pydantic models validates every field, which is too slow to
+do on each trace event.  :class:`~app.core.trace_collector.TraceCollector`
+records immutable named tuples instead, and :class:`ModelBuilder` turns
+them into the :mod:`app.models.trace` schema only when a step is read.  A
+frame or heap object that did not change between steps is one shared
+record, and the conversion keeps that sharing: each record becomes
+exactly one model.  :class:`StepEncoder` skips the models altogether and
+writes a step straight to the JSON that ``ExecutionStep`` would dump,
+reusing the encoded text of shared records; :class:`DeltaEncoder` does
+the same for the ``StepDelta`` of each step.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.models.trace import (
+    ExecutionEvent,
+    ExecutionStep,
+    Frame,
+    HeapObject,
+    Variable,
+    VariableType,
+    _safe_serialize,
+)
+
+
+# ------------------------------------------------------------------
+# Records (field-for-field mirrors of the models)
+# ------------------------------------------------------------------
+
+class VariableRecord(NamedTuple):
+    name: str
+    value: Any
+    type: VariableType
+    type_str: str
+    id: Optional[int] = None
+    is_mutable: bool = False
+    is_sequence: bool = False
+    length: Optional[int] = None
+    repr: str = ""
+
+
+class HeapRecord(NamedTuple):
+    id: int
+    type: VariableType
+    type_str: str
+    value: Any
+    repr: str
+    size: Optional[int] = None
+    length: Optional[int] = None
+    references: List[int] = []
+
+
+class FrameRecord(NamedTuple):
+    name: str
+    line: int
+    filename: str = "<string>"
+    locals: Dict[str, VariableRecord] = {}
+    globals: Dict[str, str] = {}
+    is_module_level: bool = True
+
+
+class StepRecord(NamedTuple):
+    step: int
+    line: int
+    code: str
+    event: ExecutionEvent
+    event_data: Optional[Dict[str, Any]] = None
+    frames: List[FrameRecord] = []
+    heap: List[HeapRecord] = []
+    stdout: str = ""
+    exception: Optional[Dict[str, str]] = None
+    timestamp: Optional[float] = None
+    memory_usage: Optional[int] = None
+
+
+# ------------------------------------------------------------------
+# Conversion to models
+# ------------------------------------------------------------------
+
+class ModelBuilder:
+    """Converts records to models, one model per distinct record.
+
+    Models are keyed by ``id(record)``, which is stable because the
+    records outlive the builder.
+    """
+
+    def __init__(self) -> None:
+        self._variables: Dict[int, Variable] = {}
+        self._frames: Dict[int, Frame] = {}
+        self._heap: Dict[int, HeapObject] = {}
+
+    def variable(self, record: VariableRecord) -> Variable:
+        model = self._variables.get(id(record))
+        if model is None:
+            model = Variable(**record._asdict())
+            self._variables[id(record)] = model
+        return model
+
+    def frame(self, record: FrameRecord) -> Frame:
+        model = self._frames.get(id(record))
+        if model is None:
+            model = Frame(
+                name=record.name,
+                line=record.line,
+                filename=record.filename,
+                locals={
+                    name: self.variable(var)
+                    for name, var in record.locals.items()
+                },
+                globals=record.globals,
+                is_module_level=record.is_module_level,
+            )
+            self._frames[id(record)] = model
+        return model
+
+    def heap_object(self, record: HeapRecord) -> HeapObject:
+        model = self._heap.get(id(record))
+        if model is None:
+            model = HeapObject(**record._asdict())
+            self._heap[id(record)] = model
+        return model
+
+    def step(self, record: StepRecord) -> ExecutionStep:
+        fields = record._asdict()
+        fields["frames"] = [self.frame(f) for f in record.frames]
+        fields["heap"] = [self.heap_object(h) for h in record.heap]
+        return ExecutionStep(**fields)
+
+
+# ------------------------------------------------------------------
+# Conversion to JSON
+# ------------------------------------------------------------------
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+class StepEncoder:
+    """Encodes step records as ``ExecutionStep.model_dump(mode="json")`` JSON.
+
+    Used to stream steps out of the worker while the program runs.  The
+    encoded text of each frame and heap record is kept by ``id(record)``,
+    so the caller must keep the records alive (the collector's store does).
+    """
+
+    def __init__(self) -> None:
+        self._frames: Dict[int, str] = {}
+        self._heap: Dict[int, str] = {}
+
+    @staticmethod
+    def _variable(record: VariableRecord) -> Dict[str, Any]:
+        fields = record._asdict()
+        fields["value"] = _safe_serialize(record.value)
+        fields["type"] = record.type.value
+        return fields
+
+    def frame(self, record: FrameRecord) -> str:
+        text = self._frames.get(id(record))
+        if text is None:
+            fields = record._asdict()
+            fields["locals"] = {
+                name: self._variable(var) for name, var in record.locals.items()
+            }
+            text = _dumps(fields)
+            self._frames[id(record)] = text
+        return text
+
+    def heap_object(self, record: HeapRecord) -> str:
+        text = self._heap.get(id(record))
+        if text is None:
+            fields = record._asdict()
+            fields["value"] = _safe_serialize(record.value)
+            fields["type"] = record.type.value
+            text = _dumps(fields)
+            self._heap[id(record)] = text
+        return text
+
+    def step(self, record: StepRecord) -> str:
+        frames = ",".join([self.frame(f) for f in record.frames])
+        heap = ",".join([self.heap_object(h) for h in record.heap])
+        event_data = (
+            None if record.event_data is None
+            else _safe_serialize(record.event_data)
+        )
+        return (
+            f'{{"step":{record.step},"line":{record.line},'
+            f'"code":{_dumps(record.code)},"event":"{record.event.value}",'
+            f'"event_data":{_dumps(event_data)},'
+            f'"frames":[{frames}],"heap":[{heap}],'
+            f'"stdout":{_dumps(record.stdout)},'
+            f'"exception":{_dumps(record.exception)},'
+            f'"timestamp":{_dumps(record.timestamp)},'
+            f'"memory_usage":{_dumps(record.memory_usage)}}}'
+        )
+
+
+class DeltaEncoder:
+    """Encodes consecutive step records as ``StepDelta`` JSON.
+
+    Gives what :func:`~app.core.trace_delta.diff_step` would produce for
+    the same steps, dumped, without building any model.  Records shared
+    between steps are skipped by identity before comparing them; the
+    text of frames and heap objects comes from *encoder*, so a trace
+    encoded both ways encodes each record once.
+    """
+
+    def __init__(self, encoder: Optional[StepEncoder] = None) -> None:
+        self.encoder = encoder or StepEncoder()
+        self._prev: Optional[StepRecord] = None
+
+    def _frame(
+        self, index: int, prev: Optional[FrameRecord], frame: FrameRecord
+    ) -> Optional[str]:
+        if prev is frame:
+            return None
+        variable = self.encoder._variable
+        if prev is None or prev.name != frame.name or prev.filename != frame.filename:
+            locals_set = {
+                name: variable(var) for name, var in frame.locals.items()
+            }
+            return (
+                f'{{"index":{index},"replace":true,"name":{_dumps(frame.name)},'
+                f'"line":{frame.line},"filename":{_dumps(frame.filename)},'
+                f'"is_module_level":{_dumps(frame.is_module_level)},'
+                f'"globals":{_dumps(frame.globals)},'
+                f'"locals_set":{_dumps(locals_set)},"locals_removed":[]}}'
+            )
+
+        locals_set = {
+            name: variable(var)
+            for name, var in frame.locals.items()
+            if prev.locals.get(name) != var
+        }
+        locals_removed = [name for name in prev.locals if name not in frame.locals]
+        line = frame.line if frame.line != prev.line else None
+        globals_ = frame.globals if frame.globals != prev.globals else None
+        is_module_level = (
+            frame.is_module_level
+            if frame.is_module_level != prev.is_module_level
+            else None
+        )
+
+        if not (locals_set or locals_removed or line is not None
+                or globals_ is not None or is_module_level is not None):
+            return None
+        return (
+            f'{{"index":{index},"replace":false,"name":null,'
+            f'"line":{_dumps(line)},"filename":null,'
+            f'"is_module_level":{_dumps(is_module_level)},'
+            f'"globals":{_dumps(globals_)},'
+            f'"locals_set":{_dumps(locals_set)},'
+            f'"locals_removed":{_dumps(locals_removed)}}}'
+        )
+
+    def step(self, record: StepRecord) -> str:
+        """The delta from the previously encoded record to *record*."""
+        prev, self._prev = self._prev, record
+        prev_frames = prev.frames if prev is not None else []
+        frames_changed = []
+        for index, frame in enumerate(record.frames):
+            prev_frame = prev_frames[index] if index < len(prev_frames) else None
+            text = self._frame(index, prev_frame, frame)
+            if text is not None:
+                frames_changed.append(text)
+
+        prev_heap: Dict[int, HeapRecord] = (
+            {obj.id: obj for obj in prev.heap} if prev is not None else {}
+        )
+        heap_ids = set()
+        heap_set = []
+        for obj in record.heap:
+            heap_ids.add(obj.id)
+            old = prev_heap.get(obj.id)
+            if old is not obj and old != obj:
+                heap_set.append(self.encoder.heap_object(obj))
+        heap_removed = [heap_id for heap_id in prev_heap if heap_id not in heap_ids]
+
+        event_data = (
+            None if record.event_data is None
+            else _safe_serialize(record.event_data)
+        )
+        return (
+            f'{{"step":{record.step},"line":{record.line},'
+            f'"code":{_dumps(record.code)},"event":"{record.event.value}",'
+            f'"event_data":{_dumps(event_data)},'
+            f'"stdout":{_dumps(record.stdout)},'
+            f'"exception":{_dumps(record.exception)},'
+            f'"timestamp":{_dumps(record.timestamp)},'
+            f'"memory_usage":{_dumps(record.memory_usage)},'
+            f'"frame_count":{len(record.frames)},'
+            f'"frames_changed":[{",".join(frames_changed)}],'
+            f'"heap_set":[{",".join(heap_set)}],'
+            f'"heap_removed":{_dumps(heap_removed)}}}'
+        )
+
+
+def delta_trace_json(
+    code: str,
+    deltas: List[str],
+    keyframe_interval: Optional[int],
+    keyframes: List[str],
+    total_steps: int,
+    final_state: Optional[Dict[str, Any]] = None,
+    max_steps_reached: bool = False,
+) -> str:
+    """``DeltaTraceData`` JSON from steps already encoded as JSON."""
+    return (
+        f'{{"code":{_dumps(code)},"deltas":[{",".join(deltas)}],'
+        f'"keyframe_interval":{_dumps(keyframe_interval)},'
+        f'"keyframes":[{",".join(keyframes)}],'
+        f'"total_steps":{total_steps},'
+        f'"final_state":{_dumps(_safe_serialize(final_state))},'
+        f'"max_steps_reached":{_dumps(max_steps_reached)}}}'
+    )
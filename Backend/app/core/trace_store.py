@@ -0,0 +1,277 @@
+"""Columnar (struct-of-arrays) storage for execution traces.
+
+:class:`TraceStore` keeps one ``array`` column per scalar step field
+(step number, line, event, timestamp) and interns code lines and stdout
+chunks in a :class:`StringTable`.  Frames and heap objects live once in
+record pools; each step refers to them through ``[start, end)`` ranges
+into reference arrays, and consecutive steps with the same heap share a
+range.  A step costs a few machine words instead of a tree of models, and
+queries such as :meth:`TraceStore.steps_on_line` scan a column in C.
+
+:func:`trace_view` wraps a store in a :class:`TraceData` whose ``steps``
+builds :class:`ExecutionStep` models on access.
+"""
+
+from __future__ import annotations
+
+import math
+import operator
+from array import array
+from collections.abc import Sequence
+from itertools import compress
+from typing import Any, Dict, Iterator, List, Optional, Union, overload
+
+from app.core.trace_records import (
+    FrameRecord,
+    HeapRecord,
+    ModelBuilder,
+    StepRecord,
+)
+from app.models.trace import ExecutionEvent, ExecutionStep, TraceData
+
+# Event column codes
+_EVENTS: List[ExecutionEvent] = list(ExecutionEvent)
+_EVENT_CODES: Dict[ExecutionEvent, int] = {e: i for i, e in enumerate(_EVENTS)}
+
+_NO_TIMESTAMP = math.nan
+
+
+class StringTable:
+    """Interned strings addressed by a small integer."""
+
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, text: str) -> int:
+        index = self._index.get(text)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(text)
+            self._index[text] = index
+        return index
+
+    def __getitem__(self, index: int) -> str:
+        return self.strings[index]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def __getstate__(self) -> List[str]:
+        return self.strings
+
+    def __setstate__(self, strings: List[str]) -> None:
+        self.strings = strings
+        self._index = {text: i for i, text in enumerate(strings)}
+
+
+class TraceStore:
+    """Append-only columnar store of :class:`StepRecord` rows."""
+
+    def __init__(self) -> None:
+        # Scalar columns, one entry per step
+        self.step_numbers = array("q")
+        self.lines = array("q")
+        self.events = array("b")
+        self.timestamps = array("d")
+        self.code = array("q")  # StringTable index
+        self.stdout = array("q")  # StringTable index
+        self.strings = StringTable()
+
+        # Step i's frames are frame_pool[frame_refs[frame_start[i]:frame_end[i]]]
+        self.frame_start = array("q")
+        self.frame_end = array("q")
+        self.frame_refs = array("q")
+        self.frame_pool: List[FrameRecord] = []
+
+        # Same layout for the heap; unchanged heaps reuse the previous range
+        self.heap_start = array("q")
+        self.heap_end = array("q")
+        self.heap_refs = array("q")
+        self.heap_pool: List[HeapRecord] = []
+
+        # Sparse columns: step index -> value.  A missing event_data means
+        # ``{}``; exception and memory_usage default to ``None``.
+        self.event_data: Dict[int, Optional[Dict[str, Any]]] = {}
+        self.exceptions: Dict[int, Dict[str, str]] = {}
+        self.memory_usage: Dict[int, int] = {}
+
+        # id(record) -> pool index; the pools keep the records alive
+        self._frame_index: Dict[int, int] = {}
+        self._heap_index: Dict[int, int] = {}
+        self._last_heap: Optional[List[HeapRecord]] = None
+
+    def __len__(self) -> int:
+        return len(self.step_numbers)
+
+    # ---- writing ----
+
+    def append(self, record: StepRecord) -> None:
+        index = len(self.step_numbers)
+        self.step_numbers.append(record.step)
+        self.lines.append(record.line)
+        self.events.append(_EVENT_CODES[record.event])
+        self.timestamps.append(
+            _NO_TIMESTAMP if record.timestamp is None else record.timestamp
+        )
+        self.code.append(self.strings.add(record.code))
+        self.stdout.append(self.strings.add(record.stdout))
+
+        self.frame_start.append(len(self.frame_refs))
+        self.frame_refs.extend(
+            self._intern(f, self.frame_pool, self._frame_index)
+            for f in record.frames
+        )
+        self.frame_end.append(len(self.frame_refs))
+
+        last = self._last_heap
+        if last is record.heap or (
+            last is not None
+            and len(last) == len(record.heap)
+            and all(map(operator.is_, last, record.heap))
+        ):
+            self.heap_start.append(self.heap_start[-1])
+            self.heap_end.append(self.heap_end[-1])
+        else:
+            self.heap_start.append(len(self.heap_refs))
+            self.heap_refs.extend(
+                self._intern(h, self.heap_pool, self._heap_index)
+                for h in record.heap
+            )
+            self.heap_end.append(len(self.heap_refs))
+        self._last_heap = record.heap
+
+        if record.event_data != {}:
+            self.event_data[index] = record.event_data
+        if record.exception is not None:
+            self.exceptions[index] = record.exception
+        if record.memory_usage is not None:
+            self.memory_usage[index] = record.memory_usage
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        # Keyed by id(), meaningless in another process
+        del state["_frame_index"], state["_heap_index"], state["_last_heap"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._frame_index = {id(r): i for i, r in enumerate(self.frame_pool)}
+        self._heap_index = {id(r): i for i, r in enumerate(self.heap_pool)}
+        self._last_heap = self.heap(-1) if len(self) else None
+
+    @staticmethod
+    def _intern(record: Any, pool: List[Any], index: Dict[int, int]) -> int:
+        position = index.get(id(record))
+        if position is None:
+            position = len(pool)
+            pool.append(record)
+            index[id(record)] = position
+        return position
+
+    # ---- reading ----
+
+    def _check_index(self, n: int) -> int:
+        size = len(self.step_numbers)
+        if n < 0:
+            n += size
+        if not 0 <= n < size:
+            raise IndexError(f"Step {n} out of range (0..{size - 1})")
+        return n
+
+    def frames(self, n: int) -> List[FrameRecord]:
+        n = self._check_index(n)
+        pool = self.frame_pool
+        refs = self.frame_refs[self.frame_start[n]:self.frame_end[n]]
+        return [pool[i] for i in refs]
+
+    def heap(self, n: int) -> List[HeapRecord]:
+        n = self._check_index(n)
+        pool = self.heap_pool
+        refs = self.heap_refs[self.heap_start[n]:self.heap_end[n]]
+        return [pool[i] for i in refs]
+
+    def record(self, n: int) -> StepRecord:
+        """Reassemble step *n* (negative indexes count from the end)."""
+        n = self._check_index(n)
+        timestamp = self.timestamps[n]
+        return StepRecord(
+            step=self.step_numbers[n],
+            line=self.lines[n],
+            code=self.strings[self.code[n]],
+            event=_EVENTS[self.events[n]],
+            event_data=self.event_data.get(n, {}),
+            frames=self.frames(n),
+            heap=self.heap(n),
+            stdout=self.strings[self.stdout[n]],
+            exception=self.exceptions.get(n),
+            timestamp=None if math.isnan(timestamp) else timestamp,
+            memory_usage=self.memory_usage.get(n),
+        )
+
+    def __iter__(self) -> Iterator[StepRecord]:
+        for n in range(len(self.step_numbers)):
+            yield self.record(n)
+
+    # ---- column queries ----
+
+    def steps_on_line(self, line: int) -> List[int]:
+        """Indexes of the steps that executed *line*."""
+        return list(compress(range(len(self.lines)), map(line.__eq__, self.lines)))
+
+    def steps_with_event(self, event: Union[ExecutionEvent, str]) -> List[int]:
+        """Indexes of the steps recording *event* (e.g. ``"call"``)."""
+        code = _EVENT_CODES[ExecutionEvent(event)]
+        return list(compress(range(len(self.events)), map(code.__eq__, self.events)))
+
+    def stdout_text(self) -> str:
+        """All captured stdout, in step order."""
+        strings = self.strings.strings
+        return "".join([strings[i] for i in self.stdout])
+
+
+class TraceStepsView(Sequence):
+    """Read-only sequence of :class:`ExecutionStep` models over a store.
+
+    Models are built on access; frames, heap objects and variables shared
+    between steps are built once per view.
+    """
+
+    def __init__(self, store: TraceStore) -> None:
+        self.store = store
+        self._builder = ModelBuilder()
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    @overload
+    def __getitem__(self, index: int) -> ExecutionStep: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[ExecutionStep]: ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.store)))]
+        return self._builder.step(self.store.record(index))
+
+    def __iter__(self) -> Iterator[ExecutionStep]:
+        builder = self._builder
+        for record in self.store:
+            yield builder.step(record)
+
+    def __reduce__(self) -> Any:
+        # Ship the compact store, not the models built so far
+        return (TraceStepsView, (self.store,))
+
+
+def trace_view(
+    code: str, store: TraceStore, max_steps_reached: bool = False
+) -> TraceData:
+    """Return a :class:`TraceData` whose steps are a view over *store*."""
+    return TraceData.model_construct(
+        code=code,
+        steps=TraceStepsView(store),
+        total_steps=len(store),
+        max_steps_reached=max_steps_reached,
+    )
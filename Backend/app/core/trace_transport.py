@@ -0,0 +1,68 @@
+"""Hands finished traces from a worker process to the server.
+
+The worker encodes a trace to JSON once and writes the bytes into a
+:class:`~multiprocessing.shared_memory.SharedMemory` block.  Only a small
+:class:`TraceHandle` travels back through the process pool's result
+queue.  The server copies the sections out, frees the block and sends the
+bytes as they are, so no step object is pickled, unpickled or dumped
+again on the way.
+"""
+
+from __future__ import annotations
+
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, NamedTuple, Tuple
+
+
+class TraceHandle(NamedTuple):
+    """Names a shared-memory block and the byte ranges stored in it."""
+
+    name: str
+    sections: Dict[str, Tuple[int, int]]  # section -> (start, end)
+
+
+def export_sections(sections: Dict[str, bytes]) -> TraceHandle:
+    """Write *sections* back to back into a new block (worker side).
+
+    The block outlives the worker; :func:`import_sections` or
+    :func:`discard` must be called on the handle to free it.
+    """
+    size = sum(len(data) for data in sections.values())
+    block = SharedMemory(create=True, size=max(size, 1))
+    try:
+        ranges: Dict[str, Tuple[int, int]] = {}
+        position = 0
+        for key, data in sections.items():
+            end = position + len(data)
+            block.buf[position:end] = data
+            ranges[key] = (position, end)
+            position = end
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    return TraceHandle(block.name, ranges)
+
+
+def import_sections(handle: TraceHandle) -> Dict[str, bytes]:
+    """Copy the sections out of the block and free it (server side)."""
+    block = SharedMemory(name=handle.name)
+    try:
+        return {
+            key: bytes(block.buf[start:end])
+            for key, (start, end) in handle.sections.items()
+        }
+    finally:
+        block.close()
+        block.unlink()
+
+
+def discard(handle: TraceHandle) -> None:
+    """Free a block whose contents are no longer wanted."""
+    try:
+        block = SharedMemory(name=handle.name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
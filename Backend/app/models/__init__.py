@@ -15,6 +15,10 @@ __all__ = [
     "Frame",
     "ExecutionStep",
     "TraceData",
+    "TraceFormat",
+    "FrameDelta",
+    "StepDelta",
+    "DeltaTraceData",
     "VariableType",
     "ExecutionEvent",
     "SignUpRequest",
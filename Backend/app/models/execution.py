@@ -18,6 +18,7 @@ class ExecutionStatus(str, Enum):
     TIMEOUT = "timeout"
     CANCELLED = "cancelled"
     SECURITY_VIOLATION = "security_violation"
+    REJECTED = "rejected"  # Execution queue full
 
 
 class ExecutionRequest(BaseModel):
@@ -40,6 +41,11 @@ class ExecutionRequest(BaseModel):
     session_id: Optional[str] = Field(
         default=None, description="Existing session ID for continuation"
     )
+    execution_id: Optional[str] = Field(
+        default=None,
+        max_length=100,
+        description="Client-chosen ID for cancelling the run while it executes",
+    )
     options: Optional[Dict[str, Any]] = Field(
         default_factory=dict, description="Execution options"
     )
@@ -49,6 +55,48 @@ class ExecutionRequest(BaseModel):
             self.options = {}
 
 
+class BatchExecutionRequest(BaseModel):
+    """Many programs run in one call, e.g. a class's submissions for grading."""
+
+    requests: List[ExecutionRequest] = Field(
+        ..., min_length=1, max_length=1000, description="Programs to run"
+    )
+    max_concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Runs of this batch in flight at once"
+    )
+    include_steps: bool = Field(
+        default=True, description="Include each run's trace steps"
+    )
+
+
+class TestCaseInput(BaseModel):
+    user_input: str = Field(
+        default="", max_length=10000, description="Input for input() function"
+    )
+    expected_output: Optional[str] = Field(
+        default=None,
+        max_length=100000,
+        description="Output the case passes with (trailing whitespace ignored)",
+    )
+
+
+class TestCaseRequest(BaseModel):
+    """One program run against many inputs, e.g. for autograding."""
+
+    code: str = Field(
+        ..., min_length=1, max_length=50000, description="Python code to execute"
+    )
+    cases: List[TestCaseInput] = Field(..., min_length=1)
+    trace: bool = Field(
+        default=False, description="Trace each case (slower; reports step counts)"
+    )
+    execution_id: Optional[str] = Field(
+        default=None,
+        max_length=100,
+        description="Client-chosen ID for cancelling the run while it executes",
+    )
+
+
 class ExecutionMetadata(BaseModel):
     ip_address: Optional[str] = None
     user_agent: Optional[str] = None
@@ -68,12 +116,17 @@ class ExecutionResponse(BaseModel):
                 "stdout": "1\n2\n3\n",
                 "stderr": None,
                 "execution_time": 0.045,
+                "queue_time": 0.002,
             }
         }
     )
 
     session_id: str
+    execution_id: Optional[str] = None
     status: ExecutionStatus
+    trace_format: str = Field(
+        "full", description="'full' steps or 'delta' step diffs"
+    )
     steps: Optional[List[Dict[str, Any]]] = None
     total_steps: int = 0
     current_step: int = 0
@@ -81,6 +134,9 @@ class ExecutionResponse(BaseModel):
     stderr: Optional[str] = None
     error: Optional[str] = None
     execution_time: Optional[float] = None
+    queue_time: Optional[float] = Field(
+        None, description="Seconds spent waiting for a worker"
+    )
     metadata: Optional[ExecutionMetadata] = None
 
 
@@ -115,3 +115,72 @@ class TraceData(BaseModel):
     total_steps: int
     final_state: Optional[Dict[str, Any]] = None
     max_steps_reached: bool = False
+
+    @field_serializer("steps", mode="wrap")
+    def serialize_steps(self, steps: Any, handler: Any) -> Any:
+        # ``steps`` may be a lazy view over a columnar TraceStore
+        return handler(steps if isinstance(steps, list) else list(steps))
+
+
+# ------------------------------------------------------------------
+# Delta-encoded trace
+# ------------------------------------------------------------------
+
+class TraceFormat(str, Enum):
+    FULL = "full"
+    DELTA = "delta"
+
+
+class FrameDelta(BaseModel):
+    """Changes to one stack frame relative to the previous step.
+
+    When ``replace`` is set the frame is new at ``index`` and is rebuilt
+    from scratch; otherwise ``None`` fields are unchanged.
+    """
+
+    index: int = Field(..., ge=0, description="Position in the frame stack")
+    replace: bool = False
+    name: Optional[str] = None
+    line: Optional[int] = None
+    filename: Optional[str] = None
+    is_module_level: Optional[bool] = None
+    globals: Optional[Dict[str, str]] = None
+    locals_set: Dict[str, Variable] = Field(default_factory=dict)
+    locals_removed: List[str] = Field(default_factory=list)
+
+
+class StepDelta(BaseModel):
+    """An :class:`ExecutionStep` stored as a diff against the step before it."""
+
+    step: int = Field(..., ge=0)
+    line: int = Field(..., ge=0)
+    code: str = Field(..., description="Source code line")
+    event: ExecutionEvent
+    event_data: Optional[Dict[str, Any]] = None
+    stdout: str = ""
+    exception: Optional[Dict[str, str]] = None
+    timestamp: Optional[float] = None
+    memory_usage: Optional[int] = None
+    frame_count: int = Field(0, ge=0, description="Stack depth after this step")
+    frames_changed: List[FrameDelta] = Field(default_factory=list)
+    heap_set: List[HeapObject] = Field(
+        default_factory=list, description="Heap objects added or changed"
+    )
+    heap_removed: List[int] = Field(
+        default_factory=list, description="Heap IDs no longer present"
+    )
+
+
+class DeltaTraceData(BaseModel):
+    code: str
+    deltas: List[StepDelta]
+    keyframe_interval: Optional[int] = Field(
+        None, ge=1, description="Full snapshot stored every N steps"
+    )
+    keyframes: List[ExecutionStep] = Field(
+        default_factory=list,
+        description="Full step at index i * keyframe_interval",
+    )
+    total_steps: int
+    final_state: Optional[Dict[str, Any]] = None
+    max_steps_reached: bool = False
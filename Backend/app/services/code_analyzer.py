@@ -15,27 +15,52 @@ class AnalysisResult:
     has_functions: bool = False
     has_classes: bool = False
     has_imports: bool = False
+    # Imported modules whose results vary between runs (see
+    # CodeAnalyzer.NONDETERMINISTIC_MODULES)
+    nondeterministic_imports: List[str] = field(default_factory=list)
     estimated_steps: int = 0
     warnings: List[str] = field(default_factory=list)
     errors: List[str] = field(default_factory=list)
 
+    @property
+    def is_deterministic(self) -> bool:
+        """Whether re-running the code with the same input gives the same trace."""
+        return not self.nondeterministic_imports and not self.errors
+
 
 class CodeAnalyzer:
     """Lightweight static analyser for Python source."""
 
+    NONDETERMINISTIC_MODULES = frozenset(
+        {"random", "time", "uuid", "datetime", "secrets"}
+    )
+
     @staticmethod
-    def analyze(code: str) -> AnalysisResult:
+    def analyze(code: str, tree: Optional[ast.Module] = None) -> AnalysisResult:
+        """Analyse *code*; *tree*, if given, is *code* already parsed."""
         result = AnalysisResult()
 
-        try:
-            tree = ast.parse(code)
-        except SyntaxError as exc:
-            result.errors.append(f"SyntaxError: {exc.msg} (line {exc.lineno})")
-            return result
+        if tree is None:
+            try:
+                tree = ast.parse(code)
+            except SyntaxError as exc:
+                result.errors.append(f"SyntaxError: {exc.msg} (line {exc.lineno})")
+                return result
 
         for node in ast.walk(tree):
             if isinstance(node, (ast.Import, ast.ImportFrom)):
                 result.has_imports = True
+                if isinstance(node, ast.Import):
+                    modules = [alias.name for alias in node.names]
+                else:
+                    modules = [node.module or ""]
+                for module in modules:
+                    root = module.split(".")[0]
+                    if (
+                        root in CodeAnalyzer.NONDETERMINISTIC_MODULES
+                        and root not in result.nondeterministic_imports
+                    ):
+                        result.nondeterministic_imports.append(root)
             elif isinstance(node, (ast.For, ast.While)):
                 result.has_loops = True
             elif isinstance(node, ast.FunctionDef):
@@ -0,0 +1,102 @@
+"""Parse-once front end for submitted programs.
+
+A program used to be parsed several times per request: compiled for a
+syntax check, parsed again by the static analysis, by the security scan
+in the worker and once more when the worker compiled it to run.
+:meth:`CodeFrontend.prepare` parses it once and derives all of that
+from the one AST — syntax error, security verdict, analysis and code
+object — and memoizes the outcome by source hash, so a program that is
+submitted again (the same exercise by a whole class, say) is not parsed
+at all.  The worker gets the code object as marshalled bytes and runs it
+without validating or compiling anything.
+"""
+
+from __future__ import annotations
+
+import ast
+import marshal
+import types
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.services.code_analyzer import AnalysisResult, CodeAnalyzer
+from app.services.result_cache import ResultCache, cache_key
+from app.services.sandbox import SandboxSecurity
+
+
+@dataclass(frozen=True)
+class PreparedSource:
+    """Everything the server works out about a program before running it."""
+
+    digest: str  # SHA-256 of the source
+    syntax_error: Optional[str]
+    security_error: Optional[str]
+    analysis: Optional[AnalysisResult]  # None with a syntax error
+    bytecode: Optional[bytes]  # marshalled code object, if it may run
+
+    @property
+    def deterministic(self) -> bool:
+        """Whether its results may be shared and cached."""
+        return self.analysis is not None and self.analysis.is_deterministic
+
+    @property
+    def size(self) -> int:
+        return len(self.digest) + len(self.bytecode or b"") + 256
+
+
+def load_code(bytecode: bytes) -> types.CodeType:
+    """The code object of a :class:`PreparedSource`, in a worker."""
+    return marshal.loads(bytecode)
+
+
+class CodeFrontend:
+    """Prepares programs once and keeps the results in an LRU cache.
+
+    The cache holds up to *max_bytes* (mostly bytecode) for *ttl*
+    seconds; a *max_bytes* of 0 disables it.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self._prepared: ResultCache[PreparedSource] = ResultCache(max_bytes, ttl)
+
+    def prepare(self, code: str, allow_input: bool = False) -> PreparedSource:
+        """Prepare *code*; *allow_input* lets it call ``input()``.
+
+        The sandbox allows ``input()`` only to runs that supply input of
+        their own, so the verdict is kept per setting.
+        """
+        digest = cache_key(code)
+        key = f"{digest}:input" if allow_input else digest
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            prepared = _prepare(code, digest, allow_input)
+            self._prepared.put(key, prepared, prepared.size)
+        return prepared
+
+    def stats(self) -> Dict[str, Any]:
+        return self._prepared.stats()
+
+
+def _prepare(code: str, digest: str, allow_input: bool) -> PreparedSource:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as exc:
+        return PreparedSource(digest, _syntax_message(exc), None, None, None)
+
+    analysis = CodeAnalyzer.analyze(code, tree)
+    is_safe, security_error = SandboxSecurity.validate_code(
+        code, tree, allow_input
+    )
+    if not is_safe:
+        return PreparedSource(digest, None, security_error, analysis, None)
+
+    try:
+        compiled = compile(tree, "<string>", "exec")
+    except SyntaxError as exc:
+        # Errors only the compiler finds, such as 'return' outside a function
+        return PreparedSource(digest, _syntax_message(exc), None, None, None)
+    return PreparedSource(digest, None, None, analysis, marshal.dumps(compiled))
+
+
+def _syntax_message(exc: SyntaxError) -> str:
+    return f"SyntaxError: {exc.msg} at line {exc.lineno}"
@@ -2,26 +2,103 @@
 
 from __future__ import annotations
 
+import json
 import multiprocessing
+import threading
 import time
-from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
-from dataclasses import dataclass
-from typing import Any, Callable, Dict, List, Optional
+import uuid
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    CancelledError,
+    Future,
+    TimeoutError as FuturesTimeoutError,
+    wait,
+)
+from dataclasses import dataclass, replace
+from multiprocessing.connection import Connection
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from app.config import settings
-from app.core.trace_collector import TraceCollector
+from app.core.execution_engine import (
+    PlainRunner,
+    TimeLimitExceeded,
+    time_limit as execution_time_limit,
+)
+from app.core.trace_collector import (
+    TRACER_VERSION,
+    ExecutionCancelled,
+    TraceCollector,
+)
+from app.core.trace_delta import encode_trace
+from app.core.trace_records import (
+    DeltaEncoder,
+    StepEncoder,
+    StepRecord,
+    delta_trace_json,
+)
+from app.core.trace_transport import (
+    TraceHandle,
+    discard,
+    export_sections,
+    import_sections,
+)
 from app.models.execution import ExecutionStatus
-from app.models.trace import TraceData
-from app.services.sandbox import SandboxSecurity
+from app.models.trace import DeltaTraceData, TraceData, TraceFormat
+from app.services.code_frontend import CodeFrontend, PreparedSource, load_code
+from app.services.result_cache import ResultCache, cache_key
+from app.services.single_flight import Flight, SingleFlight
 from app.utils.logger import get_logger
+from app.workers.pool import (
+    JobFuture,
+    PoolSaturated,
+    WorkerKilled,
+    WorkerPool,
+    stop_requested,
+)
+from app.workers.scheduler import Priority
 
 logger = get_logger(__name__)
 
+# How often a streaming reader wakes up to check on a silent worker
+_STREAM_POLL_INTERVAL = 0.1
+
+# How long a batch holds back after one of its runs was turned away
+_BATCH_RETRY_INTERVAL = 0.5
+
+# Imported by each worker before it accepts jobs
+_WORKER_PRELOAD = (
+    "app.config",
+    "app.models.trace",
+    "app.models.execution",
+    "app.core.trace_collector",
+    "app.services.executor",
+)
+
 
 # ------------------------------------------------------------------
 # Dataclass returned from every execution attempt
 # ------------------------------------------------------------------
 
+@dataclass
+class EncodedTrace:
+    """A trace already serialized to JSON by the worker."""
+
+    steps: bytes  # JSON array of steps (or step deltas)
+    total_steps: int
+    keyframed: Optional[bytes]  # DeltaTraceData JSON, if the trace is kept
+
+
 @dataclass
 class ExecutionResult:
     success: bool
@@ -31,55 +108,186 @@ class ExecutionResult:
     error: Optional[str]
     execution_time: float
     status: ExecutionStatus
+    queue_time: float = 0.0  # waiting for a worker, not in execution_time
+    delta_trace: Optional[DeltaTraceData] = None
+    encoded_trace: Optional[EncodedTrace] = None
+    execution_id: Optional[str] = None
+    cached: bool = False
+    coalesced: bool = False  # shared the run of an identical request
+    test_cases: Optional[List[TestCaseResult]] = None  # run_test_cases only
+
+    @property
+    def size(self) -> int:
+        """Bytes of output and encoded trace held, for memory budgets."""
+        size = len(self.stdout) + len(self.error or "") + len(self.stderr or "")
+        if self.encoded_trace is not None:
+            size += len(self.encoded_trace.steps)
+            size += len(self.encoded_trace.keyframed or b"")
+        return size
+
+
+@dataclass
+class TestCase:
+    user_input: str = ""
+    expected_output: Optional[str] = None  # None: the case is only run
+
+
+@dataclass
+class TestCaseResult:
+    """One case of :meth:`ExecutionService.run_test_cases`."""
+
+    stdout: str
+    error: Optional[str]  # What the program raised, or why it was stopped
+    status: ExecutionStatus  # COMPLETED, ERROR or TIMEOUT
+    execution_time: float
+    total_steps: Optional[int] = None  # Traced runs only
+    passed: Optional[bool] = None  # None without an expected output
 
 
 # ------------------------------------------------------------------
 # Subprocess target – runs in an isolated worker process
 # ------------------------------------------------------------------
 
+class _StepBatcher:
+    """Sends encoded steps from the worker to the server as they are recorded.
+
+    Each message on *conn* is a list of ``ExecutionStep`` JSON strings;
+    ``None`` marks the end of the stream.  The first step goes out at once
+    so the client sees progress immediately.
+    """
+
+    def __init__(self, conn: Connection) -> None:
+        self.conn: Optional[Connection] = conn
+        self.encoder = StepEncoder()
+        self.batch: List[str] = []
+        self.last_flush = 0.0
+
+    def __call__(self, record: StepRecord) -> None:
+        if self.conn is None:
+            return
+        self.batch.append(self.encoder.step(record))
+        if (
+            len(self.batch) >= settings.STREAM_BATCH_SIZE
+            or time.monotonic() - self.last_flush >= settings.STREAM_FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        self._send(self.batch)
+        self.batch = []
+        self.last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self.batch:
+            self._send(self.batch)
+        self._send(None)
+        self.batch = []
+        self.conn = None
+
+    def _send(self, message: Optional[List[str]]) -> None:
+        if self.conn is None:
+            return
+        try:
+            self.conn.send(message)
+        except OSError:
+            # The reader went away; raising from the trace hook stops the program
+            self.conn = None
+            raise
+
+
 def _execute_in_subprocess(
-    code: str, user_input: str, max_steps: int
+    code: str,
+    bytecode: bytes,
+    user_input: str,
+    max_steps: int,
+    trace_format: TraceFormat = TraceFormat.FULL,
+    stream: Optional[Connection] = None,
+    encoded: bool = False,
+    keep_trace: bool = False,
 ) -> Dict[str, Any]:
-    """Execute code in an isolated subprocess."""
-    # Resource limits (Unix only)
-    try:
-        import resource
+    """Execute code in an isolated subprocess.
 
-        resource.setrlimit(
-            resource.RLIMIT_AS,
-            (settings.MAX_MEMORY_MB * 1024 * 1024, -1),
+    *bytecode* is the program as prepared (and validated) by the server's
+    :class:`CodeFrontend`; *code* is its source, for the trace.
+    If *stream* (the sending end of a pipe) is given, steps are sent through
+    it while the program runs and the returned result carries no trace.
+    With *encoded* the trace is returned as JSON in shared memory, with
+    a keyframed copy if *keep_trace*; see :func:`_encode_trace`.
+    """
+    if stream is None:
+        return _run_traced(
+            code, bytecode, user_input, trace_format,
+            encoded=encoded, keep_trace=keep_trace,
         )
-        resource.setrlimit(
-            resource.RLIMIT_CPU,
-            (settings.MAX_EXECUTION_TIME + 1, -1),
-        )
-    except ImportError:
-        pass  # Windows
 
-    # Security validation
-    is_safe, error = SandboxSecurity.validate_code(code)
-    if not is_safe:
-        return {
-            "success": False,
-            "error": error,
-            "status": ExecutionStatus.SECURITY_VIOLATION,
-            "steps": [],
-        }
+    batcher = _StepBatcher(stream)
+    try:
+        return _run_traced(code, bytecode, user_input, trace_format, batcher)
+    finally:
+        try:
+            batcher.close()
+        except OSError:
+            pass
+
+
+def _run_traced(
+    code: str,
+    bytecode: bytes,
+    user_input: str,
+    trace_format: TraceFormat,
+    on_step: Optional[_StepBatcher] = None,
+    encoded: bool = False,
+    keep_trace: bool = False,
+) -> Dict[str, Any]:
+    _limit_resources(settings.MAX_EXECUTION_TIME)
 
     try:
-        collector = TraceCollector(code, user_input)
+        collector = TraceCollector(
+            code,
+            user_input,
+            on_step=on_step,
+            should_stop=stop_requested,
+            compiled=load_code(bytecode),
+        )
         trace_data = collector.execute()
-        stdout = "".join(step.stdout for step in trace_data.steps)
+        stdout = collector.state.store.stdout_text()
+        total_steps = trace_data.total_steps
+        max_steps_reached = trace_data.max_steps_reached
+
+        # Encode before pickling so only the diffs cross the process boundary
+        delta_trace = None
+        encoded_trace = None
+        if on_step is not None:
+            trace_data = None  # Already streamed
+        elif encoded:
+            encoded_trace = _encode_trace(
+                collector, trace_data, trace_format, keep_trace
+            )
+            trace_data = None
+        elif trace_format == TraceFormat.DELTA:
+            delta_trace = encode_trace(
+                trace_data, settings.TRACE_KEYFRAME_INTERVAL
+            )
+            trace_data = None
 
         return {
             "success": True,
             "trace": trace_data,
+            "delta_trace": delta_trace,
+            "encoded_trace": encoded_trace,
             "stdout": stdout,
             "stderr": None,
             "error": None,
             "status": ExecutionStatus.COMPLETED,
-            "total_steps": trace_data.total_steps,
-            "max_steps_reached": trace_data.max_steps_reached,
+            "total_steps": total_steps,
+            "max_steps_reached": max_steps_reached,
+        }
+    except ExecutionCancelled:
+        return {
+            "success": False,
+            "error": "Execution cancelled",
+            "status": ExecutionStatus.CANCELLED,
+            "steps": [],
         }
     except MemoryError:
         return {
@@ -104,17 +312,541 @@ def _execute_in_subprocess(
         }
 
 
+def _execute_untraced(
+    bytecode: bytes, user_input: str, time_limit: float
+) -> Dict[str, Any]:
+    """Run a prepared program without tracing; see :class:`PlainRunner`.
+
+    The program gets *time_limit* seconds of wall time and at most
+    ``MAX_OUTPUT_LENGTH`` characters of output instead of a step budget.
+    An exception it raises fails the run with status ``ERROR``.
+    """
+    _limit_resources(time_limit)
+
+    runner = PlainRunner(user_input, max_output=settings.MAX_OUTPUT_LENGTH)
+    try:
+        with execution_time_limit(time_limit):
+            run = runner.execute(load_code(bytecode))
+    except TimeLimitExceeded:
+        return {
+            "success": False,
+            "stdout": runner.stdout(),
+            "error": f"Execution timed out after {time_limit}s",
+            "status": ExecutionStatus.TIMEOUT,
+        }
+    except MemoryError:
+        return {
+            "success": False,
+            "error": "Memory limit exceeded",
+            "status": ExecutionStatus.ERROR,
+        }
+    return {
+        "success": run.error is None,
+        "stdout": run.stdout,
+        "stderr": None,
+        "error": run.error,
+        "status": (
+            ExecutionStatus.COMPLETED if run.error is None else ExecutionStatus.ERROR
+        ),
+    }
+
+
+def _limit_resources(cpu_seconds: float) -> None:
+    """Cap the job's memory and give it *cpu_seconds* of CPU (Unix only)."""
+    try:
+        import resource
+
+        resource.setrlimit(
+            resource.RLIMIT_AS,
+            (settings.MAX_MEMORY_MB * 1024 * 1024, -1),
+        )
+        # Workers are reused, so the CPU budget starts from what they used so far
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        resource.setrlimit(
+            resource.RLIMIT_CPU,
+            (int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1, -1),
+        )
+    except ImportError:
+        pass  # Windows
+
+
+def _run_test_cases(
+    code: str,
+    bytecode: bytes,
+    inputs: List[str],
+    trace: bool,
+    time_limit: float,
+) -> Dict[str, Any]:
+    """Run a prepared program once per input.
+
+    Cases run back to back in this worker, each with a fresh namespace
+    and *time_limit* seconds of wall time; without *trace* no trace hook
+    is installed at all.  A stop request ends the run between cases.
+    """
+    _limit_resources(time_limit * len(inputs))
+
+    compiled = load_code(bytecode)
+    cases: List[TestCaseResult] = []
+    try:
+        for user_input in inputs:
+            if stop_requested():
+                raise ExecutionCancelled()
+            cases.append(
+                _run_test_case(code, compiled, user_input, trace, time_limit)
+            )
+    except ExecutionCancelled:
+        return {
+            "success": False,
+            "error": "Execution cancelled",
+            "status": ExecutionStatus.CANCELLED,
+            "test_cases": cases,
+        }
+    return {
+        "success": True,
+        "error": None,
+        "status": ExecutionStatus.COMPLETED,
+        "test_cases": cases,
+    }
+
+
+def _run_test_case(
+    code: str,
+    compiled: Any,
+    user_input: str,
+    trace: bool,
+    time_limit: float,
+) -> TestCaseResult:
+    start = time.perf_counter()
+    collector: Optional[TraceCollector] = None
+    try:
+        with execution_time_limit(time_limit):
+            if trace:
+                collector = TraceCollector(
+                    code,
+                    user_input,
+                    should_stop=stop_requested,
+                    compiled=compiled,
+                    echo_input=False,
+                )
+                trace_data = collector.execute()
+                stdout = collector.state.store.stdout_text()
+                error = collector.error and (
+                    f"{type(collector.error).__name__}: {collector.error}"
+                )
+                total_steps: Optional[int] = trace_data.total_steps
+            else:
+                run = PlainRunner(user_input, echo_input=False).execute(compiled)
+                stdout, error, total_steps = run.stdout, run.error, None
+    except TimeLimitExceeded:
+        return TestCaseResult(
+            stdout=collector.state.store.stdout_text() if collector else "",
+            error=f"Timed out after {time_limit}s",
+            status=ExecutionStatus.TIMEOUT,
+            execution_time=time.perf_counter() - start,
+        )
+    except (MemoryError, RecursionError) as exc:
+        return TestCaseResult(
+            stdout="",
+            error=type(exc).__name__,
+            status=ExecutionStatus.ERROR,
+            execution_time=time.perf_counter() - start,
+        )
+    return TestCaseResult(
+        stdout=stdout,
+        error=error,
+        status=ExecutionStatus.ERROR if error else ExecutionStatus.COMPLETED,
+        execution_time=time.perf_counter() - start,
+        total_steps=total_steps,
+    )
+
+
+def _encode_trace(
+    collector: TraceCollector,
+    trace_data: TraceData,
+    trace_format: TraceFormat,
+    keep_trace: bool = False,
+) -> TraceHandle:
+    """Serialize the finished trace to JSON once and put it in shared memory.
+
+    The ``steps`` section is what the HTTP response carries (full steps or
+    step deltas, per *trace_format*).  With *keep_trace* a ``keyframed``
+    section is added: the :class:`DeltaTraceData` stored for step-level
+    access.  Both are written straight from the collector's records.
+    """
+    store = collector.state.store
+    encoder = StepEncoder()
+    deltas: List[str] = []
+    if trace_format == TraceFormat.DELTA or keep_trace:
+        delta_encoder = DeltaEncoder(encoder)
+        deltas = [delta_encoder.step(record) for record in store]
+    if trace_format == TraceFormat.DELTA:
+        steps = deltas
+    else:
+        steps = [encoder.step(record) for record in store]
+    sections = {"steps": ("[" + ",".join(steps) + "]").encode()}
+
+    if keep_trace:
+        interval = settings.TRACE_KEYFRAME_INTERVAL
+        if not interval:
+            keyframes: List[str] = []
+        elif trace_format == TraceFormat.DELTA:
+            keyframes = [
+                encoder.step(store.record(n)) for n in range(0, len(store), interval)
+            ]
+        else:
+            keyframes = steps[::interval]
+        sections["keyframed"] = delta_trace_json(
+            trace_data.code,
+            deltas,
+            interval,
+            keyframes,
+            trace_data.total_steps,
+            trace_data.final_state,
+            trace_data.max_steps_reached,
+        ).encode()
+    return export_sections(sections)
+
+
+# ------------------------------------------------------------------
+# Result helpers
+# ------------------------------------------------------------------
+
+def _unrunnable(source: PreparedSource) -> Optional[ExecutionResult]:
+    """The result of a program rejected before it runs, else ``None``."""
+    if source.syntax_error is not None:
+        return _failure(source.syntax_error, 0.0)
+    if source.security_error is not None:
+        return _failure(
+            source.security_error, 0.0, ExecutionStatus.SECURITY_VIOLATION
+        )
+    return None
+
+
+def _failure(
+    error: str,
+    execution_time: float,
+    status: ExecutionStatus = ExecutionStatus.ERROR,
+) -> ExecutionResult:
+    return ExecutionResult(
+        success=False,
+        trace_data=None,
+        stdout="",
+        stderr=None,
+        error=error,
+        execution_time=execution_time,
+        status=status,
+    )
+
+
+def _timeout(seconds: Optional[float] = None) -> ExecutionResult:
+    seconds = settings.MAX_EXECUTION_TIME if seconds is None else seconds
+    return _failure(
+        f"Execution timed out after {seconds}s",
+        float(seconds),
+        ExecutionStatus.TIMEOUT,
+    )
+
+
+def _queue_timeout() -> ExecutionResult:
+    return _failure(
+        f"No worker became free within {settings.MAX_QUEUE_WAIT}s",
+        0.0,
+        ExecutionStatus.TIMEOUT,
+    )
+
+
+def _rejected() -> ExecutionResult:
+    return _failure(
+        "Too many executions are waiting; try again shortly",
+        0.0,
+        ExecutionStatus.REJECTED,
+    )
+
+
+def _cancelled(execution_time: float) -> ExecutionResult:
+    return _failure(
+        "Execution cancelled", execution_time, ExecutionStatus.CANCELLED
+    )
+
+
+def _from_worker(result: Dict[str, Any], execution_time: float) -> ExecutionResult:
+    """Build an :class:`ExecutionResult` from a worker's result dict."""
+    encoded_trace = None
+    handle = result.get("encoded_trace")
+    if handle is not None:
+        sections = import_sections(handle)
+        encoded_trace = EncodedTrace(
+            steps=sections["steps"],
+            total_steps=result["total_steps"],
+            keyframed=sections.get("keyframed"),
+        )
+
+    return ExecutionResult(
+        success=result["success"],
+        trace_data=result.get("trace"),
+        stdout=result.get("stdout", ""),
+        stderr=result.get("stderr"),
+        error=result.get("error"),
+        execution_time=execution_time,
+        status=result["status"],
+        delta_trace=result.get("delta_trace"),
+        encoded_trace=encoded_trace,
+        test_cases=result.get("test_cases"),
+    )
+
+
+def _cacheable(result: ExecutionResult) -> bool:
+    """Only outcomes decided by the program itself may be reused."""
+    return (
+        result.status in (ExecutionStatus.COMPLETED, ExecutionStatus.SECURITY_VIOLATION)
+        and result.trace_data is None
+        and result.delta_trace is None
+    )
+
+
+def _same_output(actual: str, expected: str) -> bool:
+    """Whether *actual* output matches *expected*, as graders compare it.
+
+    Trailing whitespace on each line and trailing blank lines are ignored.
+    """
+
+    def lines(text: str) -> List[str]:
+        return [line.rstrip() for line in text.rstrip().splitlines()]
+
+    return lines(actual) == lines(expected)
+
+
+def _resolved(result: ExecutionResult) -> "Future[ExecutionResult]":
+    future: "Future[ExecutionResult]" = Future()
+    future.set_result(result)
+    return future
+
+
+def _discard_late_result(future: Future) -> None:
+    """Free the shared memory of a result that arrived after a timeout."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    handle = future.result().get("encoded_trace")
+    if handle is not None:
+        discard(handle)
+
+
+# ------------------------------------------------------------------
+# Runs shared by coalesced requests
+# ------------------------------------------------------------------
+
+class _StepLog:
+    """The steps of a streamed run so far.
+
+    Any number of subscribers can read it from the start while the run
+    is still adding to it, so one that joins late misses nothing.
+    """
+
+    def __init__(self) -> None:
+        self._batches: List[List[str]] = []
+        self._complete = False
+        self._changed = threading.Condition()
+
+    def append(self, batch: List[str]) -> None:
+        with self._changed:
+            self._batches.append(batch)
+            self._changed.notify_all()
+
+    def close(self) -> None:
+        with self._changed:
+            self._complete = True
+            self._changed.notify_all()
+
+    def read(self, start: int, timeout: float) -> Tuple[List[List[str]], bool]:
+        """Batches from index *start* on and whether no more will follow.
+
+        Waits up to *timeout* seconds if there is nothing new yet.
+        """
+        with self._changed:
+            if start >= len(self._batches) and not self._complete:
+                self._changed.wait(timeout)
+            return self._batches[start:], self._complete
+
+
+@dataclass
+class _Run:
+    """A worker job and what its coalesced requests share of it."""
+
+    client: str  # whose turn in the worker queue the job takes
+    priority: Priority
+    future: Optional[JobFuture] = None  # set once the job is submitted
+    steps: Optional[_StepLog] = None  # streamed runs only
+    time_limit: Optional[float] = None  # default MAX_EXECUTION_TIME
+    # Seconds past time_limit before the job is stopped, for jobs that
+    # time themselves out and should get to report it
+    slack: float = 0.0
+
+    def running_time(self) -> float:
+        """Seconds the job has been running (0 while it is queued)."""
+        if self.future is None or self.future.started is None:
+            return 0.0
+        return time.monotonic() - self.future.started
+
+    def deadline(self) -> float:
+        """When the job times out, on the :func:`time.monotonic` clock.
+
+        The clock starts when a worker takes the job, not while it waits.
+        """
+        started = self.future.started or time.monotonic()
+        limit = self.time_limit or settings.MAX_EXECUTION_TIME
+        return started + limit + self.slack
+
+
+def _wait_started(future: JobFuture) -> bool:
+    """Wait for a worker to take *future*'s job.
+
+    Returns ``False`` if it was still queued after ``MAX_QUEUE_WAIT``
+    seconds; it is then dropped from the queue.
+    """
+    return future.wait_started(settings.MAX_QUEUE_WAIT) or not future.cancel()
+
+
+# ------------------------------------------------------------------
+# Streaming execution
+# ------------------------------------------------------------------
+
+class ExecutionStream:
+    """Iterates over the steps of a running execution as they are recorded.
+
+    Each item is one step as ``ExecutionStep`` JSON text, so it can be
+    forwarded to a client without decoding.  Once iteration ends,
+    :attr:`result` holds the :class:`ExecutionResult` (without a trace)
+    and :attr:`total_steps` the number of steps yielded.  Running past
+    the deadline stops the worker; closing the iterator early or
+    cancelling the run by :attr:`execution_id` stops it too unless
+    another stream of the same program is still reading.
+
+    The run starts on :meth:`start` (or on iteration).  If the worker
+    queue is full it never does: :attr:`rejected` is then set and
+    iterating yields nothing.
+    """
+
+    def __init__(
+        self,
+        service: ExecutionService,
+        code: str,
+        user_input: str = "",
+        execution_id: Optional[str] = None,
+        client: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> None:
+        self.service = service
+        self.code = code
+        self.user_input = user_input
+        self.execution_id = execution_id or str(uuid.uuid4())
+        self.client = client
+        self.priority = priority
+        self.result: Optional[ExecutionResult] = None
+        self.total_steps = 0
+        self._mine: Optional[Future] = None
+        self._leader = False
+        self._run: Optional[_Run] = None
+
+    def start(self) -> None:
+        """Start the run, or join an identical one already in flight."""
+        if self._mine is not None or self.result is not None:
+            return
+        service = self.service
+        source = service.frontend.prepare(self.code)
+        error = _unrunnable(source)
+        if error is not None:
+            self.result = replace(error, execution_id=self.execution_id)
+            return
+
+        flight, self._mine, self._leader = service._flights.join(
+            service._run_key(source, self.code, self.user_input, "stream"),
+            self.execution_id,
+            _Run(self.client, self.priority, steps=_StepLog()),
+        )
+        self._run = flight.state
+        if self._leader:
+            service._start_stream(flight, source, self.code, self.user_input)
+            if self._mine.done():
+                self.result = replace(
+                    self._mine.result(), execution_id=self.execution_id
+                )
+
+    @property
+    def rejected(self) -> bool:
+        """Whether the run was turned away because the queue was full."""
+        return (
+            self.result is not None
+            and self.result.status == ExecutionStatus.REJECTED
+        )
+
+    def __iter__(self) -> Iterator[str]:
+        self.start()
+        if self.result is not None:
+            return  # Syntax error, or turned away
+        service, mine, run, leader = self.service, self._mine, self._run, self._leader
+
+        try:
+            read = 0
+            while True:
+                batches, complete = run.steps.read(read, _STREAM_POLL_INTERVAL)
+                for batch in batches:
+                    self.total_steps += len(batch)
+                    yield from batch
+                read += len(batches)
+                if complete:
+                    break
+                # A finished run closes the log before publishing, so only
+                # a cancelled request can be done with steps still to come
+                if mine.done() and mine.result().status == ExecutionStatus.CANCELLED:
+                    break
+            self.result = replace(
+                mine.result(), execution_id=self.execution_id, coalesced=not leader
+            )
+        finally:
+            if self.result is None:
+                service.cancel(self.execution_id)  # Closed early
+
+
 # ------------------------------------------------------------------
 # Service class (fully synchronous for Flask)
 # ------------------------------------------------------------------
 
+def _worker_context() -> multiprocessing.context.BaseContext:
+    """The multiprocessing context for workers, per ``WORKER_START_METHOD``.
+
+    A forkserver imports the tracer and the modules user code may import
+    once; every worker is then forked with them in memory.
+    """
+    method = settings.WORKER_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        method = "spawn"
+    context = multiprocessing.get_context(method)
+    if method == "forkserver":
+        context.set_forkserver_preload(
+            [*_WORKER_PRELOAD, *settings.ALLOWED_MODULES]
+        )
+    return context
+
+
 class ExecutionService:
     """Main execution service with process isolation."""
 
     def __init__(self) -> None:
-        self.process_pool = ProcessPoolExecutor(
+        self.process_pool = WorkerPool(
             max_workers=settings.WORKERS,
-            mp_context=multiprocessing.get_context("spawn"),
+            preload=_WORKER_PRELOAD,
+            mp_context=_worker_context(),
+            max_queued=settings.MAX_QUEUED_EXECUTIONS,
+            max_queued_per_client=settings.MAX_QUEUED_PER_CLIENT,
+            weights=settings.SCHEDULER_WEIGHTS,
+        )
+        # Requests in flight by execution_id, coalesced by run key
+        self._flights: SingleFlight[ExecutionResult] = SingleFlight()
+        self.result_cache: ResultCache[ExecutionResult] = ResultCache(
+            settings.RESULT_CACHE_MAX_BYTES, settings.RESULT_CACHE_TTL
+        )
+        self.frontend = CodeFrontend(
+            settings.SOURCE_CACHE_MAX_BYTES, settings.SOURCE_CACHE_TTL
         )
 
     def execute(
@@ -122,77 +854,446 @@ class ExecutionService:
         code: str,
         user_input: str = "",
         session_id: Optional[str] = None,
+        trace_format: TraceFormat = TraceFormat.FULL,
+        encoded: bool = False,
+        execution_id: Optional[str] = None,
+        client: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+        traced: bool = True,
+        keep_trace: bool = False,
     ) -> ExecutionResult:
-        """Execute code with full trace collection (synchronous)."""
-        start_time = time.time()
+        """Execute code with full trace collection (synchronous).
 
-        # Quick syntax check before spawning a process
-        try:
-            compile(code, "<string>", "exec")
-        except SyntaxError as exc:
-            return ExecutionResult(
-                success=False,
-                trace_data=None,
-                stdout="",
-                stderr=None,
-                error=f"SyntaxError: {exc.msg} at line {exc.lineno}",
-                execution_time=time.time() - start_time,
-                status=ExecutionStatus.ERROR,
-            )
+        With ``trace_format=TraceFormat.DELTA`` the trace is returned in
+        :attr:`ExecutionResult.delta_trace` instead of ``trace_data``.
+        With ``encoded=True`` it is returned as JSON bytes in
+        :attr:`ExecutionResult.encoded_trace` instead of either, ready to
+        be written to a response; *keep_trace* adds the keyframed copy of
+        the trace that the session manager stores (``keyframed``), which
+        is otherwise not built.
 
-        try:
-            future = self.process_pool.submit(
+        The run can be stopped from another thread with
+        :meth:`cancel` and *execution_id* (one is generated if omitted).
+
+        A deterministic program (see :meth:`_run_key`) that is already
+        running with the same input and options is not started again:
+        the request waits for that run and gets its result with
+        ``coalesced=True``.  Encoded results of such programs are also
+        cached; a result served from the cache has ``cached=True``.
+
+        ``MAX_EXECUTION_TIME`` counts from when a worker takes the job;
+        the wait before that is reported as ``queue_time``.  Waiting jobs
+        are served fairly across clients: *client* names the caller
+        (its IP address, say) and *priority* its class.  If
+        ``MAX_QUEUED_EXECUTIONS`` runs, or ``MAX_QUEUED_PER_CLIENT`` of
+        *client*'s, are already waiting the result has status
+        ``REJECTED`` and nothing is run.
+
+        With ``traced=False`` the program runs in the same sandbox but
+        without a trace hook (see :func:`_execute_untraced`): the result
+        has only its output, and an exception raised by the program
+        fails it.  Such runs are bounded by ``MAX_EXECUTION_TIME`` of
+        wall time and ``MAX_OUTPUT_LENGTH`` of output, not ``MAX_STEPS``.
+        """
+        return self.submit(
+            code,
+            user_input,
+            trace_format=trace_format,
+            encoded=encoded,
+            execution_id=execution_id,
+            client=client,
+            priority=priority,
+            traced=traced,
+            keep_trace=keep_trace,
+        ).result()
+
+    def submit(
+        self,
+        code: str,
+        user_input: str = "",
+        trace_format: TraceFormat = TraceFormat.FULL,
+        encoded: bool = False,
+        execution_id: Optional[str] = None,
+        client: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+        traced: bool = True,
+        keep_trace: bool = False,
+    ) -> "Future[ExecutionResult]":
+        """Start a run like :meth:`execute` does, without waiting for it.
+
+        The future is resolved with what :meth:`execute` would return;
+        meanwhile :meth:`run_status` tells whether the run has started.
+        """
+        return self._submit(
+            self.frontend.prepare(code), code, user_input, trace_format,
+            encoded, execution_id, client, priority, traced, keep_trace,
+        )
+
+    def _submit(
+        self,
+        source: PreparedSource,
+        code: str,
+        user_input: str,
+        trace_format: TraceFormat,
+        encoded: bool,
+        execution_id: Optional[str],
+        client: str,
+        priority: Priority,
+        traced: bool = True,
+        keep_trace: bool = False,
+    ) -> "Future[ExecutionResult]":
+        execution_id = execution_id or str(uuid.uuid4())
+        error = _unrunnable(source)
+        if error is not None:
+            return _resolved(replace(error, execution_id=execution_id))
+
+        keep_trace = encoded and keep_trace
+        options = (
+            (trace_format.value, encoded, keep_trace) if traced else ("untraced",)
+        )
+        key = self._run_key(source, code, user_input, *options)
+
+        # Untraced results are only output, so they are cached as they are
+        cache = (encoded or not traced) and self.result_cache.enabled
+        if cache:
+            if key is None:
+                self.result_cache.bypass()
+            else:
+                hit = self.result_cache.get(key)
+                if hit is not None:
+                    return _resolved(replace(
+                        hit, execution_id=execution_id, cached=True, queue_time=0.0
+                    ))
+
+        if traced:
+            run = _Run(client, priority)
+        else:
+            # The worker times the program out itself, keeping the worker
+            run = _Run(client, priority, slack=1.0)
+        flight, mine, leader = self._flights.join(key, execution_id, run)
+        if leader and traced:
+            self._start_run(
+                flight,
+                key if cache else None,
                 _execute_in_subprocess,
                 code,
+                source.bytecode,
                 user_input,
                 settings.MAX_STEPS,
+                trace_format,
+                encoded=encoded,
+                keep_trace=keep_trace,
+            )
+        elif leader:
+            self._start_run(
+                flight,
+                key if cache else None,
+                _execute_untraced,
+                source.bytecode,
+                user_input,
+                float(settings.MAX_EXECUTION_TIME),
             )
-            result = future.result(timeout=settings.MAX_EXECUTION_TIME)
-            execution_time = time.time() - start_time
-
-            if result["status"] == ExecutionStatus.SECURITY_VIOLATION:
-                return ExecutionResult(
-                    success=False,
-                    trace_data=None,
-                    stdout="",
-                    stderr=None,
-                    error=result["error"],
-                    execution_time=execution_time,
-                    status=ExecutionStatus.SECURITY_VIOLATION,
+        future: "Future[ExecutionResult]" = Future()
+        mine.add_done_callback(lambda done: future.set_result(replace(
+            done.result(), execution_id=execution_id, coalesced=not leader
+        )))
+        return future
+
+    def run_test_cases(
+        self,
+        code: str,
+        cases: Sequence[TestCase],
+        trace: bool = False,
+        execution_id: Optional[str] = None,
+        client: str = "",
+        priority: Priority = Priority.BATCH,
+    ) -> ExecutionResult:
+        """Run *code* once per test case, all in one worker job.
+
+        The program is prepared once and the cases run back
+        to back, each with ``TEST_CASE_TIME_LIMIT`` seconds of wall time.
+        Without *trace* they run untraced, at close to native speed.  The
+        result has a :class:`TestCaseResult` per case in ``test_cases``,
+        with ``passed`` set for cases that have an expected output (see
+        :func:`_same_output`); its ``stdout`` is empty.  The run can be
+        cancelled by *execution_id* as usual and is never coalesced or
+        cached.  Unlike other runs, the program may call ``input()``:
+        it reads the lines of its case's ``user_input``, which are not
+        echoed into ``stdout``.
+        """
+        execution_id = execution_id or str(uuid.uuid4())
+        source = self.frontend.prepare(code, allow_input=True)
+        error = _unrunnable(source)
+        if error is not None:
+            return replace(error, execution_id=execution_id)
+
+        limit = settings.TEST_CASE_TIME_LIMIT
+        flight, mine, _ = self._flights.join(
+            None,
+            execution_id,
+            _Run(client, priority, time_limit=limit * len(cases), slack=1.0),
+        )
+        self._start_run(
+            flight,
+            None,
+            _run_test_cases,
+            code,
+            source.bytecode,
+            [case.user_input for case in cases],
+            trace,
+            limit,
+        )
+        result = replace(mine.result(), execution_id=execution_id)
+        for case, outcome in zip(cases, result.test_cases or ()):
+            if case.expected_output is not None:
+                outcome.passed = (
+                    outcome.status == ExecutionStatus.COMPLETED
+                    and _same_output(outcome.stdout, case.expected_output)
                 )
+        return result
+
+    def run_status(self, execution_id: str) -> Optional[ExecutionStatus]:
+        """``QUEUED`` or ``RUNNING`` for a run in flight, else ``None``."""
+        flight = self._flights.waiting_on(execution_id)
+        if flight is None:
+            return None
+        future = flight.state.future
+        if future is None or future.started is None:
+            return ExecutionStatus.QUEUED
+        return ExecutionStatus.RUNNING
 
-            return ExecutionResult(
-                success=result["success"],
-                trace_data=result.get("trace"),
-                stdout=result.get("stdout", ""),
-                stderr=result.get("stderr"),
-                error=result.get("error"),
-                execution_time=execution_time,
-                status=result["status"],
+    def _run_key(
+        self, source: PreparedSource, code: str, user_input: str, *options: Any
+    ) -> Optional[str]:
+        """Key of a run's result, or ``None`` if its result must not be reused.
+
+        The key covers the code (with line endings normalized), the input,
+        *options* and every setting or version that shapes a trace.
+        Programs importing nondeterministic modules have no key.
+        """
+        if not source.deterministic:
+            return None
+        return cache_key(
+            code.replace("\r\n", "\n"),
+            user_input,
+            *options,
+            TRACER_VERSION,
+            settings.VERSION,
+            settings.MAX_STEPS,
+            settings.TRACE_BACKEND,
+            sorted(settings.REPR_LIMITS.items()),
+            settings.TRACE_KEYFRAME_INTERVAL,
+        )
+
+    # ---- worker runs ----
+
+    def _start_run(
+        self,
+        flight: Flight[ExecutionResult],
+        cache_key: Optional[str],
+        fn: Callable[..., Dict[str, Any]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> None:
+        """Submit ``fn(*args, **kwargs)`` for *flight*; publish its result.
+
+        The result is stored in the cache under *cache_key* (if any)
+        before it is published, so a request arriving just after the
+        run finishes finds it there.
+        """
+        run: _Run = flight.state
+        try:
+            run.future = self.process_pool.submit_for(
+                run.client, run.priority, fn, *args, **kwargs
             )
+        except PoolSaturated:
+            self._flights.publish(flight, _rejected())
+            return
+        except Exception as exc:
+            logger.exception("Execution failed")
+            self._flights.publish(flight, _failure(f"Execution error: {exc}", 0.0))
+            return
+        threading.Thread(
+            target=self._await_run,
+            args=(flight, cache_key),
+            name="execution-run",
+            daemon=True,
+        ).start()
+        if flight.abandoned:
+            self._stop(run)  # Cancelled before the job was submitted
+
+    def _await_run(
+        self, flight: Flight[ExecutionResult], cache_key: Optional[str]
+    ) -> None:
+        run: _Run = flight.state
+        future = run.future
+        try:
+            if not _wait_started(future):
+                result = _queue_timeout()
+            else:
+                result = _from_worker(
+                    future.result(
+                        timeout=max(run.deadline() - time.monotonic(), 0)
+                    ),
+                    run.running_time(),
+                )
 
         except FuturesTimeoutError:
-            return ExecutionResult(
-                success=False,
-                trace_data=None,
-                stdout="",
-                stderr=None,
-                error=f"Execution timed out after {settings.MAX_EXECUTION_TIME}s",
-                execution_time=float(settings.MAX_EXECUTION_TIME),
-                status=ExecutionStatus.TIMEOUT,
-            )
+            # Free the worker slot; a result that still slips through is dropped
+            self.process_pool.cancel(future, settings.CANCEL_GRACE_PERIOD)
+            future.add_done_callback(_discard_late_result)
+            result = _timeout(run.time_limit)
+
+        except (CancelledError, WorkerKilled):
+            result = _cancelled(run.running_time())
 
         except Exception as exc:
             logger.exception("Execution failed")
-            return ExecutionResult(
-                success=False,
-                trace_data=None,
-                stdout="",
-                stderr=None,
-                error=f"Execution error: {exc}",
-                execution_time=time.time() - start_time,
-                status=ExecutionStatus.ERROR,
+            result = _failure(f"Execution error: {exc}", run.running_time())
+
+        result.queue_time = future.queue_time
+        if cache_key is not None and _cacheable(result):
+            self.result_cache.put(cache_key, result, result.size)
+        self._flights.publish(flight, result)
+
+    def _start_stream(
+        self,
+        flight: Flight[ExecutionResult],
+        source: PreparedSource,
+        code: str,
+        user_input: str,
+    ) -> None:
+        """Submit the streamed job for *flight* and collect its steps."""
+        run: _Run = flight.state
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        try:
+            run.future = self.process_pool.submit_for(
+                run.client,
+                run.priority,
+                _execute_in_subprocess,
+                code,
+                source.bytecode,
+                user_input,
+                settings.MAX_STEPS,
+                TraceFormat.FULL,
+                sender,
             )
+        except Exception as exc:
+            receiver.close()
+            sender.close()
+            run.steps.close()
+            if isinstance(exc, PoolSaturated):
+                self._flights.publish(flight, _rejected())
+            else:
+                logger.exception("Streaming execution failed")
+                self._flights.publish(
+                    flight, _failure(f"Execution error: {exc}", 0.0)
+                )
+            return
+        # The task pickles *sender* lazily; keep it open until the task ends
+        run.future.add_done_callback(lambda _: sender.close())
+        threading.Thread(
+            target=self._pump_stream,
+            args=(flight, receiver),
+            name="execution-stream",
+            daemon=True,
+        ).start()
+        if flight.abandoned:
+            self._stop(run)  # Cancelled before the job was submitted
+
+    def _pump_stream(
+        self, flight: Flight[ExecutionResult], receiver: Connection
+    ) -> None:
+        """Move steps from the worker into the run's log, then publish."""
+        run: _Run = flight.state
+        future = run.future
+        result: Optional[ExecutionResult] = None
+        try:
+            if not _wait_started(future):
+                result = _queue_timeout()
+            deadline = run.deadline()
+            while result is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    result = _timeout()
+                    break
+                if not receiver.poll(min(remaining, _STREAM_POLL_INTERVAL)):
+                    if future.done():
+                        break  # Worker ended without closing the stream
+                    continue
+                try:
+                    batch = receiver.recv()
+                except EOFError:
+                    break  # Worker killed
+                if batch is None:
+                    break
+                run.steps.append(batch)
+
+            if result is None:
+                result = _from_worker(
+                    future.result(timeout=max(deadline - time.monotonic(), 0)),
+                    run.running_time(),
+                )
+
+        except FuturesTimeoutError:
+            result = _timeout()
+
+        except (CancelledError, WorkerKilled):
+            result = _cancelled(run.running_time())
+
+        except Exception as exc:
+            logger.exception("Streaming execution failed")
+            result = _failure(f"Execution error: {exc}", run.running_time())
+
+        finally:
+            if not future.done():
+                self.process_pool.cancel(future, settings.CANCEL_GRACE_PERIOD)
+            receiver.close()
+            run.steps.close()
+        result.queue_time = future.queue_time
+        self._flights.publish(flight, result)
+
+    def _stop(self, run: _Run) -> None:
+        if run.future is not None:
+            self.process_pool.cancel(run.future, settings.CANCEL_GRACE_PERIOD)
+
+    # ---- cancellation ----
+
+    def cancel(self, execution_id: str) -> bool:
+        """Stop the request registered as *execution_id*.
+
+        The request ends with a cancelled result at once.  Its run is
+        stopped once no coalesced request waits for it any more: the
+        program is stopped at its next step if it gets there within
+        ``settings.CANCEL_GRACE_PERIOD``; otherwise its worker is killed.
+        Returns ``False`` if no such request is in flight.
+        """
+        flight = self._flights.waiting_on(execution_id)
+        if flight is None:
+            return False
+        flight, last = self._flights.leave(
+            execution_id, _cancelled(flight.state.running_time())
+        )
+        if flight is None:
+            return False  # Finished meanwhile
+        if last:
+            self._stop(flight.state)
+        return True
+
+    def execute_stream(
+        self,
+        code: str,
+        user_input: str = "",
+        execution_id: Optional[str] = None,
+        client: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> ExecutionStream:
+        """Start streaming the steps of *code*; see :class:`ExecutionStream`."""
+        stream = ExecutionStream(
+            self, code, user_input, execution_id, client, priority
+        )
+        stream.start()
+        return stream
 
     def execute_streaming(
         self,
@@ -200,20 +1301,23 @@ class ExecutionService:
         user_input: str,
         callback: Callable[[Dict[str, Any]], Any],
     ) -> ExecutionResult:
-        """Execute with streaming step updates via *callback*."""
-        result = self.execute(code, user_input)
-
-        if result.trace_data:
-            for i, step in enumerate(result.trace_data.steps):
-                callback(
-                    {
-                        "type": "step",
-                        "step_number": i + 1,
-                        "total_steps": len(result.trace_data.steps),
-                        "data": step.model_dump(),
-                    }
-                )
+        """Execute with streaming step updates via *callback*.
 
+        Steps are delivered while the program runs, so ``total_steps`` is
+        ``None`` until the final ``"complete"`` message.
+        """
+        stream = self.execute_stream(code, user_input)
+        for i, step in enumerate(stream):
+            callback(
+                {
+                    "type": "step",
+                    "step_number": i + 1,
+                    "total_steps": None,
+                    "data": json.loads(step),
+                }
+            )
+
+        result = stream.result
         callback(
             {
                 "type": "complete",
@@ -221,11 +1325,85 @@ class ExecutionService:
                 "stdout": result.stdout,
                 "error": result.error,
                 "execution_time": result.execution_time,
+                "total_steps": stream.total_steps,
             }
         )
 
         return result
 
+    def execute_batch(
+        self,
+        programs: Sequence[Tuple[str, str, TraceFormat, Optional[str]]],
+        concurrency: int,
+        client: str = "",
+    ) -> Iterator[Tuple[int, ExecutionResult]]:
+        """Run *programs* in parallel, yielding ``(index, result)`` as each ends.
+
+        Each program is ``(code, user_input, trace_format, execution_id)``
+        and is run like :meth:`submit` with ``encoded=True`` at
+        ``BATCH`` priority, at most *concurrency* at a time.  A source
+        that appears more than once is checked once; identical programs
+        share a run or a cached result as usual.  A run turned away
+        because the queue is full is retried after
+        ``_BATCH_RETRY_INTERVAL``, so the batch never ends ``REJECTED``.
+
+        Closing the iterator early cancels the runs still in flight.
+        """
+        sources: Dict[str, PreparedSource] = {}
+        pending: Deque[int] = deque(range(len(programs)))
+        running: Dict["Future[ExecutionResult]", Tuple[int, str]] = {}
+        retry_at = 0.0
+        try:
+            while pending or running:
+                if time.monotonic() >= retry_at:
+                    while pending and len(running) < concurrency:
+                        index = pending.popleft()
+                        code, user_input, trace_format, execution_id = programs[index]
+                        source = sources.get(code)
+                        if source is None:
+                            source = sources[code] = self.frontend.prepare(code)
+                        execution_id = execution_id or str(uuid.uuid4())
+                        future = self._submit(
+                            source, code, user_input, trace_format, True,
+                            execution_id, client, Priority.BATCH,
+                        )
+                        running[future] = (index, execution_id)
+
+                if not running:
+                    time.sleep(max(retry_at - time.monotonic(), 0))
+                    continue
+                timeout = None
+                if pending and len(running) < concurrency:
+                    timeout = max(retry_at - time.monotonic(), 0)
+                done, _ = wait(running, timeout, FIRST_COMPLETED)
+                for future in done:
+                    index, _ = running.pop(future)
+                    result = future.result()
+                    if result.status == ExecutionStatus.REJECTED:
+                        pending.appendleft(index)
+                        retry_at = time.monotonic() + _BATCH_RETRY_INTERVAL
+                        continue
+                    yield index, result
+        finally:
+            for _, execution_id in running.values():
+                self.cancel(execution_id)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Worker pool health counters; see :meth:`WorkerPool.stats`."""
+        return self.process_pool.stats()
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Result cache size, hit ratio and bytes saved."""
+        return self.result_cache.stats()
+
+    def source_cache_stats(self) -> Dict[str, Any]:
+        """How often a program was already parsed, validated and compiled."""
+        return self.frontend.stats()
+
+    def coalescing_stats(self) -> Dict[str, Any]:
+        """Requests in flight and how many joined an identical run."""
+        return self._flights.stats()
+
     def shutdown(self) -> None:
         self.process_pool.shutdown(wait=True)
 
@@ -0,0 +1,204 @@
+"""Background execution jobs for clients that poll for their results.
+
+A job is submitted to the execution service without waiting for it, so
+the submitting request returns at once; the client then polls the job
+until it is ``COMPLETED``.  Finished jobs are kept within a memory
+budget (oldest dropped first) for ``JOB_RESULT_TTL`` seconds, and a
+background thread sweeps out the expired ones.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.models.execution import ExecutionMetadata, ExecutionStatus
+from app.models.trace import TraceFormat
+from app.services.executor import (
+    ExecutionResult,
+    ExecutionService,
+    execution_service,
+)
+from app.services.result_cache import ResultCache
+from app.services.session_manager import session_manager
+from app.utils.logger import get_logger
+from app.workers.scheduler import Priority
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class Job:
+    job_id: str
+    execution_id: str
+    session_id: str  # the trace is stored under it for step access
+    trace_format: TraceFormat
+    submitted_at: float
+    metadata: Optional[ExecutionMetadata] = None
+    result: Optional[ExecutionResult] = None
+    finished_at: Optional[float] = None
+    keep: bool = True  # False once deleted while still running
+
+
+def _too_large(result: ExecutionResult) -> ExecutionResult:
+    """What a job keeps of a result that does not fit its memory budget."""
+    return replace(
+        result,
+        success=False,
+        trace_data=None,
+        stdout="",
+        stderr=None,
+        error=(
+            f"Execution result too large to keep ({result.size} bytes, "
+            f"limit {settings.JOB_RESULTS_MAX_BYTES})"
+        ),
+        status=ExecutionStatus.ERROR,
+        delta_trace=None,
+        encoded_trace=None,
+        test_cases=None,
+    )
+
+
+class JobManager:
+    """Runs executions in the background and keeps their results."""
+
+    def __init__(self, service: ExecutionService) -> None:
+        self.service = service
+        self._pending: Dict[str, Job] = {}
+        self._finished: ResultCache[Job] = ResultCache(
+            settings.JOB_RESULTS_MAX_BYTES, settings.JOB_RESULT_TTL
+        )
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._closed = threading.Event()
+
+    def submit(
+        self,
+        code: str,
+        user_input: str = "",
+        trace_format: TraceFormat = TraceFormat.FULL,
+        client: str = "",
+        priority: Priority = Priority.INTERACTIVE,
+        session_id: Optional[str] = None,
+        metadata: Optional[ExecutionMetadata] = None,
+    ) -> Job:
+        """Start running *code* and return its job straight away.
+
+        The job already has a result if nothing had to be run (a cache
+        hit, a syntax error, or a full queue: status ``REJECTED``).
+        Rejected jobs are not kept.
+        """
+        self._start_sweeper()
+        job = Job(
+            job_id=str(uuid.uuid4()),
+            execution_id=str(uuid.uuid4()),
+            session_id=session_id or str(uuid.uuid4()),
+            trace_format=trace_format,
+            submitted_at=time.time(),
+            metadata=metadata,
+        )
+        with self._lock:
+            self._pending[job.job_id] = job
+        future = self.service.submit(
+            code,
+            user_input,
+            trace_format=trace_format,
+            encoded=True,
+            execution_id=job.execution_id,
+            client=client,
+            priority=priority,
+            keep_trace=True,
+        )
+        future.add_done_callback(lambda done: self._finish(job, done))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._pending.get(job_id)
+        return job if job is not None else self._finished.get(job_id)
+
+    def status(self, job: Job) -> ExecutionStatus:
+        """``QUEUED``, ``RUNNING`` or, once it has a result, ``COMPLETED``.
+
+        The outcome of the program itself is the result's status.
+        """
+        if job.result is not None:
+            return ExecutionStatus.COMPLETED
+        return self.service.run_status(job.execution_id) or ExecutionStatus.RUNNING
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job that is still queued or running."""
+        with self._lock:
+            job = self._pending.get(job_id)
+        return job is not None and self.service.cancel(job.execution_id)
+
+    def delete(self, job_id: str) -> bool:
+        """Forget a job, cancelling it first if it has not finished."""
+        with self._lock:
+            job = self._pending.get(job_id)
+            if job is not None:
+                job.keep = False
+        if job is not None:
+            self.service.cancel(job.execution_id)
+            return True
+        return self._finished.pop(job_id) is not None
+
+    def _finish(self, job: Job, future: "Future[ExecutionResult]") -> None:
+        result = future.result()
+        keep = job.keep and result.status != ExecutionStatus.REJECTED
+        if keep:
+            encoded_trace = result.encoded_trace
+            if encoded_trace is not None and encoded_trace.keyframed is not None:
+                session_manager.store_trace(
+                    job.session_id, encoded_trace.keyframed
+                )
+            if result.size > self._finished.max_bytes:
+                logger.warning(
+                    f"Job {job.job_id} result ({result.size} bytes) exceeds "
+                    "JOB_RESULTS_MAX_BYTES; keeping an error in its place"
+                )
+                result = _too_large(result)
+        job.result = result
+        job.finished_at = time.time()
+        if keep:
+            # Stored before it stops being pending, so a poll always finds it
+            self._finished.put(job.job_id, job, result.size)
+        with self._lock:
+            self._pending.pop(job.job_id, None)
+            if not job.keep:
+                self._finished.pop(job.job_id)  # Deleted meanwhile
+
+    # ---- expiry ----
+
+    def _start_sweeper(self) -> None:
+        if self._sweeper is not None:
+            return
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(
+                    target=self._sweep, name="job-sweeper", daemon=True
+                )
+                self._sweeper.start()
+
+    def _sweep(self) -> None:
+        while not self._closed.wait(settings.JOB_SWEEP_INTERVAL):
+            expired = self._finished.sweep()
+            if expired:
+                logger.info(f"Dropped {expired} expired job results")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "finished": self._finished.stats()}
+
+    def shutdown(self) -> None:
+        self._closed.set()
+
+
+# Global singleton
+job_manager = JobManager(execution_service)
@@ -0,0 +1,140 @@
+"""Content-addressed cache of execution results.
+
+Entries are keyed by a SHA-256 over everything that determines a trace
+(see :func:`cache_key`), evicted least-recently-used first once their
+total size exceeds a byte budget, and dropped after a TTL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+def cache_key(*parts: Hashable) -> str:
+    """SHA-256 over *parts*, each length-prefixed so they cannot run together."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = str(part).encode("utf-8", "surrogatepass")
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+@dataclass
+class _Entry(Generic[V]):
+    value: V
+    size: int
+    expires: float
+
+
+class ResultCache(Generic[V]):
+    """Thread-safe LRU cache with a byte budget and a TTL.
+
+    The caller states each value's size when storing it; values larger
+    than the whole budget are not stored.  A *max_bytes* of 0 disables
+    the cache.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float) -> None:
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _Entry[V]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "bytes_saved": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                self._counters["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            self._counters["bytes_saved"] += entry.size
+            return entry.value
+
+    def put(self, key: str, value: V, size: int) -> None:
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, size, time.monotonic() + self.ttl)
+            self._bytes += size
+            self._counters["stores"] += 1
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters["evictions"] += 1
+
+    def pop(self, key: str) -> Optional[V]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            value = self._entries[key].value
+            self._remove(key)
+            return value
+
+    def sweep(self) -> int:
+        """Drop every expired entry; returns how many were dropped."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                key for key, entry in self._entries.items() if entry.expires <= now
+            ]
+            for key in expired:
+                self._remove(key)
+            self._counters["expirations"] += len(expired)
+        return len(expired)
+
+    def bypass(self) -> None:
+        """Count a lookup skipped because the result must not be cached."""
+        with self._lock:
+            self._counters["bypassed"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            entries, used = len(self._entries), self._bytes
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "entries": entries,
+            "bytes": used,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            **counters,
+            "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else None,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -3,7 +3,9 @@
 import ast
 import builtins
 import re
-from typing import Any, Dict, List, Optional, Tuple
+import string
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
 
 from app.config import settings
 from app.utils.logger import get_logger
@@ -15,6 +17,29 @@ class SecurityError(Exception):
     """Security violation detected."""
 
 
+# Every character re.IGNORECASE matches to a lowercase ASCII letter, mapped
+# to that letter: ASCII capitals and four non-ASCII look-alikes
+_FOLD_TO_ASCII = {
+    **{ord(letter.upper()): letter for letter in string.ascii_lowercase},
+    0x130: "i",  # LATIN CAPITAL LETTER I WITH DOT ABOVE
+    0x131: "i",  # LATIN SMALL LETTER DOTLESS I
+    0x17F: "s",  # LATIN SMALL LETTER LONG S
+    0x212A: "k",  # KELVIN SIGN
+}
+
+
+def _fold_case(code: str) -> str:
+    """*code* with the letters above folded, one character for one.
+
+    The patterns are lowercase ASCII, so a case-sensitive match on the
+    result is exactly a case-insensitive match on *code*.  ``casefold``
+    would not do: it turns "ß" into "ss" and leaves "ı" alone.
+    """
+    if code.isascii():
+        return code.lower()
+    return code.translate(_FOLD_TO_ASCII)
+
+
 class SandboxSecurity:
     """Multi-layer security sandbox for Python code execution."""
 
@@ -55,19 +80,43 @@ class SandboxSecurity:
     # Dangerous builtin functions
     DANGEROUS_BUILTINS = {"eval", "exec", "compile", "__import__", "open", "input"}
 
+    # Of those, the ones a run may allow: ``input`` only reads the lines
+    # the request itself supplied
+    INPUT_BUILTINS = frozenset({"input"})
+
+    # The patterns are matched case-sensitively against the source with
+    # its letters folded to lowercase ASCII (see _fold_case), which lets
+    # the regex engine scan for their literal parts instead of comparing
+    # every character case-insensitively: one pass of the combined
+    # pattern finds whether any matches, and only then are they tried
+    # one by one for the message
+    _PATTERN_SCAN: Pattern[str] = re.compile(
+        "|".join(f"(?:{pattern})" for pattern, _ in DANGEROUS_PATTERNS)
+    )
+    _COMPILED_PATTERNS: List[Tuple[Pattern[str], str]] = [
+        (re.compile(pattern), message) for pattern, message in DANGEROUS_PATTERNS
+    ]
+
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
 
     @classmethod
-    def validate_code(cls, code: str) -> Tuple[bool, Optional[str]]:
+    def validate_code(
+        cls,
+        code: str,
+        tree: Optional[ast.Module] = None,
+        allow_input: bool = False,
+    ) -> Tuple[bool, Optional[str]]:
         """Validate code for security violations.
 
-        Returns ``(is_valid, error_message)``.
+        *tree*, if given, is *code* already parsed; it is not parsed again.
+        With *allow_input* the program may call ``input()``, for runs that
+        feed it input of their own.  Returns ``(is_valid, error_message)``.
         """
         try:
             cls._check_patterns(code)
-            cls._check_ast(code)
+            cls._check_ast(code, tree, allow_input)
             cls._check_structure(code)
             return True, None
         except SecurityError as exc:
@@ -103,51 +152,23 @@ class SandboxSecurity:
 
     @classmethod
     def _check_patterns(cls, code: str) -> None:
-        for pattern, message in cls.DANGEROUS_PATTERNS:
-            if re.search(pattern, code, re.IGNORECASE):
+        folded = _fold_case(code)
+        if cls._PATTERN_SCAN.search(folded) is None:
+            return
+        for pattern, message in cls._COMPILED_PATTERNS:
+            if pattern.search(folded):
                 raise SecurityError(message)
 
     @classmethod
-    def _check_ast(cls, code: str) -> None:
-        try:
+    def _check_ast(
+        cls,
+        code: str,
+        tree: Optional[ast.Module] = None,
+        allow_input: bool = False,
+    ) -> None:
+        if tree is None:
             tree = ast.parse(code)
-        except SyntaxError:
-            raise
-
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    root_module = alias.name.split(".")[0]
-                    if root_module in settings.BLOCKED_MODULES:
-                        raise SecurityError(
-                            f"Import of '{alias.name}' is not allowed"
-                        )
-                    if (
-                        root_module not in settings.ALLOWED_MODULES
-                        and root_module not in settings.ALLOWED_BUILTINS
-                    ):
-                        logger.warning(f"Suspicious import: {alias.name}")
-
-            elif isinstance(node, ast.ImportFrom):
-                module = node.module or ""
-                root_module = module.split(".")[0]
-                if root_module in settings.BLOCKED_MODULES:
-                    raise SecurityError(
-                        f"Import from '{module}' is not allowed"
-                    )
-
-            elif isinstance(node, ast.Attribute):
-                if node.attr in cls.DANGEROUS_ATTRIBUTES:
-                    raise SecurityError(
-                        f"Access to '{node.attr}' is not allowed"
-                    )
-
-            elif isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Name):
-                    if node.func.id in cls.DANGEROUS_BUILTINS:
-                        raise SecurityError(
-                            f"Function '{node.func.id}' is not allowed"
-                        )
+        _SecurityVisitor(cls, allow_input).visit(tree)
 
     @classmethod
     def _check_structure(cls, code: str) -> None:
@@ -188,3 +209,71 @@ class SandboxSecurity:
     @staticmethod
     def _safe_open(*args: Any, **kwargs: Any) -> None:
         raise SecurityError("File operations are not allowed")
+
+
+class _SecurityVisitor(ast.NodeVisitor):
+    """The AST checks of :class:`SandboxSecurity`, in one pass over the tree.
+
+    Nodes are visited in :func:`ast.walk` order, each dispatched by its
+    type to the ``visit_*`` method for it (if any) through a table built
+    once per class rather than a method lookup per node; the walk itself
+    is inlined, as it dominates the cost of a check.
+    """
+
+    # Node type -> visit_* method; filled in below the class
+    _dispatch: Dict[type, Callable[["_SecurityVisitor", Any], None]] = {}
+
+    def __init__(self, sandbox: type, allow_input: bool = False) -> None:
+        self.dangerous_attributes = sandbox.DANGEROUS_ATTRIBUTES
+        self.dangerous_builtins = sandbox.DANGEROUS_BUILTINS
+        if allow_input:
+            self.dangerous_builtins = self.dangerous_builtins - sandbox.INPUT_BUILTINS
+
+    def visit(self, node: ast.AST) -> None:
+        dispatch = self._dispatch.get
+        todo = deque([node])
+        while todo:
+            node = todo.popleft()
+            check = dispatch(type(node))
+            if check is not None:
+                check(self, node)
+            for name in node._fields:
+                value = getattr(node, name, None)
+                if isinstance(value, list):
+                    todo.extend(item for item in value if isinstance(item, ast.AST))
+                elif isinstance(value, ast.AST):
+                    todo.append(value)
+
+    def visit_Import(self, node: ast.Import) -> None:
+        for alias in node.names:
+            root_module = alias.name.split(".")[0]
+            if root_module in settings.BLOCKED_MODULES:
+                raise SecurityError(f"Import of '{alias.name}' is not allowed")
+            if (
+                root_module not in settings.ALLOWED_MODULES
+                and root_module not in settings.ALLOWED_BUILTINS
+            ):
+                logger.warning(f"Suspicious import: {alias.name}")
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        module = node.module or ""
+        if module.split(".")[0] in settings.BLOCKED_MODULES:
+            raise SecurityError(f"Import from '{module}' is not allowed")
+
+    def visit_Attribute(self, node: ast.Attribute) -> None:
+        if node.attr in self.dangerous_attributes:
+            raise SecurityError(f"Access to '{node.attr}' is not allowed")
+
+    def visit_Call(self, node: ast.Call) -> None:
+        if (
+            isinstance(node.func, ast.Name)
+            and node.func.id in self.dangerous_builtins
+        ):
+            raise SecurityError(f"Function '{node.func.id}' is not allowed")
+
+
+_SecurityVisitor._dispatch = {
+    getattr(ast, name[len("visit_"):]): method
+    for name, method in vars(_SecurityVisitor).items()
+    if name.startswith("visit_")
+}
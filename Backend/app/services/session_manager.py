@@ -2,21 +2,38 @@
 
 from __future__ import annotations
 
+import threading
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Union
 
+from app.config import settings
+from app.core.trace_delta import iter_range
 from app.models.execution import ExecutionSession, ExecutionStatus
+from app.models.trace import DeltaTraceData, ExecutionStep
+from app.services.result_cache import ResultCache
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Memory a parsed trace takes per byte of its JSON (about 8x measured)
+_PARSED_SIZE_FACTOR = 8
+
 
 class SessionManager:
     """Manages execution sessions in memory."""
 
     def __init__(self):
         self._sessions: Dict[str, ExecutionSession] = {}
+        # session_id -> keyframed trace JSON
+        self._traces: ResultCache[bytes] = ResultCache(
+            settings.TRACE_STORE_MAX_BYTES, settings.TRACE_STORE_TTL
+        )
+        # session_id -> the same trace parsed, for the traces being read
+        self._parsed: ResultCache[DeltaTraceData] = ResultCache(
+            settings.PARSED_TRACES_MAX_BYTES, settings.TRACE_STORE_TTL
+        )
+        self._traces_lock = threading.Lock()
 
     # ------------------------------------------------------------------
     # Create
@@ -119,6 +136,51 @@ class SessionManager:
         docs = query.stream()
         return [ExecutionSession(**d.to_dict()) for d in docs]
 
+    # ------------------------------------------------------------------
+    # Trace step access (keyframe-indexed)
+    # ------------------------------------------------------------------
+
+    def store_trace(
+        self, session_id: str, trace: Union[DeltaTraceData, bytes]
+    ) -> None:
+        """Keep *trace* for step-level access, evicting the oldest traces.
+
+        *trace* is kept as ``DeltaTraceData`` JSON and parsed on first read.
+        """
+        if isinstance(trace, DeltaTraceData):
+            trace = trace.model_dump_json().encode()
+        with self._traces_lock:
+            self._parsed.pop(session_id)
+            self._traces.put(session_id, trace, len(trace))
+
+    def get_trace(self, session_id: str) -> Optional[DeltaTraceData]:
+        with self._traces_lock:
+            trace = self._parsed.get(session_id)
+            if trace is None:
+                data = self._traces.get(session_id)
+                if data is None:
+                    return None
+                trace = DeltaTraceData.model_validate_json(data)
+                self._parsed.put(
+                    session_id, trace, len(data) * _PARSED_SIZE_FACTOR
+                )
+            return trace
+
+    def trace_stats(self) -> Dict[str, Any]:
+        return {"stored": self._traces.stats(), "parsed": self._parsed.stats()}
+
+    def get_steps(
+        self, session_id: str, start: int, count: int = 1
+    ) -> Optional[List[ExecutionStep]]:
+        """Return full steps ``start..start+count-1`` of a stored trace.
+
+        Returns ``None`` when the session has no stored trace.
+        """
+        trace = self.get_trace(session_id)
+        if trace is None:
+            return None
+        return list(iter_range(trace, start, start + count))
+
 
 # Global singleton
 session_manager = SessionManager()
@@ -0,0 +1,121 @@
+"""Coalescing of identical requests that are in flight at the same time.
+
+The first caller for a key leads: it starts the work and later publishes
+its result.  Callers arriving with the same key before that join the
+same :class:`Flight` and receive the published result instead of
+starting the work again.  A caller can leave early; the work is only
+worth stopping once every caller has left.
+"""
+
+from __future__ import annotations
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, Generic, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class Flight(Generic[V]):
+    """One piece of work shared by every caller that asked for its key.
+
+    *state* is whatever the leader needs to track the work; it is set
+    when the flight is created so joiners can use it straight away.
+    """
+
+    def __init__(self, key: Optional[str], state: Any) -> None:
+        self.key = key
+        self.state = state
+        self.waiters: Dict[str, "Future[V]"] = {}
+        self.published = False
+        # Every caller left before the result was published
+        self.abandoned = False
+
+
+class SingleFlight(Generic[V]):
+    """Registry of flights by key, and of the callers waiting on them.
+
+    Callers are identified by a unique waiter id, so a caller can leave
+    its flight from another thread (see :meth:`leave`).  Flights with a
+    ``None`` key are private: nobody else can join them, but their
+    caller can still leave.
+    """
+
+    def __init__(self) -> None:
+        self._flights: Dict[str, Flight[V]] = {}
+        self._waiting: Dict[str, Flight[V]] = {}  # waiter id -> flight
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {"led": 0, "joined": 0, "left": 0}
+
+    def join(
+        self, key: Optional[str], waiter_id: str, state: Any = None
+    ) -> Tuple[Flight[V], "Future[V]", bool]:
+        """Join the flight for *key*, creating it with *state* if there is none.
+
+        Returns the flight, the future the caller's result will be set on
+        and whether the caller leads (and must start the work).
+        """
+        future: "Future[V]" = Future()
+        with self._lock:
+            flight = self._flights.get(key) if key is not None else None
+            leader = flight is None
+            if leader:
+                flight = Flight(key, state)
+                if key is not None:
+                    self._flights[key] = flight
+            flight.waiters[waiter_id] = future
+            self._waiting[waiter_id] = flight
+            self._counters["led" if leader else "joined"] += 1
+        return flight, future, leader
+
+    def waiting_on(self, waiter_id: str) -> Optional[Flight[V]]:
+        with self._lock:
+            return self._waiting.get(waiter_id)
+
+    def leave(self, waiter_id: str, value: V) -> Tuple[Optional[Flight[V]], bool]:
+        """Resolve *waiter_id*'s future with *value* and take it off its flight.
+
+        Returns the flight it left (``None`` if it was not waiting) and
+        whether it was the last caller, in which case the flight is
+        marked abandoned and no longer joinable and its work should be
+        stopped.
+        """
+        with self._lock:
+            flight = self._waiting.pop(waiter_id, None)
+            if flight is None:
+                return None, False
+            future = flight.waiters.pop(waiter_id)
+            last = not flight.waiters
+            if last:
+                flight.abandoned = True
+                self._forget(flight)
+            self._counters["left"] += 1
+        future.set_result(value)
+        return flight, last
+
+    def publish(self, flight: Flight[V], value: V) -> None:
+        """Give *value* to every caller still waiting on *flight*."""
+        with self._lock:
+            if flight.published:
+                return
+            flight.published = True
+            self._forget(flight)
+            waiters = list(flight.waiters.items())
+            flight.waiters.clear()
+            for waiter_id, _ in waiters:
+                self._waiting.pop(waiter_id, None)
+        for _, future in waiters:
+            future.set_result(value)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len({id(f) for f in self._waiting.values()}),
+                "joinable": len(self._flights),
+                "waiting": len(self._waiting),
+                **self._counters,
+            }
+
+    def _forget(self, flight: Flight[V]) -> None:
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
@@ -0,0 +1,150 @@
+"""Bounded ``repr`` in the spirit of :mod:`reprlib`.
+
+``bounded_repr(obj, limit)`` equals ``repr(obj)[:limit]`` but stops
+producing output once *limit* characters exist, so a 100k-element list
+costs about as much as a short one.  Built-in lists, tuples, dicts, sets,
+frozensets and strings are walked piece by piece; any other object
+(including subclasses, whose ``__repr__`` may differ) uses its own
+``repr``.
+"""
+
+from __future__ import annotations
+
+from itertools import chain
+from typing import Any, Dict, List, Set, Tuple
+
+# type -> (opening, closing) delimiters of a non-empty container
+_DELIMITERS: Dict[type, Tuple[str, str]] = {
+    list: ("[", "]"),
+    tuple: ("(", ")"),
+    dict: ("{", "}"),
+    set: ("{", "}"),
+    frozenset: ("frozenset({", "})"),
+}
+
+_EMPTY: Dict[type, str] = {
+    list: "[]",
+    tuple: "()",
+    dict: "{}",
+    set: "set()",
+    frozenset: "frozenset()",
+}
+
+# What CPython prints for a container already being repr'd higher up
+_RECURSIVE: Dict[type, str] = {
+    list: "[...]",
+    tuple: "(...)",
+    dict: "{...}",
+    set: "set(...)",
+    frozenset: "frozenset(...)",
+}
+
+
+# Short containers of these are cheaper to repr in C than to walk
+_SCALARS = frozenset({int, float, bool, type(None)})
+_INLINE_ITEMS = 32
+
+
+class _BudgetSpent(Exception):
+    """Raised internally once the character budget is used up."""
+
+
+class _Writer:
+    __slots__ = ("parts", "remaining")
+
+    def __init__(self, limit: int) -> None:
+        self.parts: List[str] = []
+        self.remaining = limit
+
+    def write(self, text: str) -> None:
+        self.parts.append(text)
+        self.remaining -= len(text)
+        if self.remaining <= 0:
+            raise _BudgetSpent
+
+
+def bounded_repr(obj: Any, limit: int) -> str:
+    """Return ``repr(obj)[:limit]`` without building the full repr."""
+    if limit <= 0:
+        return ""
+    if type(obj) in _DELIMITERS and _is_short_and_flat(obj, limit):
+        return repr(obj)[:limit]
+    writer = _Writer(limit)
+    try:
+        _write(obj, writer, set())
+    except _BudgetSpent:
+        pass
+    return "".join(writer.parts)[:limit]
+
+
+def _is_short_and_flat(obj: Any, limit: int) -> bool:
+    if len(obj) > _INLINE_ITEMS:
+        return False
+    items = chain(obj.keys(), obj.values()) if type(obj) is dict else obj
+    for item in items:
+        cls = type(item)
+        if cls is str:
+            if len(item) > limit:
+                return False
+        elif cls not in _SCALARS:
+            return False
+    return True
+
+
+def _write(obj: Any, writer: _Writer, active: Set[int]) -> None:
+    cls = type(obj)
+    if cls is str:
+        writer.write(_str_repr(obj, writer.remaining))
+        return
+    delimiters = _DELIMITERS.get(cls)
+    if delimiters is None:
+        writer.write(repr(obj))
+        return
+    if not obj:
+        writer.write(_EMPTY[cls])
+        return
+    key = id(obj)
+    if key in active:
+        writer.write(_RECURSIVE[cls])
+        return
+    active.add(key)
+
+    opening, closing = delimiters
+    writer.write(opening)
+    if cls is dict:
+        first = True
+        for k, v in obj.items():
+            if not first:
+                writer.write(", ")
+            first = False
+            _write(k, writer, active)
+            writer.write(": ")
+            _write(v, writer, active)
+    else:
+        first = True
+        for item in obj:
+            if not first:
+                writer.write(", ")
+            first = False
+            _write(item, writer, active)
+        if cls is tuple and len(obj) == 1:
+            writer.write(",")
+    writer.write(closing)
+    active.discard(key)
+
+
+def _str_repr(s: str, limit: int) -> str:
+    """A prefix of ``repr(s)`` at least *limit* characters long (or all of it)."""
+    if len(s) <= limit:
+        return repr(s)
+    # Every character renders as at least one, so *limit* of them suffice;
+    # the quote repr() picks depends on the whole string, though
+    prefix = s[:limit]
+    quote = '"' if "'" in s and '"' not in s else "'"
+    text = repr(prefix)
+    if text[0] == quote:
+        return text[:-1]
+    if "'" not in prefix and '"' not in prefix:
+        # No quotes to escape either way, only the delimiter differs
+        return quote + text[1:-1]
+    return repr(s)
@@ -19,5 +19,5 @@ async def execute_code_task(code: str, user_input: str = "") -> Dict[str, Any]:
     return {
         "success": True,
         "total_steps": trace.total_steps,
-        "stdout": "".join(s.stdout for s in trace.steps),
+        "stdout": collector.state.store.stdout_text(),
     }
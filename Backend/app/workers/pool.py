@@ -0,0 +1,499 @@
+"""Supervised pool of execution worker processes.
+
+Unlike :class:`concurrent.futures.ProcessPoolExecutor`, the pool knows
+which process runs which job.  A job that overruns or is cancelled is
+stopped by killing its process, which frees the slot at once; a
+replacement is started straight away and imports the execution modules
+before it accepts work, so the next job does not pay for the spawn.
+
+Each worker has a supervisor thread in the server that feeds it jobs
+from a shared queue and waits for the result over a pipe, and a shared
+stop flag: :meth:`WorkerPool.cancel` raises it first so a job that polls
+:func:`stop_requested` can end cleanly and keep the worker, and kills the
+process only if the job has not finished after a grace period.
+
+The queue in front of the workers is bounded: once *max_queued* jobs
+wait, :meth:`WorkerPool.submit` refuses more with :class:`PoolSaturated`
+so callers can push back on clients instead of letting jobs pile up
+until they time out.  Each job's future records when it was submitted
+and when a worker took it, so waiting and running time can be told
+apart.
+
+Jobs are not served first come, first served but fairly across the
+clients that submitted them (see :mod:`app.workers.scheduler`), and one
+client can hold at most *max_queued_per_client* places in the queue.
+"""
+
+from __future__ import annotations
+
+import importlib
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Future, wait
+from collections import deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from app.utils.logger import get_logger
+from app.workers.scheduler import FairQueue, Priority
+
+logger = get_logger(__name__)
+
+# Seconds a new worker may take to import its modules and report ready
+_READY_TIMEOUT = 60.0
+
+# Worker start latencies kept for the stats
+_LATENCY_WINDOW = 100
+
+# Client of jobs submitted without one
+_ANONYMOUS = ""
+
+
+class WorkerKilled(Exception):
+    """The job's worker was killed because it timed out or was cancelled."""
+
+
+class WorkerCrashed(Exception):
+    """The job's worker exited while running it."""
+
+
+class PoolSaturated(Exception):
+    """The job queue is full; the job was not accepted."""
+
+
+class JobFuture(Future):
+    """Future of a pool job that also records when the job started.
+
+    :attr:`submitted` and :attr:`started` are :func:`time.monotonic`
+    readings; :attr:`started` stays ``None`` while the job is queued and
+    if it is cancelled there.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+        self._left_queue = threading.Event()
+
+    def set_running_or_notify_cancel(self) -> bool:
+        running = super().set_running_or_notify_cancel()
+        if running:
+            self.started = time.monotonic()
+        self._left_queue.set()
+        return running
+
+    def cancel(self) -> bool:
+        cancelled = super().cancel()
+        if cancelled:
+            self._left_queue.set()
+        return cancelled
+
+    def wait_started(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the job starts or is cancelled while queued.
+
+        Returns ``False`` if it was still queued after *timeout* seconds.
+        """
+        return self._left_queue.wait(timeout)
+
+    @property
+    def queue_time(self) -> float:
+        """Seconds the job waited (so far, if it has not started)."""
+        return (self.started or time.monotonic()) - self.submitted
+
+
+# ------------------------------------------------------------------
+# Worker process
+# ------------------------------------------------------------------
+
+# This worker's stop flag (set in worker processes only)
+_stop_flag: Any = None
+
+
+def stop_requested() -> bool:
+    """Whether the job running in this worker has been asked to stop."""
+    return _stop_flag is not None and _stop_flag.value != 0
+
+
+def _worker_main(
+    conn: Connection, preload: Sequence[str], stop_flag: Any
+) -> None:
+    """Run jobs received on *conn* until it closes or sends ``None``."""
+    global _stop_flag
+    _stop_flag = stop_flag
+    for module in preload:
+        importlib.import_module(module)
+    conn.send("ready")
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        fn, args, kwargs = job
+        try:
+            reply: Tuple[str, Any] = ("ok", fn(*args, **kwargs))
+        except BaseException as exc:
+            reply = ("error", exc)
+        try:
+            conn.send(reply)
+        except Exception as exc:
+            # Pickling failed before anything was written
+            conn.send(("error", RuntimeError(f"Unsendable job result: {exc}")))
+
+
+# ------------------------------------------------------------------
+# Server side
+# ------------------------------------------------------------------
+
+@dataclass
+class _Job:
+    future: JobFuture
+    fn: Callable[..., Any]
+    args: Tuple[Any, ...]
+    kwargs: Dict[str, Any]
+
+
+@dataclass
+class _Slot:
+    """One worker process and the job it is running."""
+
+    index: int
+    process: Optional[multiprocessing.process.BaseProcess] = None
+    conn: Optional[Connection] = None
+    job: Optional[_Job] = None
+    stop_flag: Any = None  # shared with the current process
+    kill_requested: bool = False
+    jobs_run: int = 0  # by the current process
+    thread: Optional[threading.Thread] = field(default=None, repr=False)
+
+
+class WorkerPool:
+    """A fixed number of supervised worker processes.
+
+    Jobs are submitted like with an executor and return a
+    :class:`JobFuture`.  :meth:`cancel` drops a queued job or stops the
+    one running; if its process has to be killed the future fails with
+    :class:`WorkerKilled`.  Processes are started on the first submit.
+    With *max_queued* set, at most that many jobs wait for a worker, and
+    with *max_queued_per_client* at most that many of one client's.
+    *weights* sets each priority class's share of turns when clients
+    compete for workers.
+
+    Each worker imports the *preload* modules before reporting ready; with
+    a ``forkserver`` *mp_context* whose preload list covers them, that is
+    already done and a worker starts in a few milliseconds.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        preload: Sequence[str] = (),
+        mp_context: Optional[multiprocessing.context.BaseContext] = None,
+        max_queued: Optional[int] = None,
+        max_queued_per_client: Optional[int] = None,
+        weights: Optional[Mapping[str, int]] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.preload = tuple(preload)
+        self._context = mp_context or multiprocessing.get_context("spawn")
+        self._queue: FairQueue[_Job] = FairQueue(weights or {})
+        self._slots: List[_Slot] = []
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._counters: Dict[str, int] = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "stopped": 0,
+            "killed": 0,
+            "crashed": 0,
+            "workers_started": 0,
+            # Jobs that were the first on their process, and all later ones
+            "tasks_cold": 0,
+            "tasks_warm": 0,
+        }
+        # Seconds from Process.start() to "ready", most recent last
+        self._start_latencies: "deque[float]" = deque(maxlen=_LATENCY_WINDOW)
+
+    # ---- submitting ----
+
+    def submit(
+        self, fn: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> JobFuture:
+        """Queue ``fn(*args, **kwargs)`` for no client in particular."""
+        return self.submit_for(
+            _ANONYMOUS, Priority.INTERACTIVE, fn, *args, **kwargs
+        )
+
+    def submit_for(
+        self,
+        client: str,
+        priority: Priority,
+        fn: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> JobFuture:
+        """Queue ``fn(*args, **kwargs)`` to run in a worker for *client*.
+
+        Raises :class:`PoolSaturated` if *max_queued* jobs already wait,
+        or *max_queued_per_client* of *client*'s.
+        """
+        future = JobFuture()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot submit to a pool that was shut down")
+            if not self._started:
+                self._start_slots()
+            if self.max_queued is not None and self._waiting() >= self.max_queued:
+                self._counters["rejected"] += 1
+                raise PoolSaturated(
+                    f"{self.max_queued} executions are already waiting"
+                )
+            if (
+                self.max_queued_per_client is not None
+                and self._waiting(client) >= self.max_queued_per_client
+            ):
+                self._counters["rejected"] += 1
+                raise PoolSaturated(
+                    f"{self.max_queued_per_client} of this client's executions "
+                    "are already waiting"
+                )
+            self._counters["submitted"] += 1
+            self._queue.put(_Job(future, fn, args, kwargs), client, priority)
+        return future
+
+    def _waiting(self, client: Optional[str] = None) -> int:
+        """Jobs in the queue (*client*'s only, if given), leaving out
+        cancelled ones not yet dropped."""
+        return sum(
+            1 for owner, _, job in self._queue.items()
+            if (client is None or owner == client) and not job.future.cancelled()
+        )
+
+    def cancel(self, future: Future, grace: float = 0.0) -> bool:
+        """Stop the job behind *future*.
+
+        A queued job is dropped.  A running one has its worker's stop flag
+        raised; if it has not finished *grace* seconds later its process is
+        killed.  Returns ``False`` if the job had already finished.
+        """
+        if future.cancel():
+            self._count("cancelled")
+            return True
+        if grace > 0:
+            if not self._signal(future):
+                return False
+            if wait([future], timeout=grace).done:
+                self._count("stopped")
+                return True
+        with self._lock:
+            slot = self._slot_running(future)
+            if slot is None:
+                return grace > 0  # Stopped just after the grace period
+            slot.kill_requested = True
+            slot.process.kill()
+            return True
+
+    def _signal(self, future: Future) -> bool:
+        with self._lock:
+            slot = self._slot_running(future)
+            if slot is None:
+                return False
+            slot.stop_flag.value = 1
+            return True
+
+    def _slot_running(self, future: Future) -> Optional[_Slot]:
+        for slot in self._slots:
+            if slot.job is not None and slot.job.future is future:
+                return slot
+        return None
+
+    # ---- health ----
+
+    def stats(self) -> Dict[str, Any]:
+        """Current pool size and occupancy, lifetime counters and worker
+        start latency (milliseconds, over the last starts)."""
+        with self._lock:
+            alive = sum(
+                1 for slot in self._slots
+                if slot.process is not None and slot.process.is_alive()
+            )
+            busy = sum(1 for slot in self._slots if slot.job is not None)
+            counters = dict(self._counters)
+            latencies = list(self._start_latencies)
+        return {
+            "start_method": self._context.get_start_method(),
+            "workers": self.max_workers,
+            "alive": alive,
+            "busy": busy,
+            "idle": max(alive - busy, 0),
+            "queued": self._waiting(),
+            "max_queued": self.max_queued,
+            "max_queued_per_client": self.max_queued_per_client,
+            **self._queue.stats(),
+            **counters,
+            "start_latency_ms": {
+                "last": round(latencies[-1] * 1000, 1) if latencies else None,
+                "mean": (
+                    round(sum(latencies) / len(latencies) * 1000, 1)
+                    if latencies else None
+                ),
+                "max": round(max(latencies) * 1000, 1) if latencies else None,
+            },
+        }
+
+    # ---- lifecycle ----
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            slots = list(self._slots)
+        self._queue.close()
+        if wait:
+            for slot in slots:
+                slot.thread.join()
+
+    def _start_slots(self) -> None:
+        self._started = True
+        for index in range(self.max_workers):
+            slot = _Slot(index)
+            slot.thread = threading.Thread(
+                target=self._supervise,
+                args=(slot,),
+                name=f"worker-supervisor-{index}",
+                daemon=True,
+            )
+            self._slots.append(slot)
+            slot.thread.start()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    # ---- supervisor thread (one per slot) ----
+
+    def _supervise(self, slot: _Slot) -> None:
+        try:
+            while True:
+                if slot.process is None or not slot.process.is_alive():
+                    self._spawn(slot)
+                job = self._queue.get()
+                if job is None:
+                    return
+                if self._assign(slot, job):
+                    self._run(slot, job)
+        finally:
+            self._stop(slot)
+
+    def _spawn(self, slot: _Slot) -> None:
+        """Start a worker for *slot* and wait until its imports are done."""
+        self._stop(slot)
+        started = time.monotonic()
+        conn, child_conn = self._context.Pipe()
+        stop_flag = self._context.RawValue("b", 0)
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.preload, stop_flag),
+            name=f"execution-worker-{slot.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        with self._lock:
+            slot.process, slot.conn, slot.kill_requested = process, conn, False
+            slot.stop_flag = stop_flag
+            slot.jobs_run = 0
+            self._counters["workers_started"] += 1
+        try:
+            if not conn.poll(_READY_TIMEOUT):
+                raise TimeoutError("worker did not become ready")
+            conn.recv()
+            with self._lock:
+                self._start_latencies.append(time.monotonic() - started)
+        except (EOFError, OSError, TimeoutError) as exc:
+            # Leave the dead slot; the next job respawns it
+            logger.error(f"Worker {slot.index} failed to start: {exc}")
+            process.kill()
+
+    def _assign(self, slot: _Slot, job: _Job) -> bool:
+        """Mark *job* running on *slot*, unless it was cancelled.
+
+        Both happen under the pool lock, so :meth:`cancel` finds the job
+        either still cancellable or on its slot, never in between.  The
+        stop flag is cleared here rather than by the worker, so a stop
+        requested before the worker has the job is not lost.
+        """
+        with self._lock:
+            if not job.future.set_running_or_notify_cancel():
+                return False
+            slot.job = job
+            slot.stop_flag.value = 0
+            self._counters["tasks_warm" if slot.jobs_run else "tasks_cold"] += 1
+            slot.jobs_run += 1
+            return True
+
+    def _run(self, slot: _Slot, job: _Job) -> None:
+        try:
+            try:
+                slot.conn.send((job.fn, job.args, job.kwargs))
+            except (EOFError, OSError):
+                raise
+            except Exception as exc:
+                # The job could not be pickled; nothing reached the worker
+                self._count("failed")
+                job.future.set_exception(exc)
+                return
+            status, value = slot.conn.recv()
+        except (EOFError, OSError):
+            self._lost(slot, job)
+            return
+        finally:
+            with self._lock:
+                slot.job = None
+
+        if status == "ok":
+            self._count("completed")
+            job.future.set_result(value)
+        else:
+            self._count("failed")
+            job.future.set_exception(value)
+
+    def _lost(self, slot: _Slot, job: _Job) -> None:
+        """Fail *job* whose worker died under it."""
+        slot.process.join()
+        if slot.kill_requested:
+            self._count("killed")
+            job.future.set_exception(WorkerKilled("Worker was stopped"))
+        else:
+            self._count("crashed")
+            job.future.set_exception(WorkerCrashed(
+                f"Worker exited with code {slot.process.exitcode}"
+            ))
+
+    def _stop(self, slot: _Slot) -> None:
+        """Ask *slot*'s worker to exit (killing it if it will not)."""
+        process, conn = slot.process, slot.conn
+        if process is None:
+            return
+        if process.is_alive():
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(timeout=1)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        conn.close()
@@ -0,0 +1,115 @@
+"""Fair queueing of jobs across clients.
+
+Jobs wait in one FIFO flow per (client, priority class).  Flows with
+work are served by deficit round-robin: on its turn a flow may start as
+many jobs as its class weight, then the next flow gets a turn.  A
+client submitting hundreds of jobs therefore only delays everybody else
+by its share of turns, and interactive runs get more turns per round
+than batch work without starving it.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from enum import Enum
+from typing import Any, Deque, Dict, Generic, List, Mapping, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class Priority(str, Enum):
+    INTERACTIVE = "interactive"  # Someone is waiting for the trace
+    BATCH = "batch"  # Bulk or background submissions
+
+
+class _Flow(Generic[T]):
+    __slots__ = ("client", "priority", "weight", "items", "deficit")
+
+    def __init__(self, client: str, priority: Priority, weight: int) -> None:
+        self.client = client
+        self.priority = priority
+        self.weight = weight
+        self.items: Deque[T] = deque()
+        self.deficit = 0
+
+
+class FairQueue(Generic[T]):
+    """A blocking queue that hands out items fairly across clients.
+
+    *weights* gives each priority class's turns per round (at least 1;
+    classes missing from it get 1).  Every item costs one turn.  After
+    :meth:`close`, :meth:`get` returns ``None`` once the queue is empty.
+    """
+
+    def __init__(self, weights: Mapping[str, int]) -> None:
+        self.weights = {key: max(int(value), 1) for key, value in weights.items()}
+        self._flows: Dict[Tuple[str, Priority], _Flow[T]] = {}
+        self._active: Deque[_Flow[T]] = deque()  # flows with items, in turn order
+        self._size = 0
+        self._closed = False
+        self._changed = threading.Condition()
+
+    def put(
+        self, item: T, client: str, priority: Priority = Priority.INTERACTIVE
+    ) -> None:
+        with self._changed:
+            flow = self._flows.get((client, priority))
+            if flow is None:
+                flow = _Flow(client, priority, self.weights.get(priority.value, 1))
+                self._flows[(client, priority)] = flow
+            if not flow.items:
+                self._active.append(flow)
+            flow.items.append(item)
+            self._size += 1
+            self._changed.notify()
+
+    def get(self) -> Optional[T]:
+        """Take the next item, waiting for one; ``None`` once closed and empty."""
+        with self._changed:
+            while not self._size:
+                if self._closed:
+                    return None
+                self._changed.wait()
+
+            flow = self._active[0]
+            if flow.deficit < 1:
+                flow.deficit += flow.weight  # Its turn starts
+            item = flow.items.popleft()
+            flow.deficit -= 1
+            self._size -= 1
+            if not flow.items:
+                self._active.popleft()
+                flow.deficit = 0
+                del self._flows[(flow.client, flow.priority)]
+            elif flow.deficit < 1:
+                self._active.rotate(-1)  # Turn used up
+            return item
+
+    def close(self) -> None:
+        """Let :meth:`get` return ``None`` once the remaining items are taken."""
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def items(self) -> List[Tuple[str, Priority, T]]:
+        """Snapshot of the queued items with their client and class."""
+        with self._changed:
+            return [
+                (flow.client, flow.priority, item)
+                for flow in self._active
+                for item in flow.items
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._changed:
+            queued: Dict[str, int] = {priority.value: 0 for priority in Priority}
+            for flow in self._active:
+                queued[flow.priority.value] += len(flow.items)
+            return {
+                "clients": len({flow.client for flow in self._active}),
+                "queued_by_priority": queued,
+            }
@@ -0,0 +1,189 @@
+"""Benchmark the sandbox security scan on worst-case inputs.
+
+Run from the ``Backend`` directory::
+
+    python -m scripts.bench_sandbox [--repeat N]
+
+Each input is ``MAX_CODE_LENGTH`` characters in at most 1000 lines, the
+largest program the sandbox accepts.  Each phase of the current scanner
+is timed against the previous one (a case-insensitive ``re.search`` per
+pattern and an ``ast.walk`` with ``isinstance`` chains, kept below for
+reference), on a tree parsed beforehand as the code front end does.
+The script also checks that both give the same verdict, and the same
+message, for every input and for a set of small programs with
+violations planted in them.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.sandbox import SandboxSecurity, SecurityError
+from scripts.seed_data import SAMPLE_PROGRAMS
+
+_MAX_LINES = 1000
+
+
+def _fill(line: str, last: str = "") -> str:
+    """Repeat *line* up to the size limit, ending with *last*."""
+    budget = settings.MAX_CODE_LENGTH - len(last)
+    lines = max(min(budget // len(line), _MAX_LINES - 1), 1)
+    return line * lines + last
+
+
+def _inputs() -> Dict[str, str]:
+    # Identifiers full of pattern prefixes that never complete a match
+    near_misses = (
+        "evaluate_x = executor.files + compiled_opener.popper"
+        " if import_sys_os else from_os_\n"
+    )
+    # As many Attribute and Call nodes per character as Python allows
+    dense = "v = a.b.c(d.e(f.g(h.i(j.k(l.m(n.o(p.q(r.s(t.u())))))))))\n"
+    return {
+        "near misses": _fill(near_misses),
+        "dense ast": _fill(dense),
+        "long lines": _fill("x = " + " + ".join(["total"] * 2000) + "\n"),
+        "violation last": _fill(near_misses, "data = open('x')\n"),
+    }
+
+
+def _planted() -> List[str]:
+    """Small programs with one or two violations planted in them."""
+    snippets = [
+        "__import__('os')", "import os", "import subprocess", "from sys import argv",
+        "x.__class__", "().__class__.__bases__[0].__subclasses__()", "EVAL('1')",
+        "Exec ('x')", "f = open('a')", "o.system('ls')", "import socket",
+        "from os.path import join", "g.__globals__", "print(__spec__)",
+        "x = compile('1', 's', 'eval')", "input()", "file('x')",
+        "if x:\n" + " " * 240 + "pass", "y.__dict__", "import math",
+    ]
+    programs = []
+    for index, program in enumerate(SAMPLE_PROGRAMS):
+        for snippet in snippets:
+            programs.append(program["code"] + "\n" + snippet)
+            other = snippets[(index + len(programs)) % len(snippets)]
+            programs.append(snippet + "\n" + program["code"] + "\n" + other)
+    return programs
+
+
+# ---- the previous scanner, for comparison ----
+
+def _legacy_patterns(code: str, tree: ast.Module) -> None:
+    for pattern, message in SandboxSecurity.DANGEROUS_PATTERNS:
+        if re.search(pattern, code, re.IGNORECASE):
+            raise SecurityError(message)
+
+
+def _legacy_ast(code: str, tree: ast.Module) -> None:
+    sandbox = SandboxSecurity
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.name.split(".")[0] in settings.BLOCKED_MODULES:
+                    raise SecurityError(f"Import of '{alias.name}' is not allowed")
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ""
+            if module.split(".")[0] in settings.BLOCKED_MODULES:
+                raise SecurityError(f"Import from '{module}' is not allowed")
+        elif isinstance(node, ast.Attribute):
+            if node.attr in sandbox.DANGEROUS_ATTRIBUTES:
+                raise SecurityError(f"Access to '{node.attr}' is not allowed")
+        elif isinstance(node, ast.Call):
+            if isinstance(node.func, ast.Name):
+                if node.func.id in sandbox.DANGEROUS_BUILTINS:
+                    raise SecurityError(f"Function '{node.func.id}' is not allowed")
+
+
+def _legacy_structure(code: str, tree: ast.Module) -> None:
+    lines = code.split("\n")
+    if len(lines) > 1000:
+        raise SecurityError("Code exceeds maximum line count (1000)")
+    if len(code) > settings.MAX_CODE_LENGTH:
+        raise SecurityError(f"Code exceeds maximum length ({settings.MAX_CODE_LENGTH})")
+    non_empty = [line for line in lines if line.strip()]
+    if non_empty and max(len(line) - len(line.lstrip()) for line in non_empty) > 200:
+        raise SecurityError("Excessive indentation detected")
+
+
+Check = Callable[[str, ast.Module], None]
+
+# (phase, previous, current)
+_PHASES: List[Tuple[str, Check, Check]] = [
+    ("patterns", _legacy_patterns, lambda code, tree: SandboxSecurity._check_patterns(code)),
+    ("ast", _legacy_ast, SandboxSecurity._check_ast),
+    ("structure", _legacy_structure, lambda code, tree: SandboxSecurity._check_structure(code)),
+]
+
+
+def _legacy_check(code: str) -> None:
+    tree = ast.parse(code)
+    for _, check, _ in _PHASES:
+        check(code, tree)
+
+
+def _current_check(code: str) -> None:
+    tree = ast.parse(code)
+    for _, _, check in _PHASES:
+        check(code, tree)
+
+
+def _verdict(check: Callable[..., None], *args: object) -> Optional[str]:
+    try:
+        check(*args)
+    except (SecurityError, SyntaxError) as exc:
+        return f"{type(exc).__name__}: {exc}"
+    return None
+
+
+def _time(check: Check, code: str, tree: ast.Module, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        _verdict(check, code, tree)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def run(repeat: int) -> None:
+    print(f"Inputs of {settings.MAX_CODE_LENGTH} characters (repeat={repeat})")
+    for name, code in _inputs().items():
+        tree = ast.parse(code)
+        started = time.perf_counter()
+        ast.parse(code)
+        parse = (time.perf_counter() - started) * 1000
+        verdict = _verdict(_current_check, code)
+        print(f"\n{name}: {verdict or 'ok'} (ast.parse {parse:.2f} ms)")
+        if verdict != _verdict(_legacy_check, code):
+            print(f"  !! previously {_verdict(_legacy_check, code)!r}")
+        total_before = total_after = 0.0
+        for phase, previous, current in _PHASES:
+            before = _time(previous, code, tree, repeat)
+            after = _time(current, code, tree, repeat)
+            total_before += before
+            total_after += after
+            print(f"  {phase:<12}{before:>9.2f} ms ->{after:>7.2f} ms{before / after:>7.1f}x")
+        print(
+            f"  {'total':<12}{total_before:>9.2f} ms ->{total_after:>7.2f} ms"
+            f"{total_before / total_after:>7.1f}x"
+        )
+
+    planted = _planted()
+    differing = [
+        code for code in planted
+        if _verdict(_current_check, code) != _verdict(_legacy_check, code)
+    ]
+    print(f"\nPlanted violations: {len(planted) - len(differing)}/{len(planted)} agree")
+    for code in differing[:5]:
+        print(
+            f"  !! {code!r}: {_verdict(_current_check, code)!r}, "
+            f"previously {_verdict(_legacy_check, code)!r}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    run(parser.parse_args().repeat)
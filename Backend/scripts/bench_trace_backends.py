@@ -0,0 +1,98 @@
+"""Compare tracing throughput of the available trace backends.
+
+Run from the ``Backend`` directory::
+
+    python -m scripts.bench_trace_backends [--repeat N]
+
+Each sample program is traced with every available backend; the script
+checks that the resulting traces are identical (ignoring timestamps) and
+prints steps/sec per backend.
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from app.core.trace_backends import BACKENDS
+from app.core.trace_collector import TraceCollector
+from scripts.seed_data import SAMPLE_PROGRAMS
+
+BENCH_PROGRAMS = SAMPLE_PROGRAMS + [
+    {
+        "title": "Nested Loops",
+        "code": "total = 0\nfor i in range(30):\n    for j in range(30):\n        total += i * j\nprint(total)",
+    },
+    {
+        "title": "Library Calls",
+        "code": "words = ['pear', 'fig', 'apple'] * 20\nfor w in sorted(words, key=len):\n    n = len(w)\nprint(max(words))",
+    },
+    {
+        "title": "Exception Handling",
+        "code": "def check(x):\n    return 10 // x\n\nfor v in [1, 0, 2]:\n    try:\n        print(check(v))\n    except:\n        print('bad', v)",
+    },
+    {
+        "title": "Nested Containers",
+        "code": "grid = [[(r, c) for c in range(8)] for r in range(8)]\nindex = {}\nfor row in grid:\n    for cell in row:\n        index.setdefault(cell[0], []).append({'pos': cell, 'tags': [cell[1]]})\nprint(len(index))",
+    },
+    {
+        "title": "Object Graph",
+        "code": "def node(value, children=()):\n    return {'value': value, 'children': list(children)}\n\nleaves = [node(i) for i in range(40)]\nroot = node(0, [node(i, leaves[i:i + 4]) for i in range(0, 40, 4)])\ntotal = 0\nfor child in root['children']:\n    total += len(child['children'])\nprint(total)",
+    },
+]
+
+
+def _comparable(trace: Any) -> str:
+    steps = trace.model_dump()["steps"]
+    for step in steps:
+        step.pop("timestamp", None)
+    # Function reprs embed addresses that differ between runs
+    return re.sub(r" at 0x[0-9a-f]+", "", repr(steps))
+
+
+def _trace(pool: ThreadPoolExecutor, code: str, backend: str) -> Any:
+    # Run on a pool thread so the only frames above the traced program are
+    # executor internals, as in the real worker process
+    collector = TraceCollector(code, backend=backend)
+    return pool.submit(collector.execute).result()
+
+
+def run(repeat: int) -> None:
+    backends = [name for name, cls in BACKENDS.items() if cls.available()]
+    print(f"Backends: {', '.join(backends)}  (repeat={repeat})\n")
+    print(f"{'program':<22}" + "".join(f"{name:>16}" for name in backends))
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    for program in BENCH_PROGRAMS:
+        rates: Dict[str, float] = {}
+        reference = None
+        for name in backends:
+            steps = 0
+            elapsed = 0.0
+            for _ in range(repeat):
+                started = time.perf_counter()
+                trace = _trace(pool, program["code"], name)
+                elapsed += time.perf_counter() - started
+                steps += trace.total_steps
+            rates[name] = steps / elapsed if elapsed else 0.0
+
+            steps_data = _comparable(trace)
+            if reference is None:
+                reference = steps_data
+            elif steps_data != reference:
+                print(f"  !! {program['title']}: {name} trace differs from {backends[0]}")
+
+        print(
+            f"{program['title']:<22}"
+            + "".join(f"{rates[name]:>12.0f} st/s" for name in backends)
+        )
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    run(parser.parse_args().repeat)
@@ -0,0 +1,67 @@
+"""Tests for the parse-once code front end."""
+
+from app.services import code_frontend
+from app.services.code_frontend import CodeFrontend, load_code
+
+
+def _frontend():
+    return CodeFrontend(max_bytes=1024 * 1024, ttl=60)
+
+
+def test_runnable_program_gets_bytecode_and_analysis():
+    prepared = _frontend().prepare("x = [1, 2]\nprint(sum(x))")
+
+    assert prepared.syntax_error is None and prepared.security_error is None
+    assert prepared.deterministic
+    namespace = {"print": lambda *args: None}
+    exec(load_code(prepared.bytecode), namespace)
+    assert namespace["x"] == [1, 2]
+
+
+def test_program_is_parsed_once_per_source(monkeypatch):
+    parsed = []
+    parse = code_frontend.ast.parse
+    monkeypatch.setattr(
+        code_frontend.ast, "parse", lambda code: parsed.append(code) or parse(code)
+    )
+    frontend = _frontend()
+
+    first = frontend.prepare("print(1)")
+    assert frontend.prepare("print(1)") is first
+    frontend.prepare("print(2)")
+    assert parsed == ["print(1)", "print(2)"]
+    assert frontend.stats()["hits"] == 1
+
+
+def test_syntax_errors_are_reported_without_bytecode():
+    prepared = _frontend().prepare("print(1")
+
+    assert prepared.syntax_error == "SyntaxError: '(' was never closed at line 1"
+    assert prepared.bytecode is None and prepared.analysis is None
+
+
+def test_errors_only_the_compiler_finds_are_syntax_errors():
+    prepared = _frontend().prepare("return 1")
+
+    assert prepared.syntax_error == "SyntaxError: 'return' outside function at line 1"
+    assert prepared.bytecode is None
+
+
+def test_unsafe_program_is_not_compiled():
+    prepared = _frontend().prepare("import os")
+
+    assert prepared.security_error == "OS module import blocked"
+    assert prepared.bytecode is None
+
+
+def test_input_verdict_is_kept_apart_from_the_default_one():
+    frontend = _frontend()
+
+    assert frontend.prepare("x = input()").security_error is not None
+    allowed = frontend.prepare("x = input()", allow_input=True)
+    assert allowed.security_error is None and allowed.bytecode is not None
+    assert frontend.prepare("x = input()").security_error is not None
+
+
+def test_nondeterministic_programs_are_marked():
+    assert not _frontend().prepare("import random\nprint(random.random())").deterministic
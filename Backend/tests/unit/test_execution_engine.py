@@ -0,0 +1,75 @@
+"""Tests for the untraced runner and the builtins both runners share."""
+
+import pytest
+
+from app.core.execution_engine import PlainRunner, SandboxBuiltins
+from app.core.trace_collector import TraceCollector
+from app.services import executor
+from app.services.executor import ExecutionService
+
+PROGRAM = "name = input('name? ')\nage = input()\nprint('hi', name, age, sep=',')\n"
+
+
+def test_input_reads_lines_and_echoes_them_after_the_prompt():
+    run = PlainRunner("ada\n36").execute(compile(PROGRAM, "<string>", "exec"))
+
+    assert run.error is None
+    assert run.stdout == "name? ada\n36\nhi,ada,36\n"
+
+
+def test_input_past_the_last_line_returns_an_empty_string():
+    written = []
+    sandbox = SandboxBuiltins("only", written.append)
+
+    assert sandbox.input() == "only"
+    assert sandbox.input("more? ") == ""
+    assert written == ["only\n", "more? \n"]
+
+
+def test_traced_and_untraced_runs_print_the_same():
+    collector = TraceCollector(PROGRAM, "ada\n36")
+    collector.execute()
+    run = PlainRunner("ada\n36").execute(compile(PROGRAM, "<string>", "exec"))
+
+    assert collector.state.store.stdout_text() == run.stdout
+
+
+def test_open_is_refused():
+    run = PlainRunner().execute(compile("open('x')", "<string>", "exec"))
+
+    assert run.error == "PermissionError: File operations are not allowed"
+
+
+def test_output_past_the_limit_is_cut_and_fails_the_run():
+    code = compile("for i in range(100):\n    print('x' * 10)", "<string>", "exec")
+    run = PlainRunner(max_output=25).execute(code)
+
+    assert run.stdout == "x" * 10 + "\n" + "x" * 10 + "\n" + "xxx"
+    assert run.error == "Output limit exceeded (25 characters)"
+
+
+def test_input_without_echo_writes_only_the_prompt():
+    run = PlainRunner("ada\n36", echo_input=False).execute(
+        compile(PROGRAM, "<string>", "exec")
+    )
+
+    assert run.stdout == "name? hi,ada,36\n"
+
+
+
+@pytest.fixture
+def service():
+    service = ExecutionService()
+    yield service
+    service.shutdown()
+
+
+@pytest.mark.parametrize("trace", [False, True])
+def test_test_cases_reading_input_pass_on_their_expected_output(service, trace):
+    code = "a = int(input())\nb = int(input())\nprint(a + b)\n"
+    cases = [executor.TestCase("1\n2", "3"), executor.TestCase("5\n-5", "0")]
+
+    result = service.run_test_cases(code, cases, trace=trace)
+
+    assert [case.stdout for case in result.test_cases] == ["3\n", "0\n"]
+    assert [case.passed for case in result.test_cases] == [True, True]
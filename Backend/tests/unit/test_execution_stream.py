@@ -0,0 +1,88 @@
+"""Tests for reading the steps of a streamed run."""
+
+from concurrent.futures import Future
+
+from app.models.execution import ExecutionStatus
+from app.services.executor import (
+    ExecutionStream,
+    _cancelled,
+    _failure,
+    _Run,
+    _StepLog,
+)
+from app.workers.scheduler import Priority
+
+
+class _Service:
+    def __init__(self):
+        self.cancelled = []
+
+    def cancel(self, execution_id):
+        self.cancelled.append(execution_id)
+        return True
+
+
+class _FinishingLog(_StepLog):
+    """A log whose run ends right after a read returns, before the reader
+    gets to look at the batches it was given."""
+
+    def __init__(self, mine, rest, result):
+        super().__init__()
+        self._mine = mine
+        self._rest = rest
+        self._result = result
+
+    def read(self, start, timeout):
+        batches, complete = super().read(start, timeout)
+        if self._rest is not None:
+            for batch in self._rest:
+                self.append(batch)
+            self.close()
+            self._mine.set_result(self._result)
+            self._rest = None
+        return batches, complete
+
+
+def _stream(service, mine, log):
+    stream = ExecutionStream(service, "print(1)", execution_id="e1")
+    stream._mine = mine
+    stream._run = _Run("", Priority.INTERACTIVE, steps=log)
+    stream._leader = True
+    return stream
+
+
+def test_run_finishing_between_read_and_check_yields_every_step():
+    mine = Future()
+    completed = _failure("", 0.0, ExecutionStatus.COMPLETED)
+    log = _FinishingLog(mine, [["s3", "s4"], ["s5"]], completed)
+    log.append(["s1", "s2"])
+    service = _Service()
+    stream = _stream(service, mine, log)
+
+    assert list(stream) == ["s1", "s2", "s3", "s4", "s5"]
+    assert stream.total_steps == 5
+    assert stream.result.status == ExecutionStatus.COMPLETED
+    assert service.cancelled == []
+
+
+def test_cancelled_request_stops_reading_after_the_steps_it_has():
+    mine = Future()
+    log = _StepLog()
+    log.append(["s1"])
+    mine.set_result(_cancelled(0.0))
+    stream = _stream(_Service(), mine, log)
+
+    assert list(stream) == ["s1"]
+    assert stream.result.status == ExecutionStatus.CANCELLED
+
+
+def test_closing_the_stream_early_cancels_the_request():
+    mine = Future()
+    log = _StepLog()
+    log.append(["s1", "s2"])
+    service = _Service()
+    steps = iter(_stream(service, mine, log))
+
+    assert next(steps) == "s1"
+    steps.close()
+    assert service.cancelled == ["e1"]
@@ -0,0 +1,54 @@
+"""Tests for runs through the execution service."""
+
+import json
+import time
+
+import pytest
+
+from app.config import settings
+from app.core.trace_delta import decode_trace
+from app.models.execution import ExecutionStatus
+from app.models.trace import DeltaTraceData, TraceFormat
+from app.services.executor import ExecutionService, _Run
+from app.workers.pool import JobFuture
+from app.workers.scheduler import Priority
+
+CODE = "xs = []\nfor i in range(5):\n    xs.append(i * i)\nprint(sum(xs))"
+
+
+@pytest.fixture
+def service():
+    service = ExecutionService()
+    yield service
+    service.shutdown()
+
+
+@pytest.mark.parametrize("trace_format", list(TraceFormat))
+def test_keyframed_copy_is_built_only_for_kept_traces(service, trace_format):
+    plain = service.execute(CODE, trace_format=trace_format, encoded=True)
+    kept = service.execute(
+        CODE, trace_format=trace_format, encoded=True, keep_trace=True
+    )
+
+    assert plain.encoded_trace.keyframed is None
+    assert not kept.coalesced and not kept.cached
+    stored = decode_trace(DeltaTraceData.model_validate_json(kept.encoded_trace.keyframed))
+    steps = json.loads(kept.encoded_trace.steps)
+    assert len(steps) == stored.total_steps == kept.encoded_trace.total_steps
+    assert "".join(step.stdout for step in stored.steps) == "30\n"
+
+
+def test_job_overrunning_its_slack_reports_the_time_limit(service, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_EXECUTION_TIME", 0.2)
+    run = _Run("", Priority.INTERACTIVE, slack=0.3)
+    flight, mine, _ = service._flights.join(None, "e1", run)
+    run.future = JobFuture()  # A job that started and never finishes
+    run.future.set_running_or_notify_cancel()
+
+    started = time.monotonic()
+    service._await_run(flight, None)
+    result = mine.result(timeout=5)
+
+    assert time.monotonic() - started >= 0.5
+    assert result.status == ExecutionStatus.TIMEOUT
+    assert result.error == "Execution timed out after 0.2s"
@@ -0,0 +1,98 @@
+"""Tests for background execution jobs."""
+
+from concurrent.futures import Future
+
+from app.config import settings
+from app.models.execution import ExecutionStatus
+from app.services.executor import ExecutionResult
+from app.services.job_manager import JobManager
+
+
+class _Service:
+    """Hands out futures the test resolves itself."""
+
+    def __init__(self):
+        self.futures = []
+        self.cancelled = []
+
+    def submit(self, code, user_input, **options):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def run_status(self, execution_id):
+        return ExecutionStatus.RUNNING
+
+    def cancel(self, execution_id):
+        self.cancelled.append(execution_id)
+        return True
+
+
+def _result(stdout="ok\n"):
+    return ExecutionResult(
+        success=True,
+        trace_data=None,
+        stdout=stdout,
+        stderr=None,
+        error=None,
+        execution_time=0.1,
+        status=ExecutionStatus.COMPLETED,
+    )
+
+
+class _WatchedPending(dict):
+    """Records whether a popped job could still be found by a poll."""
+
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+        self.found_after_pop = []
+
+    def pop(self, key, *default):
+        value = super().pop(key, *default)
+        self.found_after_pop.append(self.manager._finished.get(key) is not None)
+        return value
+
+
+def _manager():
+    manager = JobManager(_Service())
+    manager._start_sweeper = lambda: None
+    return manager
+
+
+def test_finished_job_is_never_missing_between_pending_and_finished():
+    manager = _manager()
+    pending = manager._pending = _WatchedPending(manager)
+    job = manager.submit("print('ok')")
+
+    manager.service.futures[0].set_result(_result())
+
+    assert pending.found_after_pop == [True]
+    found = manager.get(job.job_id)
+    assert manager.status(found) == ExecutionStatus.COMPLETED
+    assert found.result.stdout == "ok\n"
+
+
+def test_result_too_large_to_keep_becomes_an_error(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RESULTS_MAX_BYTES", 100)
+    manager = _manager()
+    job = manager.submit("print('x' * 1000)")
+
+    manager.service.futures[0].set_result(_result("x" * 1000 + "\n"))
+
+    found = manager.get(job.job_id)
+    assert found is not None
+    assert found.result.status == ExecutionStatus.ERROR
+    assert found.result.stdout == ""
+    assert found.result.error.startswith("Execution result too large to keep")
+
+
+def test_job_deleted_while_running_is_not_kept():
+    manager = _manager()
+    job = manager.submit("print('ok')")
+
+    assert manager.delete(job.job_id)
+    manager.service.futures[0].set_result(_result())
+
+    assert manager.service.cancelled == [job.execution_id]
+    assert manager.get(job.job_id) is None
@@ -0,0 +1,118 @@
+"""Tests for the supervised worker pool.
+
+Jobs run in real worker processes, so the job functions live at module
+level where the workers can import them.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+import pytest
+
+from app.workers.pool import JobFuture, WorkerKilled, WorkerPool, stop_requested
+
+
+def _pid():
+    return os.getpid()
+
+
+def _spin():
+    while True:
+        pass
+
+
+def _until_stopped(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if stop_requested():
+            return "stopped"
+        time.sleep(0.01)
+    return "finished"
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(max_workers=1)
+    yield pool
+    pool.shutdown()
+
+
+def _busy(pool, seconds=5.0):
+    """Submit a job that runs until stopped and wait for it to start."""
+    future = pool.submit(_until_stopped, seconds)
+    assert future.wait_started(30)
+    return future
+
+
+def test_overrunning_job_is_killed_and_its_worker_replaced(pool):
+    first = pool.submit(_pid).result(timeout=30)
+    future = pool.submit(_spin)
+    with pytest.raises(FuturesTimeoutError):
+        future.result(timeout=0.5)
+
+    assert pool.cancel(future, grace=0.2)
+    with pytest.raises(WorkerKilled):
+        future.result(timeout=10)
+    assert pool.submit(_pid).result(timeout=30) != first
+    stats = pool.stats()
+    assert stats["killed"] == 1
+    assert stats["workers_started"] == 2
+
+
+def test_cancelled_job_that_stops_keeps_its_worker(pool):
+    first = pool.submit(_pid).result(timeout=30)
+    future = _busy(pool)
+
+    assert pool.cancel(future, grace=5.0)
+    assert future.result(timeout=10) == "stopped"
+    assert pool.submit(_pid).result(timeout=30) == first
+    assert pool.stats()["stopped"] == 1
+
+
+def test_cancel_without_grace_kills_the_worker(pool):
+    first = pool.submit(_pid).result(timeout=30)
+    future = _busy(pool)
+
+    assert pool.cancel(future)
+    with pytest.raises(WorkerKilled):
+        future.result(timeout=10)
+    assert pool.submit(_pid).result(timeout=30) != first
+
+
+def test_queued_job_is_dropped(pool):
+    running = _busy(pool)
+    queued = pool.submit(_pid)
+
+    assert pool.cancel(queued)
+    assert queued.cancelled()
+    pool.cancel(running, grace=5.0)
+    assert pool.stats()["cancelled"] == 1
+
+
+def test_cancel_as_a_job_starts_is_not_lost(pool, monkeypatch):
+    pool.submit(_pid).result(timeout=30)  # Worker started
+    cancels = []
+    cancellers = []
+    start = JobFuture.set_running_or_notify_cancel
+
+    def start_then_cancel(future):
+        running = start(future)
+        if running and not cancellers:
+            # Cancel while the supervisor is between starting the job and
+            # sending it to the worker
+            canceller = threading.Thread(
+                target=lambda: cancels.append(pool.cancel(future, grace=5.0))
+            )
+            cancellers.append(canceller)
+            canceller.start()
+            canceller.join(0.2)
+        return running
+
+    monkeypatch.setattr(JobFuture, "set_running_or_notify_cancel", start_then_cancel)
+    future = pool.submit(_until_stopped, 5.0)
+
+    assert future.result(timeout=10) == "stopped"
+    cancellers[0].join(10)  # cancel() returns just after the job does
+    assert cancels == [True]
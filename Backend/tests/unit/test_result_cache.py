@@ -0,0 +1,101 @@
+"""Tests for the byte-bounded LRU/TTL result cache."""
+
+from app.services import result_cache
+from app.services.result_cache import ResultCache, cache_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _cache(monkeypatch, max_bytes=100, ttl=10.0):
+    clock = _Clock()
+    monkeypatch.setattr(result_cache.time, "monotonic", clock)
+    return ResultCache(max_bytes, ttl), clock
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache, clock = _cache(monkeypatch)
+    cache.put("a", "A", 10)
+
+    clock.now += 9.9
+    assert cache.get("a") == "A"
+    clock.now += 0.1
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["bytes"] == 0
+
+
+def test_sweep_drops_only_expired_entries(monkeypatch):
+    cache, clock = _cache(monkeypatch)
+    cache.put("old", "O", 10)
+    clock.now += 5
+    cache.put("new", "N", 10)
+    clock.now += 5
+
+    assert cache.sweep() == 1
+    assert cache.get("old") is None
+    assert cache.get("new") == "N"
+
+
+def test_least_recently_used_entries_go_once_over_budget(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put("a", "A", 40)
+    cache.put("b", "B", 40)
+    cache.get("a")  # "b" is now the least recently used
+    cache.put("c", "C", 40)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    stats = cache.stats()
+    assert stats["bytes"] == 80
+    assert stats["evictions"] == 1
+
+
+def test_value_larger_than_the_budget_is_not_stored(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put("a", "A", 40)
+    cache.put("huge", "H", 101)
+
+    assert cache.get("huge") is None
+    assert cache.get("a") == "A"
+
+
+def test_replacing_an_entry_recounts_its_size(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put("a", "A", 60)
+    cache.put("a", "A2", 30)
+
+    assert cache.get("a") == "A2"
+    assert cache.stats()["bytes"] == 30
+
+
+def test_zero_budget_disables_the_cache(monkeypatch):
+    cache, _ = _cache(monkeypatch, max_bytes=0)
+    cache.put("a", "A", 1)
+
+    assert not cache.enabled
+    assert cache.get("a") is None
+
+
+def test_hit_ratio_and_bytes_saved(monkeypatch):
+    cache, _ = _cache(monkeypatch)
+    cache.put("a", "A", 25)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 1)
+    assert stats["bytes_saved"] == 50
+    assert stats["hit_ratio"] == 0.6667
+
+
+def test_cache_key_parts_cannot_run_together():
+    assert cache_key("ab", "c") != cache_key("a", "bc")
+    assert cache_key("code", "") == cache_key("code", "")
@@ -0,0 +1,124 @@
+"""Tests for the sandbox security scan."""
+
+import ast
+import random
+import re
+
+import pytest
+
+from app.config import settings
+from app.services.sandbox import SandboxSecurity, SecurityError
+from scripts.seed_data import SAMPLE_PROGRAMS
+
+
+def test_input_is_only_allowed_where_the_run_supplies_it():
+    code = "x = input()\nprint(x)"
+
+    assert SandboxSecurity.validate_code(code) == (
+        False, "Function 'input' is not allowed"
+    )
+    assert SandboxSecurity.validate_code(code, allow_input=True) == (True, None)
+
+
+def test_allowing_input_allows_nothing_else():
+    assert SandboxSecurity.validate_code("open = 1\nopen()", allow_input=True) == (
+        False, "File open blocked"
+    )
+
+
+# ---- agreement with the original scanner ----
+
+
+def _baseline(code):
+    """The scanner as it was before it was precompiled: one
+    case-insensitive search per pattern and an ``ast.walk``."""
+    try:
+        for pattern, message in SandboxSecurity.DANGEROUS_PATTERNS:
+            if re.search(pattern, code, re.IGNORECASE):
+                raise SecurityError(message)
+        for node in ast.walk(ast.parse(code)):
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name.split(".")[0] in settings.BLOCKED_MODULES:
+                        raise SecurityError(f"Import of '{alias.name}' is not allowed")
+            elif isinstance(node, ast.ImportFrom):
+                module = node.module or ""
+                if module.split(".")[0] in settings.BLOCKED_MODULES:
+                    raise SecurityError(f"Import from '{module}' is not allowed")
+            elif isinstance(node, ast.Attribute):
+                if node.attr in SandboxSecurity.DANGEROUS_ATTRIBUTES:
+                    raise SecurityError(f"Access to '{node.attr}' is not allowed")
+            elif isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+                if node.func.id in SandboxSecurity.DANGEROUS_BUILTINS:
+                    raise SecurityError(f"Function '{node.func.id}' is not allowed")
+        SandboxSecurity._check_structure(code)
+    except SecurityError as exc:
+        return False, str(exc)
+    except SyntaxError as exc:
+        return False, f"Syntax error: {exc}"
+    return True, None
+
+
+ALLOWED = [program["code"] for program in SAMPLE_PROGRAMS] + [
+    "evaluate = executor = 1\nprofiles = [compiled_x for compiled_x in range(3)]",
+    "import math\nfrom collections import deque\nprint(math.pi, deque())",
+    "class Point:\n    def __init__(self, x):\n        self.x = x\nprint(Point(1).x)",
+    "import subproceß",  # Not "subprocess" to a case-insensitive match
+    "x = 'proﬁle()'",
+]
+
+# One-line violations, which can be planted anywhere in a program
+VIOLATIONS = [
+    "import os", "import sys", "import subprocess", "from os import path",
+    "from sys import argv", "__import__('os')", "x.__class__",
+    "().__class__.__bases__[0].__subclasses__()", "EVAL('1')", "Exec ('x')",
+    "f = open('a')", "o.system('ls')", "p.popen('ls')", "import socket",
+    "from os.path import join", "from socket import socket", "g.__globals__",
+    "print(__spec__)", "x = compile('1', 's', 'eval')", "input()", "file('x')",
+    "s = 'even import sys in a string'", "y.__dict__", "f.__code__",
+    "t.__mro__", "__loader__", "__builtins__",
+    "getattr(x, '__getattribute__')('__builtins__')",
+]
+
+FORBIDDEN = VIOLATIONS + [
+    "if x:\n" + " " * 240 + "pass", "x = (\n", "\n" * 1001,
+    "x = 1\n" * (settings.MAX_CODE_LENGTH // 6 + 1),
+    # Letters that only match case-insensitively
+    "ımport os", "İMPORT SYS", "x = 'ſys'\nimport ſys", "KEY = 'EVAL('",
+    "import os\u0345",
+]
+
+
+@pytest.mark.parametrize("code", ALLOWED + FORBIDDEN)
+def test_scanner_agrees_with_the_baseline(code):
+    assert SandboxSecurity.validate_code(code) == _baseline(code)
+
+
+@pytest.mark.parametrize("code", ALLOWED)
+def test_allowed_code_passes(code):
+    assert SandboxSecurity.validate_code(code) == (True, None)
+
+
+@pytest.mark.parametrize("code", FORBIDDEN)
+def test_forbidden_code_is_rejected(code):
+    assert SandboxSecurity.validate_code(code)[0] is False
+
+
+def test_scanner_agrees_on_programs_with_violations_planted_in_them():
+    rng = random.Random(25)
+    for program in SAMPLE_PROGRAMS:
+        for _ in range(30):
+            lines = program["code"].split("\n")
+            for snippet in rng.sample(VIOLATIONS, rng.randint(1, 3)):
+                lines.insert(rng.randint(0, len(lines)), snippet)
+            code = "\n".join(lines)
+            assert SandboxSecurity.validate_code(code) == _baseline(code), code
+
+
+def test_given_tree_is_not_parsed_again():
+    code = "x.__dict__"
+    tree = ast.parse(code)
+
+    assert SandboxSecurity.validate_code(code, tree) == (
+        False, "Access to '__dict__' is not allowed"
+    )
@@ -0,0 +1,88 @@
+"""Tests for deficit round-robin queueing across clients."""
+
+import threading
+
+from app.workers.scheduler import FairQueue, Priority
+
+
+def _drain(queue):
+    items = []
+    while queue.qsize():
+        items.append(queue.get())
+    return items
+
+
+def test_clients_take_turns_instead_of_first_come_first_served():
+    queue = FairQueue({})
+    for i in range(4):
+        queue.put(f"a{i}", "alice")
+    queue.put("b0", "bob")
+    queue.put("b1", "bob")
+
+    assert _drain(queue) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+
+def test_each_turn_takes_as_many_items_as_the_class_weight():
+    queue = FairQueue({"interactive": 3, "batch": 1})
+    for i in range(5):
+        queue.put(f"b{i}", "bulk", Priority.BATCH)
+    for i in range(5):
+        queue.put(f"i{i}", "user", Priority.INTERACTIVE)
+
+    assert _drain(queue) == [
+        "b0", "i0", "i1", "i2", "b1", "i3", "i4", "b2", "b3", "b4",
+    ]
+
+
+def test_a_client_back_after_emptying_its_flow_starts_a_fresh_turn():
+    queue = FairQueue({"interactive": 2})
+    queue.put("a0", "alice")
+    queue.put("b0", "bob")
+    queue.put("b1", "bob")
+    queue.put("b2", "bob")
+
+    assert queue.get() == "a0"
+    queue.put("a1", "alice")
+    assert _drain(queue) == ["b0", "b1", "a1", "b2"]
+
+
+def test_one_client_and_class_is_first_in_first_out():
+    queue = FairQueue({"interactive": 2})
+    for i in range(5):
+        queue.put(i, "alice")
+
+    assert _drain(queue) == [0, 1, 2, 3, 4]
+
+
+def test_weights_below_one_count_as_one():
+    queue = FairQueue({"batch": 0})
+    for i in range(2):
+        queue.put(f"a{i}", "alice", Priority.BATCH)
+        queue.put(f"b{i}", "bob", Priority.BATCH)
+
+    assert _drain(queue) == ["a0", "b0", "a1", "b1"]
+
+
+def test_items_and_stats_describe_the_queue():
+    queue = FairQueue({})
+    queue.put("a0", "alice", Priority.BATCH)
+    queue.put("b0", "bob")
+
+    assert queue.items() == [
+        ("alice", Priority.BATCH, "a0"), ("bob", Priority.INTERACTIVE, "b0"),
+    ]
+    assert queue.stats() == {
+        "clients": 2, "queued_by_priority": {"interactive": 1, "batch": 1},
+    }
+
+
+def test_get_waits_for_an_item_and_returns_none_once_closed():
+    queue = FairQueue({})
+    got = []
+    taker = threading.Thread(target=lambda: got.extend([queue.get(), queue.get()]))
+    taker.start()
+    queue.put("a0", "alice")
+    queue.close()
+    taker.join(5)
+
+    assert got == ["a0", None]
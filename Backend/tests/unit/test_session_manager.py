@@ -0,0 +1,61 @@
+"""Tests for the traces kept for step access."""
+
+from flask import Flask
+
+from app.api.v1.endpoints import sessions
+from app.config import settings
+from app.core.trace_collector import TraceCollector
+from app.core.trace_delta import encode_trace
+from app.services.session_manager import SessionManager
+
+
+def _trace_json(code):
+    trace = TraceCollector(code).execute()
+    return encode_trace(trace, settings.TRACE_KEYFRAME_INTERVAL).model_dump_json().encode()
+
+
+def test_stored_trace_is_parsed_on_read_and_serves_steps():
+    manager = SessionManager()
+    manager.store_trace("s1", _trace_json("x = 1\ny = x + 1\nprint(y)"))
+
+    steps = manager.get_steps("s1", 1, 2)
+    assert [step.step for step in steps] == [1, 2]
+    assert manager.get_trace("s1") is manager.get_trace("s1")
+
+
+def test_traces_are_evicted_by_their_size(monkeypatch):
+    data = _trace_json("for i in range(30):\n    pass")
+    monkeypatch.setattr(settings, "TRACE_STORE_MAX_BYTES", len(data) * 2)
+    monkeypatch.setattr(settings, "PARSED_TRACES_MAX_BYTES", len(data) * 8)
+    manager = SessionManager()
+
+    for session_id in ("s1", "s2", "s3"):
+        manager.store_trace(session_id, data)
+    stats = manager.trace_stats()
+
+    assert manager.get_trace("s1") is None
+    assert manager.get_trace("s3") is not None
+    assert stats["stored"]["bytes"] <= len(data) * 2
+    assert stats["stored"]["evictions"] == 1
+
+
+def test_storing_a_trace_again_replaces_the_parsed_copy():
+    manager = SessionManager()
+    manager.store_trace("s1", _trace_json("x = 1"))
+    first = manager.get_trace("s1")
+    manager.store_trace("s1", _trace_json("x = 1\ny = 2\nz = 3"))
+
+    assert manager.get_trace("s1").total_steps > first.total_steps
+
+
+def test_step_window_starting_before_the_first_step_starts_at_it(monkeypatch):
+    manager = SessionManager()
+    manager.store_trace("s1", _trace_json("x = 1\ny = x + 1\nprint(y)"))
+    monkeypatch.setattr(sessions, "session_manager", manager)
+    app = Flask(__name__)
+    app.register_blueprint(sessions.sessions_bp)
+
+    body = app.test_client().get("/sessions/s1/steps?start=-5&count=2").get_json()
+
+    assert body["start"] == 0
+    assert [step["step"] for step in body["steps"]] == [0, 1]
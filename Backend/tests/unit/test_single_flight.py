@@ -0,0 +1,87 @@
+"""Tests for coalescing identical in-flight requests."""
+
+import pytest
+
+from app.models.execution import ExecutionStatus
+from app.services.executor import ExecutionService
+from app.services.single_flight import SingleFlight
+
+
+def test_duplicate_requests_share_one_flight():
+    flights = SingleFlight()
+    flight, first, leads = flights.join("key", "r1", state="run")
+    same, second, joiner_leads = flights.join("key", "r2")
+
+    assert leads and not joiner_leads
+    assert same is flight and same.state == "run"
+    flights.publish(flight, "result")
+    assert first.result(0) == second.result(0) == "result"
+    stats = flights.stats()
+    assert (stats["led"], stats["joined"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_failure_reaches_every_waiter():
+    flights = SingleFlight()
+    flight, first, _ = flights.join("key", "r1")
+    _, second, _ = flights.join("key", "r2")
+
+    flights.publish(flight, ValueError("boom"))
+    assert isinstance(first.result(0), ValueError)
+    assert second.result(0) is first.result(0)
+
+
+def test_published_flight_is_not_joined_again():
+    flights = SingleFlight()
+    flight, _, _ = flights.join("key", "r1")
+    flights.publish(flight, "old")
+
+    again, future, leads = flights.join("key", "r2")
+    assert leads and again is not flight
+    assert not future.done()
+
+
+def test_flights_without_a_key_are_private():
+    flights = SingleFlight()
+    first, _, first_leads = flights.join(None, "r1")
+    second, _, second_leads = flights.join(None, "r2")
+
+    assert first_leads and second_leads
+    assert first is not second
+
+
+def test_work_is_abandoned_only_when_the_last_waiter_leaves():
+    flights = SingleFlight()
+    flight, first, _ = flights.join("key", "r1")
+    _, second, _ = flights.join("key", "r2")
+
+    assert flights.leave("r1", "cancelled") == (flight, False)
+    assert first.result(0) == "cancelled"
+    assert not flight.abandoned
+    assert flights.leave("r2", "cancelled") == (flight, True)
+    assert flight.abandoned
+    assert flights.leave("r2", "cancelled") == (None, False)
+
+    flights.publish(flight, "late")
+    assert second.result(0) == "cancelled"
+    _, _, leads = flights.join("key", "r3")
+    assert leads
+
+
+@pytest.fixture
+def service():
+    service = ExecutionService()
+    yield service
+    service.shutdown()
+
+
+def test_identical_runs_that_fail_share_the_error(service):
+    code = "total = 0\nfor i in range(1000):\n    total += i\nprint(total)\nprint(1 / 0)"
+    first = service.submit(code, traced=False)
+    second = service.submit(code, traced=False)
+
+    first, second = first.result(timeout=60), second.result(timeout=60)
+    assert first.status == second.status == ExecutionStatus.ERROR
+    assert first.error == second.error == "ZeroDivisionError: division by zero"
+    assert first.stdout == second.stdout == "499500\n"
+    assert (first.coalesced, second.coalesced) == (False, True)
+    assert service.coalescing_stats()["joined"] == 1
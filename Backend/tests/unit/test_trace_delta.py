@@ -0,0 +1,89 @@
+"""Tests for delta-encoded traces."""
+
+import json
+
+import pytest
+
+from app.core.trace_collector import TraceCollector
+from app.core.trace_delta import decode_trace, encode_trace, reconstruct_step
+from app.core.trace_records import DeltaEncoder, StepEncoder, delta_trace_json
+from app.models.trace import DeltaTraceData
+
+PROGRAMS = {
+    "scalars": "x = 1\ny = x + 2\nx = y * 3\nprint(x, y)",
+    "containers": (
+        "xs = []\nd = {}\nfor i in range(12):\n    xs.append([i] * 2)\n"
+        "    d[str(i)] = xs[-1]\nxs.pop()\ndel d['0']\nprint(len(xs), len(d))"
+    ),
+    "calls": (
+        "def fib(n):\n    if n < 2:\n        return n\n"
+        "    return fib(n - 1) + fib(n - 2)\nprint(fib(4))"
+    ),
+    "exception": "def f(x):\n    return 1 / x\ntry:\n    f(0)\nexcept ZeroDivisionError:\n    pass\nf(0)",
+}
+
+
+def _steps(trace):
+    return [step.model_dump() for step in trace.steps]
+
+
+@pytest.fixture(params=sorted(PROGRAMS))
+def traced(request):
+    collector = TraceCollector(PROGRAMS[request.param])
+    return collector, collector.execute()
+
+
+@pytest.fixture
+def trace(traced):
+    return traced[1]
+
+
+@pytest.mark.parametrize("keyframe_interval", [None, 1, 7])
+def test_decoding_gives_back_every_step(trace, keyframe_interval):
+    decoded = decode_trace(encode_trace(trace, keyframe_interval))
+
+    assert _steps(decoded) == _steps(trace)
+    assert decoded.total_steps == trace.total_steps
+    assert decoded.max_steps_reached == trace.max_steps_reached
+
+
+def test_round_trip_survives_json(trace):
+    data = encode_trace(trace, 5).model_dump_json()
+
+    assert _steps(decode_trace(DeltaTraceData.model_validate_json(data))) == _steps(trace)
+
+
+def test_any_step_is_rebuilt_from_its_keyframe(trace):
+    encoded = encode_trace(trace, 4)
+
+    for index, step in enumerate(trace.steps):
+        assert reconstruct_step(encoded, index).model_dump() == step.model_dump()
+    with pytest.raises(IndexError):
+        reconstruct_step(encoded, len(trace.steps))
+
+
+def test_unchanged_frames_and_heap_are_left_out():
+    trace = TraceCollector(PROGRAMS["containers"]).execute()
+    encoded = encode_trace(trace)
+    full = sum(len(step.heap) for step in trace.steps)
+
+    assert sum(len(delta.heap_set) for delta in encoded.deltas) < full / 2
+
+
+def test_records_encode_to_the_same_deltas_as_the_models(traced):
+    collector, trace = traced
+    store = collector.state.store
+    encoder = StepEncoder()
+    deltas = DeltaEncoder(encoder)
+    data = delta_trace_json(
+        trace.code,
+        [deltas.step(record) for record in store],
+        3,
+        [encoder.step(store.record(n)) for n in range(0, len(store), 3)],
+        trace.total_steps,
+        trace.final_state,
+        trace.max_steps_reached,
+    )
+
+    assert json.loads(data) == encode_trace(trace, 3).model_dump(mode="json")
+    assert _steps(decode_trace(DeltaTraceData.model_validate_json(data))) == _steps(trace)